@@ -3,8 +3,11 @@
 
 import os
 import sys
+import time
+import asyncio
 import logging
-from collections import defaultdict
+from typing import Optional
+from collections import defaultdict, OrderedDict
 from logging.handlers import RotatingFileHandler
 
 # ===== VERSION INFORMATION =====
@@ -207,50 +210,250 @@ performance_monitor = PerformanceMonitor()
 
 # ===== CACHE SYSTEM =====
 
-class SimpleCache:
-    """Simple in-memory cache with expiration"""
-    
-    def __init__(self, default_ttl=3600):
-        self.cache = {}
-        self.default_ttl = default_ttl
-    
+# Expiry wheel slot width in seconds; expired entries are dropped one slot at a time
+CACHE_WHEEL_SECONDS = 10
+
+_MISSING = object()
+
+def estimate_size(value, _depth: int = 0) -> int:
+    """Rough deep size of a cached value in bytes (nested containers and objects, 3 levels)"""
+    size = sys.getsizeof(value)
+    if _depth >= 3 or isinstance(value, (str, bytes, int, float)):
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _depth + 1) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value), _depth + 1)
+    return size
+
+class _CacheEntry:
+    __slots__ = ('namespace', 'key', 'value', 'expiry', 'size')
+
+    def __init__(self, namespace, key, value, expiry, size):
+        self.namespace = namespace
+        self.key = key
+        self.value = value
+        self.expiry = expiry  # time.monotonic() deadline, None = no expiry
+        self.size = size
+
+class CacheNamespace:
+    """
+    One key space of the shared cache (probe, url-head, thumbnails...)
+    with its own default TTL (None = until evicted), optional entry quota and counters
+    """
+
+    def __init__(self, cache: 'BoundedCache', name: str, ttl=None, max_entries=None):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.keys = OrderedDict()  # LRU order within this namespace
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0            # get_or_compute callers that shared a running computation
+        self.evictions = 0
+        self.expirations = 0
+        self._inflight = {}        # key -> asyncio.Task
+
+    def get(self, key, default=None):
+        return self.cache._get(self, key, default)
+
+    def peek(self, key, default=None):
+        """Like get, without counting a hit or miss or refreshing the LRU position"""
+        return self.cache._get(self, key, default, touch=False)
+
     def set(self, key, value, ttl=None):
-        """Set a cached value"""
-        import time
-        ttl = ttl or self.default_ttl
-        expiry = time.time() + ttl
-        self.cache[key] = {'value': value, 'expiry': expiry}
-    
+        self.cache._set(self, key, value, ttl)
+
+    def delete(self, key):
+        self.cache._remove((self.name, key))
+
+    def clear(self):
+        for key in list(self.keys):
+            self.cache._remove((self.name, key))
+
+    def __len__(self):
+        return len(self.keys)
+
+    async def get_or_compute(self, key, compute, ttl=None):
+        """
+        Cached value for key, or the result of awaiting compute() (then cached).
+        Concurrent callers for the same key share one computation; exceptions are
+        not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        task = self._inflight.get(key)
+        if task:
+            self.joined += 1
+        else:
+            task = asyncio.ensure_future(self._compute(key, compute, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled caller must not cancel the computation others are waiting on
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute, ttl):
+        value = await compute()
+        self.set(key, value, ttl)
+        return value
+
+    def get_stats(self):
+        return {
+            'entries': len(self.keys),
+            'hits': self.hits,
+            'misses': self.misses,
+            'joined': self.joined,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class BoundedCache:
+    """
+    In-memory LRU cache bounded by entry count and estimated bytes, with per-entry TTL.
+    Entries are filed in a coarse expiry wheel (CACHE_WHEEL_SECONDS slots) that is
+    advanced on every write, so expired entries are dropped without a full scan and
+    without waiting for someone to read them. Callers work in namespaces.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, default_ttl=3600):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.bytes = 0
+        self._entries = OrderedDict()  # (namespace, key) -> _CacheEntry, global LRU order
+        self._wheel = {}               # slot -> (namespace, key) pairs expiring in it
+        self._wheel_pos = self._slot(time.monotonic())
+        self.namespaces = {}
+        self._default = self.namespace('default', default_ttl)
+
+    @staticmethod
+    def _slot(deadline: float) -> int:
+        return int(deadline // CACHE_WHEEL_SECONDS)
+
+    def namespace(self, name: str, ttl=None, max_entries=None) -> CacheNamespace:
+        """The namespace called name, created with ttl/max_entries on first use"""
+        namespace = self.namespaces.get(name)
+        if namespace is None:
+            namespace = self.namespaces[name] = CacheNamespace(self, name, ttl, max_entries)
+        return namespace
+
+    # Legacy SimpleCache interface, on the default namespace
+
     def get(self, key, default=None):
         """Get a cached value"""
-        import time
-        if key not in self.cache:
-            return default
-        
-        entry = self.cache[key]
-        if time.time() > entry['expiry']:
-            del self.cache[key]
-            return default
-        
-        return entry['value']
-    
+        return self._default.get(key, default)
+
+    def set(self, key, value, ttl=None):
+        """Set a cached value"""
+        self._default.set(key, value, ttl)
+
     def clear_expired(self):
         """Clear expired cache entries"""
-        import time
-        current_time = time.time()
-        expired_keys = [
-            key for key, entry in self.cache.items() 
-            if current_time > entry['expiry']
-        ]
-        
-        for key in expired_keys:
-            del self.cache[key]
-        
-        if expired_keys:
-            LOGGER.debug(f"Cleared {len(expired_keys)} expired cache entries")
+        self._expire(time.monotonic())
+
+    def _remove(self, full_key) -> Optional[_CacheEntry]:
+        entry = self._entries.pop(full_key, None)
+        if entry is None:
+            return None
+        del entry.namespace.keys[entry.key]
+        self.bytes -= entry.size
+        if entry.expiry is not None:
+            slot = self._wheel.get(self._slot(entry.expiry))
+            if slot:
+                slot.discard(full_key)
+        return entry
+
+    def _get(self, namespace: CacheNamespace, key, default, touch: bool = True):
+        full_key = (namespace.name, key)
+        entry = self._entries.get(full_key)
+        if entry is not None and entry.expiry is not None and entry.expiry <= time.monotonic():
+            self._remove(full_key)
+            namespace.expirations += 1
+            entry = None
+        if entry is None:
+            if touch:
+                namespace.misses += 1
+            return default
+        if not touch:
+            return entry.value
+
+        self._entries.move_to_end(full_key)
+        namespace.keys.move_to_end(key)
+        namespace.hits += 1
+        return entry.value
+
+    def _set(self, namespace: CacheNamespace, key, value, ttl):
+        now = time.monotonic()
+        full_key = (namespace.name, key)
+        self._remove(full_key)
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            LOGGER.debug(f"Not caching {namespace.name}:{key}, {size} bytes exceeds the cache size")
+            return
+
+        ttl = namespace.ttl if ttl is None else ttl
+        expiry = now + ttl if ttl else None
+        self._entries[full_key] = _CacheEntry(namespace, key, value, expiry, size)
+        namespace.keys[key] = None
+        self.bytes += size
+        if expiry is not None:
+            self._wheel.setdefault(self._slot(expiry), set()).add(full_key)
+
+        self._expire(now)
+        while namespace.max_entries and len(namespace.keys) > namespace.max_entries:
+            self._remove((namespace.name, next(iter(namespace.keys))))
+            namespace.evictions += 1
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            entry = self._remove(next(iter(self._entries)))
+            entry.namespace.evictions += 1
+
+    def _expire(self, now: float):
+        """Drop every entry in wheel slots that ended before now"""
+        current = self._slot(now)
+        if current <= self._wheel_pos:
+            return
+        if current - self._wheel_pos > len(self._wheel):
+            due = [slot for slot in self._wheel if slot < current]
+        else:
+            due = range(self._wheel_pos, current)
+        expired = 0
+        for slot in due:
+            for full_key in self._wheel.pop(slot, ()):
+                entry = self._remove(full_key)
+                if entry:
+                    entry.namespace.expirations += 1
+                    expired += 1
+        self._wheel_pos = current
+        if expired:
+            LOGGER.debug(f"Cleared {expired} expired cache entries")
+
+    def get_stats(self):
+        """Totals and per-namespace counters for /stats"""
+        self._expire(time.monotonic())
+        namespaces = {name: namespace.get_stats() for name, namespace in self.namespaces.items()}
+        totals = {
+            counter: sum(stats[counter] for stats in namespaces.values())
+            for counter in ('hits', 'misses', 'evictions', 'expirations')
+        }
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            **totals,
+            'namespaces': namespaces
+        }
 
 # Initialize cache
-cache = SimpleCache()
+cache = BoundedCache(
+    int(os.environ.get("CACHE_MAX_ENTRIES", "10000")),
+    int(os.environ.get("CACHE_MAX_MB", "64")) * 1024 * 1024
+)
 
 # ===== STARTUP BANNER =====
 
@@ -358,6 +561,7 @@ __all__ = [
     
     # Core components
     'LOGGER', 'bMaker', 'cache', 'performance_monitor',
+    'BoundedCache', 'CacheNamespace',
     
     # Global dictionaries
     'queueDB', 'formatDB', 'replyDB', 'gDict',
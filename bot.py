@@ -21,12 +21,21 @@ from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMa
 from __init__ import (
     LOGGER, VIDEO_EXTENSIONS, AUDIO_EXTENSIONS, SUBTITLE_EXTENSIONS,
     MERGE_MODE, UPLOAD_AS_DOC, UPLOAD_TO_DRIVE, bMaker, formatDB, 
-    gDict, queueDB, replyDB, BROADCAST_MSG
+    gDict, queueDB, replyDB, BROADCAST_MSG, cache
 )
 from config import Config
 from helpers import database
 from helpers.downloader import EnhancedDownloader, download_from_url, download_from_tg
+from helpers.queue_downloader import QueueDownloader
 from helpers.merger import EnhancedMerger, merge_videos
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler
+from helpers.media_probe import media_probe
+from helpers.blob_store import input_store
+from helpers.http_pool import http_pool
+from helpers.status_renderer import status_renderer
+from helpers.encoder_calibration import encoder_calibrator, get_encoder_profile
+from helpers.merge_checkpoint import interrupted_merge_jobs
+from helpers.merge_results import merge_result_index, merge_result_key, merge_input_identities, replay_merge_result
 from helpers.uploader import EnhancedTelegramUploader, GoFileUploader
 from helpers.utils import UserSettings, get_readable_file_size, get_readable_time
 
@@ -39,6 +48,12 @@ class EnhancedMergeBot(Client):
     
     def start(self):
         super().start()
+        if Config.CALIBRATE_ON_STARTUP and not get_encoder_profile().calibrated:
+            # Runs in the background; jobs use the static config until it finishes
+            self.loop.create_task(encoder_calibrator.calibrate())
+        self._notify_interrupted_merges()
+        if input_store:
+            input_store.clear_temp()
         try:
             self.send_message(
                 chat_id=int(Config.OWNER), 
@@ -54,8 +69,36 @@ class EnhancedMergeBot(Client):
             LOGGER.error(f"Boot alert failed: {err}")
         return LOGGER.info("Enhanced MERGE-BOT Started!")
 
+    def _notify_interrupted_merges(self):
+        """Tell users whose robust merge was cut off by a crash or restart that it can resume"""
+        for job in interrupted_merge_jobs():
+            if not job['completed']:
+                continue
+            try:
+                self.send_message(
+                    chat_id=job['user_id'],
+                    text=f"♻️ **Interrupted Merge Found**\n"
+                         f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+                         f"🧩 **Progress:** `{job['completed']}/{len(job['inputs'])}` segments encoded\n"
+                         f"🔄 Merge the same files again to resume from there.\n"
+                         f"⏰ Saved progress expires after {Config.MERGE_JOB_TTL} hours."
+                )
+            except Exception as err:
+                LOGGER.warning(f"Could not notify user {job['user_id']} about merge job {job['job_id']}: {err}")
+
+    async def edit_message_text(self, chat_id, message_id, text, *args, **kwargs):
+        # Every edit (message.edit_text, callback edits) passes here: a direct edit
+        # supersedes pending status text and counts against the edit budget
+        status_renderer.edited(chat_id, message_id, text)
+        return await super().edit_message_text(chat_id, message_id, text, *args, **kwargs)
+
     def stop(self):
         super().stop()
+        # The shared HTTP session outlives every job; close it with the bot
+        if self.loop.is_running():
+            self.loop.create_task(http_pool.close())
+        else:
+            self.loop.run_until_complete(http_pool.close())
         return LOGGER.info("Enhanced MERGE-BOT Stopped")
 
 # Initialize enhanced bot
@@ -65,6 +108,8 @@ mergeApp = EnhancedMergeBot(
     api_id=Config.TELEGRAM_API,
     bot_token=Config.BOT_TOKEN,
     workers=300,
+    # Parallel Telegram downloads use one media session per connection
+    max_concurrent_transmissions=Config.TG_DOWNLOAD_CONNECTIONS * Config.MAX_CONCURRENT_DOWNLOADS,
     plugins=dict(root="plugins"),
     app_version="6.0+enhanced-mergebot",
 )
@@ -213,7 +258,7 @@ async def help_handler(c: Client, m: Message):
         "1️⃣ Send videos, audios, or direct links\n"
         "2️⃣ Configure settings using `/settings`\n"
         "3️⃣ Send custom thumbnail (optional)\n"
-        "4️⃣ Use `/merge` to start processing\n"
+        "4️⃣ Use `/merge` to start processing (`/plan` previews it first)\n"
         "5️⃣ Choose upload method (Telegram/GoFile)\n\n"
         "**📹 MERGE MODES:**\n"
         "• **Video-Video:** Merge up to 10 videos\n"
@@ -279,6 +324,23 @@ async def stats_handler(c: Client, m: Message):
     # Bot statistics
     total_users = len(queueDB) if queueDB else 0
     active_queues = len([q for q in queueDB.values() if q.get('videos')])
+    scheduler = ffmpeg_scheduler.get_stats()
+    probes = media_probe.get_stats()
+    pool = http_pool.get_stats()
+    edits = status_renderer.get_stats()
+    cached = cache.get_stats()
+    lookups = cached['hits'] + cached['misses']
+    cache_text = ", ".join(
+        f"{name} `{ns['entries']}`" for name, ns in cached['namespaces'].items() if ns['entries']
+    ) or "empty"
+    if input_store:
+        store = input_store.get_stats()
+        store_text = (
+            f"`{store['blobs']}` files, `{get_readable_file_size(store['bytes'])}` / "
+            f"`{get_readable_file_size(store['max_bytes'])}`, `{store['hits']}` reused"
+        )
+    else:
+        store_text = "`Disabled`"
     
     stats_text = (
         f"**📊 ENHANCED BOT STATISTICS v6.0**\n"
@@ -291,10 +353,28 @@ async def stats_handler(c: Client, m: Message):
         f"• **Free Space:** `{free}`\n\n"
         f"**🌐 Network:**\n"
         f"• **Uploaded:** `{sent}`\n"
-        f"• **Downloaded:** `{recv}`\n\n"
+        f"• **Downloaded:** `{recv}`\n"
+        f"• **Input Store:** {store_text}\n"
+        f"• **HTTP Pool:** `{pool['in_use']}` busy / `{pool['idle']}` idle, "
+        f"`{pool['reused_connections']}` reused / `{pool['new_connections']}` new connections, "
+        f"DNS `{pool['dns_hits']}` hits / `{pool['dns_misses']}` misses\n"
+        f"• **Status Edits:** `{edits['edits']}` sent / `{edits['coalesced']}` coalesced / "
+        f"`{edits['unchanged']}` unchanged, `{edits['pending']}` pending, `{edits['flood_waits']}` FloodWaits\n\n"
         f"**👥 User Stats:**\n"
         f"• **Total Users:** `{total_users}`\n"
         f"• **Active Queues:** `{active_queues}`\n\n"
+        f"**🎬 FFmpeg Scheduler:**\n"
+        f"• **Running Jobs:** `{scheduler['running']}/{scheduler['max_jobs']}`\n"
+        f"• **Queued Jobs:** `{scheduler['queued']}`\n"
+        f"• **Threads/Job:** `{scheduler['threads_per_job']}` of `{scheduler['cpus']}` CPUs\n"
+        f"• **Probe Cache:** `{probes['entries']}` files, `{probes['hits']}` hits / `{probes['misses']}` probes ({probes['in_process']} in-process)\n\n"
+        f"**🗃️ Memory Cache:**\n"
+        f"• **Entries:** `{cached['entries']}/{cached['max_entries']}`, "
+        f"`{get_readable_file_size(cached['bytes'])}` / `{get_readable_file_size(cached['max_bytes'])}`\n"
+        f"• **Hit Rate:** `{cached['hits'] / lookups * 100 if lookups else 0:.1f}%` "
+        f"({cached['hits']} hits / {cached['misses']} misses)\n"
+        f"• **Evicted:** `{cached['evictions']}`, **Expired:** `{cached['expirations']}`\n"
+        f"• **Namespaces:** {cache_text}\n\n"
         f"**🤖 Bot Features:**\n"
         f"• Enhanced async downloader\n"
         f"• Robust merge engine with fallback\n"
@@ -365,52 +445,53 @@ async def merge_handler(c: Client, m: Message):
         quote=True
     )
     
+    pipeline = None
     try:
         # Initialize enhanced components
         downloader = EnhancedDownloader(user_id)
+        queue = queueDB[user_id]["videos"]
+        
+        # Identical inputs merged before are re-sent from Telegram without any transfer or encoding
+        identities = await merge_input_identities(c, user_id, queue, downloader)
+        result_key = merge_result_key(identities, user) if identities else None
+        cached_result = merge_result_index.lookup(result_key)
+        if cached_result and await replay_merge_result(c, user_id, result_key, cached_result, status_msg):
+            queueDB[user_id]["videos"].clear()
+            await downloader.cleanup()
+            return
+        
         merger = EnhancedMerger(user_id)
         
-        # Download all files
-        video_paths = []
-        queue = queueDB[user_id]["videos"]
+        # Download all files concurrently, probing/normalizing each one as it lands
+        pipeline = merger.start_pipeline(status_msg)
+        queue_downloader = QueueDownloader(c, user_id, status_msg, downloader=downloader)
+        video_paths = await queue_downloader.download_all(
+            queue,
+            remote=Config.REMOTE_INPUT_MERGE,
+            on_item=lambda i, path: pipeline.add(i, path, queue_downloader.remote_sizes.get(i))
+        )
         
-        for i, item in enumerate(queue):
+        if not video_paths:
+            await pipeline.cancel()
             await status_msg.edit_text(
-                f"📥 **Enhanced Download Phase**\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"🔄 **Progress:** {i+1}/{len(queue)}\n"
-                f"📁 **Processing:** Item {i+1}\n"
-                f"⏳ **Status:** Starting download..."
+                f"❌ **Download Failed!**\n"
+                f"Failed to download item {queue_downloader.failed + 1}/{len(queue)}\n\n"
+                f"**Action:** Cancelling merge operation\n"
+                f"**Suggestion:** Check your files and try again"
             )
-            
-            # Download based on item type
-            if isinstance(item, str):  # Direct URL
-                file_path = await downloader.download_from_url(item, status_msg)
-            else:  # Telegram message ID
-                message = await c.get_messages(chat_id=user_id, message_ids=item)
-                file_path = await downloader.download_from_telegram(message, status_msg)
-            
-            if not file_path:
-                await status_msg.edit_text(
-                    f"❌ **Download Failed!**\n"
-                    f"Failed to download item {i+1}/{len(queue)}\n\n"
-                    f"**Action:** Cancelling merge operation\n"
-                    f"**Suggestion:** Check your files and try again"
-                )
-                await downloader.cleanup()
-                return
-            
-            video_paths.append(file_path)
+            await downloader.cleanup()
+            return
         
-        # Enhanced merge phase
-        merged_path = await merger.merge_videos(video_paths, status_msg)
+        # Enhanced merge phase (only the remaining work; the pipeline already ran alongside downloads)
+        merged_path = await pipeline.finish()
         
         if not merged_path:
             await downloader.cleanup()
             return
         
         # Success - show upload options
-        file_size = get_readable_file_size(os.path.getsize(merged_path))
+        merged_size = os.path.getsize(merged_path)
+        file_size = get_readable_file_size(merged_size)
         
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("📤 Upload to Telegram", callback_data=f"upload_tg_{user_id}")],
@@ -433,9 +514,16 @@ async def merge_handler(c: Client, m: Message):
         # Store merge result for upload
         if user_id not in queueDB:
             queueDB[user_id] = {}
-        queueDB[user_id]["merged_file"] = merged_path
+        queueDB[user_id]["merged_file"] = {
+            "path": merged_path,
+            "filename": os.path.basename(merged_path),
+            "size": merged_size,
+            "result_key": result_key
+        }
         
     except Exception as e:
+        if pipeline:
+            await pipeline.cancel()
         LOGGER.error(f"Enhanced merge process error: {e}")
         await status_msg.edit_text(
             f"❌ **Merge Process Failed!**\n\n"
@@ -444,6 +532,51 @@ async def merge_handler(c: Client, m: Message):
             f"Please try again or contact support if the issue persists."
         )
 
+@mergeApp.on_message(filters.command(["plan"]) & filters.private)
+async def plan_handler(c: Client, m: Message):
+    """Dry-run merge: fetch and probe the queue, show the plan without encoding anything"""
+    user_id = m.from_user.id
+    user = UserSettings(user_id, m.from_user.first_name)
+    
+    if user_id != int(Config.OWNER) and not user.allowed:
+        await m.reply_text("🔒 **Access Denied!** Use `/login <password>` first.", quote=True)
+        return
+    
+    queue = queueDB.get(user_id, {}).get("videos", [])
+    if len(queue) < 2:
+        await m.reply_text("📹 **Need More Videos!** Add at least 2 items, then use `/plan` again.", quote=True)
+        return
+    
+    status_msg = await m.reply_text(
+        "📋 **Planning Merge...**\n"
+        "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        "🔄 **Status:** Fetching and probing inputs (nothing is encoded)...",
+        quote=True
+    )
+    
+    downloader = EnhancedDownloader(user_id)
+    try:
+        # Links are probed in place when possible; fetched files stay in the input store for /merge
+        queue_downloader = QueueDownloader(c, user_id, status_msg, downloader=downloader)
+        video_paths = await queue_downloader.download_all(queue, remote=Config.REMOTE_INPUT_MERGE)
+        if not video_paths:
+            await status_msg.edit_text(
+                f"❌ **Planning Failed!**\nCould not fetch item {queue_downloader.failed + 1}/{len(queue)}"
+            )
+            return
+        
+        sizes = {
+            path: queue_downloader.remote_sizes[i]
+            for i, path in enumerate(video_paths) if i in queue_downloader.remote_sizes
+        }
+        plan = await EnhancedMerger(user_id).plan(video_paths, sizes)
+        await status_msg.edit_text(f"{plan.summary_text()}\n\n➢ Use `/merge` to run this plan.")
+    except Exception as e:
+        LOGGER.error(f"Merge plan error for user {user_id}: {e}")
+        await status_msg.edit_text(f"❌ **Planning Failed!**\n**Error:** `{str(e)}`")
+    finally:
+        await downloader.cleanup()
+
 # ===== FILE AND MESSAGE HANDLERS =====
 
 @mergeApp.on_message((filters.document | filters.video | filters.audio) & filters.private)
@@ -543,7 +676,7 @@ async def enhanced_file_handler(c: Client, m: Message):
         reply_markup=keyboard
     )
 
-@mergeApp.on_message(filters.text & ~filters.command(["start", "help", "login", "merge", "settings", "cancel"]) & filters.private)
+@mergeApp.on_message(filters.text & ~filters.command(["start", "help", "login", "merge", "plan", "settings", "cancel"]) & filters.private)
 async def url_handler(c: Client, m: Message):
     """Handle direct download URLs"""
     user_id = m.from_user.id
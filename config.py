@@ -88,10 +88,34 @@ class Config(object):
     # ===== PERFORMANCE SETTINGS =====
     # Enhanced performance configuration
     EDIT_THROTTLE_SECONDS = 4.0         # Prevent FloodWait errors
+    STATUS_EDITS_PER_SECOND = float(os.environ.get("STATUS_EDITS_PER_SECOND", "20"))  # Status edits across all chats
+    STATUS_CHAT_EDITS_PER_MINUTE = float(os.environ.get("STATUS_CHAT_EDITS_PER_MINUTE", "20"))  # Status edits per chat
+    STATUS_CHAT_BURST = int(os.environ.get("STATUS_CHAT_BURST", "3"))  # Edits a quiet chat may make back to back
     DOWNLOAD_CHUNK_SIZE = 1024 * 1024   # 1MB download chunks
-    MAX_CONCURRENT_DOWNLOADS = 3        # Concurrent download limit
+    MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", "3"))  # Concurrent download limit (all users)
+    USER_CONCURRENT_DOWNLOADS = int(os.environ.get("USER_CONCURRENT_DOWNLOADS", "2"))  # Queue items one user downloads at once
     UPLOAD_TIMEOUT = 300                # Upload timeout in seconds
     DOWNLOAD_TIMEOUT = 300              # Download timeout in seconds
+    REMOTE_INPUT_MERGE = os.environ.get("REMOTE_INPUT_MERGE", "false").lower() == "true"  # Let ffmpeg read range-capable URLs directly
+    HTTP_DOWNLOAD_CONNECTIONS = int(os.environ.get("HTTP_DOWNLOAD_CONNECTIONS", "4"))  # Ranged segments fetched at once per URL download
+    HTTP_PARALLEL_MIN_SIZE = int(os.environ.get("HTTP_PARALLEL_MIN_SIZE_MB", "20")) * 1024 * 1024  # Smaller files use one stream
+    HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "64"))  # Open connections in the shared HTTP pool
+    HTTP_POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", "16"))  # Per-host cap (parallel segments share it)
+    HTTP_DNS_TTL = int(os.environ.get("HTTP_DNS_TTL", "300"))  # Seconds DNS answers are cached
+    HTTP_KEEPALIVE = int(os.environ.get("HTTP_KEEPALIVE", "60"))  # Seconds idle connections are kept for reuse
+    TG_DOWNLOAD_CONNECTIONS = int(os.environ.get("TG_DOWNLOAD_CONNECTIONS", "4"))  # Parallel media sessions per Telegram download
+    TG_PARALLEL_MIN_SIZE = int(os.environ.get("TG_PARALLEL_MIN_SIZE_MB", "20")) * 1024 * 1024  # Smaller files use one connection
+    
+    # ===== FFMPEG SCHEDULER =====
+    # Every ffmpeg/ffprobe process goes through one global scheduler
+    MAX_FFMPEG_JOBS = int(os.environ.get("MAX_FFMPEG_JOBS", "0"))          # Concurrent encodes (0 = one per available CPU)
+    MAX_FFPROBE_JOBS = int(os.environ.get("MAX_FFPROBE_JOBS", "4"))        # Concurrent probes/thumbnails
+    MEDIA_PROBE_CACHE_SIZE = int(os.environ.get("MEDIA_PROBE_CACHE_SIZE", "256"))  # Probe results kept per file version
+    METADATA_BACKEND = os.environ.get("METADATA_BACKEND", "auto").lower()  # auto = hachoir/mutagen first, ffprobe = always spawn
+    METADATA_THREADS = int(os.environ.get("METADATA_THREADS", "2"))        # Threads for in-process header parsing
+    FFMPEG_NICE = int(os.environ.get("FFMPEG_NICE", "10"))                 # Base nice level for ffmpeg
+    FFMPEG_IONICE_CLASS = int(os.environ.get("FFMPEG_IONICE_CLASS", "2"))  # 1=realtime, 2=best-effort, 3=idle, 0=off
+    PREMIUM_USERS = [int(x) for x in os.environ.get("PREMIUM_USERS", "").replace(",", " ").split()]  # Priority lane after owner
     
     # ===== FFMPEG CONFIGURATION =====
     # Enhanced FFmpeg settings
@@ -101,6 +125,25 @@ class Config(object):
     VIDEO_CODEC = os.environ.get("VIDEO_CODEC", "libx264")     # Video codec
     AUDIO_CODEC = os.environ.get("AUDIO_CODEC", "aac")         # Audio codec
     
+    # ===== ENCODER CALIBRATION =====
+    # Optional benchmark that picks FFMPEG_PRESET and threads for this host (/calibrate)
+    CALIBRATE_ON_STARTUP = os.environ.get("CALIBRATE_ON_STARTUP", "false").lower() == "true"
+    CALIBRATION_PRESETS = os.environ.get("CALIBRATION_PRESETS", "ultrafast,superfast,veryfast,faster,fast,medium")
+    CALIBRATION_SECONDS = int(os.environ.get("CALIBRATION_SECONDS", "5"))                    # Synthetic clip length
+    CALIBRATION_TARGET_SPEED = float(os.environ.get("CALIBRATION_TARGET_SPEED", "1.0"))      # Required realtime factor at 720p
+    ENCODER_PROFILE_FILE = os.environ.get("ENCODER_PROFILE_FILE", "encoder_profile.json")
+    MAX_PARALLEL_TRANSCODES = int(os.environ.get("MAX_PARALLEL_TRANSCODES", "0"))  # Robust merge worker pool (0 = scheduler job limit)
+    ESTIMATED_ENCODE_SPEED = float(os.environ.get("ESTIMATED_ENCODE_SPEED", "1.0"))  # Re-encode speed (x realtime) for merge plans
+    FAST_PATH_HISTORY_FILE = os.environ.get("FAST_PATH_HISTORY_FILE", "fast_path_history.json")  # Copy strategy that worked per stream fingerprint
+    MERGE_JOBS_DIR = os.environ.get("MERGE_JOBS_DIR", "merge_jobs")   # Robust merge checkpoints (kept across restarts)
+    MERGE_JOB_TTL = int(os.environ.get("MERGE_JOB_TTL", "24"))        # Hours an interrupted merge can be resumed
+    MERGE_RESULT_INDEX_FILE = os.environ.get("MERGE_RESULT_INDEX_FILE", "merge_results.json")  # Delivered merges by input identity
+    MERGE_RESULT_INDEX_SIZE = int(os.environ.get("MERGE_RESULT_INDEX_SIZE", "1000"))           # Entries kept (oldest dropped)
+    THUMBNAIL_CACHE_DIR = os.environ.get("THUMBNAIL_CACHE_DIR", "cache/thumbnails")  # Thumbnails/contact sheets by content hash
+    THUMBNAIL_CACHE_SIZE = int(os.environ.get("THUMBNAIL_CACHE_SIZE", "200"))        # JPEGs kept (oldest pruned)
+    INPUT_STORE_DIR = os.environ.get("INPUT_STORE_DIR", "cache/inputs")              # Downloaded inputs by content key
+    INPUT_STORE_SIZE_GB = float(os.environ.get("INPUT_STORE_SIZE_GB", "10"))         # Disk budget, LRU eviction (0 = off)
+    
     # ===== UI AND PROGRESS SETTINGS =====
     # Progress bar and UI configuration
     PROGRESS_BAR_LENGTH = int(os.environ.get("PROGRESS_BAR_LENGTH", "20"))
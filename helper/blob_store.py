@@ -0,0 +1,236 @@
+# Enhanced Input Blob Store
+# Content-addressed cache of downloaded inputs, hardlinked into job directories
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+from typing import Optional, Dict, Any, List, Tuple
+from config import Config
+from __init__ import LOGGER
+
+ALIASES_FILE = "aliases.json"
+
+# Resumable partial downloads older than this are treated as abandoned
+PARTIAL_TTL = 24 * 3600
+
+def telegram_blob_key(file_unique_id: str) -> str:
+    return f"tg_{file_unique_id}"
+
+def sha256_blob_key(digest: str) -> str:
+    return f"sha256_{digest}"
+
+def sha256_file(path: str) -> str:
+    """sha256 of a finished file, for downloads written out of order (blocking)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(Config.DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BlobStore:
+    """
+    Downloaded inputs stored once by content key (Telegram file_unique_id or the
+    sha256 computed while downloading a URL) and hardlinked into per-job directories.
+
+    Blob mtime is the LRU clock. A running byte total is kept; only when it grows past
+    the budget is the store scanned (on a worker thread) and the least recently used
+    blobs deleted, except those still linked into a job directory.
+    URL identities (URL + ETag) are aliased to their sha256 key so a known URL is
+    served without touching the network.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        os.makedirs(os.path.join(self.directory, "tmp"), mode=0o755, exist_ok=True)
+        self.aliases = self._load_aliases()  # URL identity -> blob key
+        blobs = self._scan()
+        self.blobs = len(blobs)
+        self.bytes = sum(size for _, size, _, _ in blobs)
+        self._evicting = None  # Running eviction (executor future)
+
+    def _load_aliases(self) -> Dict[str, str]:
+        path = os.path.join(self.directory, ALIASES_FILE)
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            LOGGER.warning(f"Could not load blob aliases: {e}")
+        return {}
+
+    def _save_aliases(self):
+        # Aliases of evicted blobs are dropped here
+        self.aliases = {identity: key for identity, key in self.aliases.items() if os.path.exists(self.blob_path(key))}
+        path = os.path.join(self.directory, ALIASES_FILE)
+        try:
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(self.aliases, f)
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            LOGGER.error(f"Could not save blob aliases: {e}")
+
+    def blob_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[-2:], key)
+
+    def temp_path(self, name: str) -> str:
+        """Scratch path inside the store (same filesystem, so commit() is a rename)"""
+        return os.path.join(self.directory, "tmp", f"{name}_{time.time_ns()}.part")
+
+    def partial_path(self, key: str) -> str:
+        """Stable in-progress path for a key, so an interrupted download can resume"""
+        return os.path.join(self.directory, "tmp", f"{key}.part")
+
+    def resolve(self, identity: str) -> Optional[str]:
+        """Blob key for a URL identity, if that content is stored"""
+        key = self.aliases.get(identity)
+        return key if key and os.path.exists(self.blob_path(key)) else None
+
+    def link(self, key: Optional[str], dest_path: str) -> bool:
+        """Hardlink a stored blob to dest_path (copy across filesystems); False on a miss"""
+        blob = self.blob_path(key) if key else None
+        if not blob or not os.path.exists(blob):
+            self.misses += 1
+            return False
+
+        try:
+            self._link_blob(blob, dest_path)
+        except FileNotFoundError:
+            self.misses += 1  # Evicted in the meantime
+            return False
+        self.hits += 1
+        return True
+
+    def _link_blob(self, blob: str, dest_path: str):
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(blob, dest_path)
+        except OSError:
+            shutil.copyfile(blob, dest_path)
+        os.utime(blob)  # Mark as recently used
+
+    def commit(self, temp_path: str, key: str, dest_path: str, identity: Optional[str] = None):
+        """
+        Move a finished download into the store and link it to dest_path.
+        identity (URL + validator) is remembered as an alias of key.
+        """
+        blob = self.blob_path(key)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            # Same content arrived through another URL/user (its partial may already be gone)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        else:
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, blob)
+            self.blobs += 1
+            self.bytes += size
+
+        if identity:
+            self.aliases[identity] = key
+            self._save_aliases()
+        # Link first so eviction sees the new blob as in use
+        self._link_blob(blob, dest_path)
+        if self.bytes > self.max_bytes:
+            self.evict()
+
+    def _scan(self) -> List[Tuple[float, int, int, str]]:
+        """(mtime, size, links, path) of every blob (blocking)"""
+        blobs = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name == "tmp":
+                continue
+            for blob in os.scandir(entry.path):
+                stat = blob.stat()
+                blobs.append((stat.st_mtime, stat.st_size, stat.st_nlink, blob.path))
+        return blobs
+
+    def _evict_blobs(self) -> Tuple[int, int]:
+        """Delete least recently used blobs until the store fits max_bytes (blocking)"""
+        blobs = self._scan()
+        total = sum(size for _, size, _, _ in blobs)
+        removed = 0
+        removed_bytes = 0
+        for _, size, links, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            if links > 1:
+                continue  # Still hardlinked into a running job
+            os.remove(path)
+            total -= size
+            removed += 1
+            removed_bytes += size
+            LOGGER.info(f"Evicted input blob {os.path.basename(path)} ({size} bytes)")
+        return removed, removed_bytes
+
+    def _evicted(self, removed: int, removed_bytes: int):
+        self.blobs -= removed
+        self.bytes -= removed_bytes
+        self.evicted += removed
+        if removed:
+            self._save_aliases()
+
+    def evict(self):
+        """Shrink the store to max_bytes; on a worker thread when called from the event loop"""
+        if self._evicting and not self._evicting.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._evicted(*self._evict_blobs())
+            return
+
+        def done(future):
+            if future.cancelled():
+                return
+            if future.exception():
+                LOGGER.error(f"Input store eviction failed: {future.exception()}")
+            else:
+                self._evicted(*future.result())
+
+        self._evicting = loop.run_in_executor(None, self._evict_blobs)
+        self._evicting.add_done_callback(done)
+
+    def clear_temp(self):
+        """Remove partial downloads left by a crash (recent resumable ones are kept)"""
+        temp_dir = os.path.join(self.directory, "tmp")
+        cutoff = time.time() - PARTIAL_TTL
+        names = set(os.listdir(temp_dir))
+        for name in names:
+            path = os.path.join(temp_dir, name)
+            resumable = name.endswith(".part.json") or f"{name}.json" in names
+            try:
+                if not resumable or os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'blobs': self.blobs,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicted': self.evicted
+        }
+
+# Global input store (None when disabled)
+input_store = BlobStore(Config.INPUT_STORE_DIR, int(Config.INPUT_STORE_SIZE_GB * 1024 ** 3)) if Config.INPUT_STORE_SIZE_GB > 0 else None
+
+# Export blob store components
+__all__ = [
+    'BlobStore',
+    'input_store',
+    'telegram_blob_key',
+    'sha256_blob_key',
+    'sha256_file'
+]
@@ -2,11 +2,12 @@
 # Advanced video compression from SunilSharmaNP/Sunil-CM with enhancements
 
 import os
-import asyncio
-import time
 from typing import Optional, Dict, Any, Callable
 from config import Config
-from helpers.utils import get_readable_file_size, get_video_info
+from helpers.utils import get_readable_file_size, format_progress_time
+from helpers.media_probe import media_probe
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.encoder_calibration import get_encoder_profile
 from __init__ import LOGGER
 
 class VideoCompressor:
@@ -46,7 +47,8 @@ class VideoCompressor:
         output_path: str,
         quality: str = 'balanced',
         target_size_mb: Optional[int] = None,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        user_id: Optional[int] = None
     ) -> bool:
         """Compress video with specified quality preset"""
         if not os.path.exists(input_path):
@@ -55,7 +57,7 @@ class VideoCompressor:
         
         try:
             # Get video info
-            video_info = get_video_info(input_path)
+            video_info = (await media_probe.probe(input_path)).to_video_info()
             duration = video_info.get('duration', 0)
             
             if duration <= 0:
@@ -77,7 +79,7 @@ class VideoCompressor:
             LOGGER.info(f"Command: {' '.join(cmd)}")
             
             # Run compression with progress monitoring
-            success = await self._run_compression(cmd, duration, progress_callback)
+            success = await self._run_compression(cmd, duration, progress_callback, user_id)
             
             if success and os.path.exists(output_path):
                 # Verify output file
@@ -110,7 +112,7 @@ class VideoCompressor:
             'ffmpeg', '-y', '-i', input_path,
             '-c:v', Config.VIDEO_CODEC,
             '-crf', str(settings.get('crf', 23)),
-            '-preset', settings.get('preset', 'medium'),
+            '-preset', get_encoder_profile().clamp_preset(settings.get('preset', 'medium')),
             '-c:a', Config.AUDIO_CODEC,
             '-b:a', settings.get('audio_bitrate', '192k'),
             '-movflags', '+faststart',  # Optimize for streaming
@@ -169,56 +171,31 @@ class VideoCompressor:
         self, 
         cmd: list, 
         duration: float,
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        user_id: Optional[int] = None
     ) -> bool:
         """Run FFmpeg compression with progress monitoring"""
         try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            start_time = time.time()
-            last_update = 0
-            
-            # Monitor process
-            while process.returncode is None:
-                current_time = time.time()
-                elapsed = current_time - start_time
-                
-                # Update progress every 3 seconds
-                if progress_callback and (current_time - last_update) >= 3.0:
-                    # Estimate progress based on time (rough approximation)
-                    estimated_progress = min(elapsed / (duration * 0.5), 1.0)  # Assume compression takes 50% of video duration
-                    
-                    try:
-                        await progress_callback(
-                            int(estimated_progress * 100), 
-                            100, 
-                            f"Compressing... ({elapsed:.0f}s elapsed)"
-                        )
-                    except Exception as e:
-                        LOGGER.warning(f"Progress callback error: {e}")
-                    
-                    last_update = current_time
-                
-                await asyncio.sleep(1)
-                
-                try:
-                    await asyncio.wait_for(process.wait(), timeout=0.1)
-                    break
-                except asyncio.TimeoutError:
-                    continue
+            async def report(progress):
+                eta = format_progress_time(int(progress.eta)) if progress.eta > 0 else "N/A"
+                await progress_callback(
+                    int(progress.percent),
+                    100,
+                    f"Compressing... {progress.speed:.2f}x, ETA {eta}"
+                )
             
-            stdout, stderr = await process.communicate()
+            async def report_queue(position):
+                await progress_callback(0, 100, f"Waiting for encoder slot... position {position}")
             
-            if process.returncode == 0:
-                return True
-            else:
-                error_output = stderr.decode('utf-8', errors='ignore')[-500:]
-                LOGGER.error(f"FFmpeg compression error: {error_output}")
-                return False
+            result = await run_ffmpeg(
+                cmd,
+                duration=duration,
+                operation="Compression",
+                progress_callback=report if progress_callback else None,
+                user_id=user_id,
+                queue_callback=report_queue if progress_callback else None
+            )
+            return result.success
                 
         except Exception as e:
             LOGGER.error(f"Compression process error: {e}")
@@ -231,7 +208,7 @@ class VideoCompressor:
     ) -> Dict[str, Any]:
         """Get estimated compression results without actually compressing"""
         try:
-            video_info = get_video_info(input_path)
+            video_info = (await media_probe.probe(input_path)).to_video_info()
             original_size = os.path.getsize(input_path)
             
             # Rough estimates based on quality preset
@@ -307,10 +284,13 @@ async def compress_video(
     input_path: str, 
     output_path: str, 
     quality: str = 'balanced',
-    progress_callback: Optional[Callable] = None
+    progress_callback: Optional[Callable] = None,
+    user_id: Optional[int] = None
 ) -> bool:
     """Legacy compression function"""
-    return await video_compressor.compress_video(input_path, output_path, quality, progress_callback=progress_callback)
+    return await video_compressor.compress_video(
+        input_path, output_path, quality, progress_callback=progress_callback, user_id=user_id
+    )
 
 def get_compression_presets() -> Dict[str, str]:
     """Get available compression presets (legacy)"""
@@ -0,0 +1,253 @@
+# Enhanced Disk Writer
+# Buffered file writes on a worker thread, so slow disks never stall the event loop
+
+import os
+import time
+import asyncio
+import shutil
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+from config import Config
+from __init__ import LOGGER
+
+# Bounds for one coalesced write; the target is DISK_FLUSH_SECONDS of measured bandwidth
+MIN_BUFFER_SIZE = 1024 * 1024
+MAX_BUFFER_SIZE = 16 * 1024 * 1024
+DISK_FLUSH_SECONDS = 0.25
+
+# Chunks passed to one writev call (stays under IOV_MAX)
+WRITEV_MAX_CHUNKS = 512
+
+class AsyncFileWriter:
+    """
+    Sequential file writer for streamed downloads.
+    Chunks are coalesced in memory and written (and optionally hashed) by a
+    dedicated thread. The buffer grows with the measured download rate, and at
+    most max_pending buffers wait for the disk: when the disk falls behind,
+    write() blocks, which stops reading from the socket (backpressure).
+    """
+
+    def __init__(self, path: str, size: Optional[int] = None, hasher=None, max_pending: int = 2):
+        self.path = path
+        self.size = size            # Expected size, preallocated when known
+        self.hasher = hasher        # Optional hashlib object, updated on the writer thread
+        self.written = 0            # Bytes accepted by write()
+        self.buffer_size = MIN_BUFFER_SIZE
+        self._buffer = []           # Chunks waiting to be written together
+        self._buffered = 0
+        self._slots = asyncio.Semaphore(max(1, max_pending))
+        self._pending = set()
+        self._error = None          # First failed background write, raised by the next write()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-writer")
+        self._file = None
+        self._started = 0.0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.abort()
+
+    def _open(self):
+        self._file = open(self.path, 'wb', buffering=0)
+        if self.size:
+            try:
+                os.posix_fallocate(self._file.fileno(), 0, self.size)
+            except (AttributeError, OSError):
+                pass  # Preallocation is an optimization only
+
+    def _write(self, chunks):
+        if self.hasher:
+            for chunk in chunks:
+                self.hasher.update(chunk)
+
+        # Vectored writes, without joining the chunks into a copy; resumes after short writes
+        fd = self._file.fileno()
+        index = 0
+        while index < len(chunks):
+            written = os.writev(fd, chunks[index:index + WRITEV_MAX_CHUNKS])
+            while index < len(chunks) and written >= len(chunks[index]):
+                written -= len(chunks[index])
+                index += 1
+            if written:
+                chunks[index] = memoryview(chunks[index])[written:]
+
+    def _finish(self, complete: bool = True):
+        # Drop preallocated space past the real end (short or mis-sized responses);
+        # after a failed write, keep only what reached the disk
+        try:
+            self._file.truncate(self.written if complete else self._file.tell())
+        finally:
+            self._file.close()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        await self._run(self._open)
+        self._started = time.time()
+
+    def _adapt_buffer(self):
+        """Flush about DISK_FLUSH_SECONDS of data at a time, within the size bounds"""
+        elapsed = time.time() - self._started
+        if elapsed > 0:
+            rate = self.written / elapsed
+            self.buffer_size = int(min(MAX_BUFFER_SIZE, max(MIN_BUFFER_SIZE, rate * DISK_FLUSH_SECONDS)))
+
+    async def write(self, chunk: bytes):
+        if self._error:
+            raise self._error  # Stop reading the socket once the disk has failed
+        if not chunk:
+            return
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        self.written += len(chunk)
+        if self._buffered >= self.buffer_size:
+            await self._flush()
+            self._adapt_buffer()
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        chunks = self._buffer
+        self._buffer = []
+        self._buffered = 0
+        await self._slots.acquire()  # Backpressure: wait while the disk is behind
+        task = asyncio.ensure_future(self._run(self._write, chunks))
+        self._pending.add(task)
+
+        def done(finished):
+            self._pending.discard(finished)
+            self._slots.release()
+            if not finished.cancelled() and finished.exception() and not self._error:
+                self._error = finished.exception()
+        task.add_done_callback(done)
+
+    async def close(self):
+        """Flush everything and close; raises if any write failed (the file is closed either way)"""
+        complete = False
+        try:
+            await self._flush()
+            if self._pending:
+                await asyncio.gather(*self._pending)
+            if self._error:
+                raise self._error  # A write that failed before close() was called
+            complete = True
+        finally:
+            if self._pending:
+                await asyncio.gather(*self._pending, return_exceptions=True)
+            try:
+                if self._file:
+                    await self._run(self._finish, complete)
+            finally:
+                self._executor.shutdown(wait=False)
+
+    async def abort(self):
+        """Stop writing and close the file as it is"""
+        self._buffer = []
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._file:
+            await self._run(self._file.close)
+        self._executor.shutdown(wait=False)
+
+class LoopLagMonitor:
+    """Samples how late a short sleep wakes up, i.e. how long the event loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._sample())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._task.cancel()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Lag in milliseconds: max, 99th percentile and mean"""
+        if not self.samples:
+            return {'max': 0.0, 'p99': 0.0, 'mean': 0.0}
+        ordered = sorted(self.samples)
+        return {
+            'max': ordered[-1] * 1000,
+            'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            'mean': sum(ordered) / len(ordered) * 1000
+        }
+
+async def benchmark_disk_writes(size_mb: int = 4096) -> Dict[str, Dict[str, Any]]:
+    """
+    Stream size_mb from a local stand-in server to disk twice, once with blocking
+    f.write calls on the event loop and once through AsyncFileWriter, while sampling
+    event-loop lag. Returns {'blocking': stats, 'async': stats} with lag in ms and MiB/s.
+    """
+    from aiohttp import web
+
+    size = size_mb * 1024 * 1024
+    block = os.urandom(1024 * 1024)
+
+    async def handler(request):
+        response = web.StreamResponse(headers={'Content-Length': str(size)})
+        await response.prepare(request)
+        for _ in range(size_mb):
+            await response.write(block)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get('/sample.bin', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/sample.bin"
+
+    work_dir = os.path.join(Config.DOWNLOAD_DIR, "disk_benchmark")
+    os.makedirs(work_dir, exist_ok=True)
+    results = {}
+    try:
+        async with aiohttp.ClientSession() as session:
+            for mode in ('blocking', 'async'):
+                path = os.path.join(work_dir, f"sample_{mode}.bin")
+                start = time.perf_counter()
+                with LoopLagMonitor() as monitor:
+                    async with session.get(url) as resp:
+                        if mode == 'blocking':
+                            with open(path, 'wb') as f:
+                                async for chunk in resp.content.iter_chunked(Config.DOWNLOAD_CHUNK_SIZE):
+                                    f.write(chunk)
+                        else:
+                            async with AsyncFileWriter(path, size) as writer:
+                                async for chunk in resp.content.iter_chunked(Config.DOWNLOAD_CHUNK_SIZE):
+                                    await writer.write(chunk)
+                elapsed = time.perf_counter() - start
+                results[mode] = {**monitor.get_stats(), 'speed': size / elapsed / (1024 * 1024)}
+                LOGGER.info(f"Disk write benchmark ({mode}): {results[mode]}")
+                os.remove(path)
+    finally:
+        await runner.cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+# Export disk writer components
+__all__ = [
+    'AsyncFileWriter',
+    'LoopLagMonitor',
+    'benchmark_disk_writes'
+]
@@ -4,35 +4,53 @@
 import aiohttp
 import os
 import time
+import shutil
 import asyncio
-from typing import Optional, Dict, Any
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List
 from pyrogram.types import Message
 from config import Config
 from helpers.utils import get_readable_file_size, format_progress_time, is_valid_url
+from helpers.blob_store import input_store, telegram_blob_key, sha256_blob_key, sha256_file
+from helpers.disk_writer import AsyncFileWriter
+from helpers.http_pool import http_pool
+from helpers.http_downloader import SegmentedHTTPDownload, RangeNotSupported, range_validator, partial_name
+from helpers.tg_downloader import ParallelTelegramDownload
+from helpers.status_renderer import smart_progress_editor
+from helpers.merge_checkpoint import remember_input_identity
 from __init__ import LOGGER, cache, performance_monitor
 
-# Global throttling to prevent FloodWait errors
-last_edit_time = {}
-EDIT_THROTTLE_SECONDS = Config.EDIT_THROTTLE_SECONDS
+# Range probe results per URL (size, validators), shared by every downloader
+url_heads = cache.namespace('url-head', ttl=600)
 
-async def smart_progress_editor(status_message, text: str):
+# Finished downloads by content key when there is no input store, linked for later requests
+finished_downloads = cache.namespace('finished-downloads', ttl=3600)
+
+# Transfers running per content key: [lock, holders]
+_transfers: Dict[str, List] = {}
+
+@asynccontextmanager
+async def _transfer(key: str, status_message):
     """
-    Enhanced progress editor that prevents FloodWait errors
-    Combines new repo's throttling with old repo's message handling
+    One transfer per content key at a time. A second request for the same file
+    (queued twice, or by another user) waits here and then finds the finished file
+    instead of writing into the same resumable partial.
     """
-    if not status_message or not hasattr(status_message, 'chat'):
-        return
-        
-    message_key = f"{status_message.chat.id}_{status_message.id}"
-    now = time.time()
-    last_time = last_edit_time.get(message_key, 0)
-    
-    if (now - last_time) > EDIT_THROTTLE_SECONDS:
-        try:
-            await status_message.edit_text(text)
-            last_edit_time[message_key] = now
-        except Exception as e:
-            LOGGER.warning(f"Failed to edit progress message: {e}")
+    entry = _transfers.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        if entry[0].locked():
+            await smart_progress_editor(
+                status_message,
+                "⏳ **Waiting for the same file...**\n➢ It is already being downloaded for another request"
+            )
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _transfers.pop(key, None)
 
 class EnhancedDownloader:
     """
@@ -42,7 +60,8 @@ class EnhancedDownloader:
     def __init__(self, user_id: int):
         self.user_id = user_id
         self.download_dir = f"{Config.DOWNLOAD_DIR}/{user_id}"
-        self.session = None
+        # Whole-request limit for this downloader's own GETs (the shared session has none)
+        self.timeout = aiohttp.ClientTimeout(total=Config.DOWNLOAD_TIMEOUT, connect=30, sock_read=60)
         self.downloaded_files = []
         self._ensure_directory()
         
@@ -58,33 +77,96 @@ class EnhancedDownloader:
             LOGGER.error(f"Failed to create download directory {self.download_dir}: {e}")
             raise
     
+    def _unique_path(self, filename: str) -> str:
+        """Destination in the job directory that never clobbers another input of the same name"""
+        dest_path = os.path.join(self.download_dir, filename)
+        base, extension = os.path.splitext(dest_path)
+        counter = 1
+        while True:
+            try:
+                # Reserve the name right away: concurrent queue items may share a filename
+                os.close(os.open(dest_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return dest_path
+            except FileExistsError:
+                dest_path = f"{base}_{counter}{extension}"
+                counter += 1
+    
+    def _link_finished(self, key: str, dest_path: str) -> bool:
+        """Link a file this process already downloaded (no input store) to dest_path"""
+        path = finished_downloads.get(key)
+        if not path or not os.path.exists(path):
+            return False
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(path, dest_path)
+        except OSError:
+            shutil.copyfile(path, dest_path)
+        return True
+    
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create aiohttp session with optimized settings"""
-        if not self.session or self.session.closed:
-            connector = aiohttp.TCPConnector(
-                limit=Config.MAX_CONCURRENT_DOWNLOADS,
-                limit_per_host=2,
-                keepalive_timeout=300,
-                enable_cleanup_closed=True
-            )
-            
-            timeout = aiohttp.ClientTimeout(
-                total=Config.DOWNLOAD_TIMEOUT,
-                connect=30,
-                sock_read=60
-            )
-            
-            self.session = aiohttp.ClientSession(
-                connector=connector,
-                timeout=timeout,
-                headers={
-                    'User-Agent': 'Enhanced-MERGE-BOT/6.0 (Telegram Bot)'
-                }
-            )
-            
-            LOGGER.debug(f"Created new HTTP session for user {self.user_id}")
+        """The bot-wide shared session (connections and DNS answers are reused across users)"""
+        return await http_pool.session()
+    
+    async def _probe_range(self, url: str, fresh: bool = False) -> Dict[str, Any]:
+        """
+        One-byte range request: range support, total size and cache validators.
+        Successful probes are cached; fresh=True asks the server again.
+        """
+        if fresh:
+            url_heads.delete(url)
+        try:
+            return await url_heads.get_or_compute(url, lambda: self._fetch_range_info(url))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Not cached: a transient error must not turn off ranges and resume for this URL
+            LOGGER.warning(f"Range check failed for {url[:50]}: {e}")
+            return {'size': 0, 'etag': None, 'last_modified': None, 'content_type': 'unknown'}
+    
+    async def _fetch_range_info(self, url: str) -> Dict[str, Any]:
+        info = {'size': 0, 'etag': None, 'last_modified': None, 'content_type': 'unknown'}
+        session = await self._get_session()
+        async with session.get(url, headers={'Range': 'bytes=0-0'}, timeout=self.timeout) as resp:
+            resp.raise_for_status()
+            # 206 + Content-Range means ffmpeg can seek and resume
+            total = resp.headers.get('Content-Range', '').rpartition('/')[2]
+            if resp.status == 206 and total.isdigit():
+                info['size'] = int(total)
+            if resp.status in (200, 206):
+                info['etag'] = resp.headers.get('ETag')
+                info['last_modified'] = resp.headers.get('Last-Modified')
+                info['content_type'] = resp.headers.get('Content-Type', 'unknown')
+        
+        return info
+    
+    async def check_remote_input(self, url: str) -> Optional[int]:
+        """
+        Check whether ffmpeg can read a URL in place instead of downloading it.
+        Returns the file size when the server honours range requests, otherwise None
+        (the caller then falls back to a local download).
+        """
+        if not url.startswith(('http://', 'https://')) or not is_valid_url(url):
+            return None
+        
+        size = (await self._probe_range(url))['size']
+        max_size = Config.MAX_FILE_SIZE_PREMIUM if Config.IS_PREMIUM else Config.MAX_FILE_SIZE_FREE
+        if not size or size > max_size:
+            # Let the regular download path handle it (and report the size limit)
+            return None
         
-        return self.session
+        LOGGER.info(f"Remote input supports range reads ({get_readable_file_size(size)}): {url[:50]}")
+        return size
+    
+    async def remote_identity(self, url: str, fresh: bool = False) -> Optional[str]:
+        """
+        Content identity of a URL (URL + ETag or Last-Modified), or None when the server
+        gives no validator and the content cannot be told apart from a changed file
+        """
+        if not url.startswith(('http://', 'https://')) or not is_valid_url(url):
+            return None
+        
+        info = await self._probe_range(url, fresh)
+        validator = info['etag'] or info['last_modified']
+        return f"{url}|{validator}" if validator else None
     
     async def download_from_url(self, url: str, status_message, filename: str = None) -> Optional[str]:
         """
@@ -92,27 +174,56 @@ class EnhancedDownloader:
         Improved version of new repo's downloader with old repo compatibility
         """
         if not is_valid_url(url):
-            await status_message.edit_text("❌ **Invalid URL!** Please provide a valid direct download link.")
+            await smart_progress_editor(status_message, "❌ **Invalid URL!** Please provide a valid direct download link.")
             return None
         
-        # Check cache first
-        cache_key = f"url_info_{hash(url)}"
-        cached_info = cache.get(cache_key)
-        
         if not filename:
             filename = url.split('/')[-1] or f"download_{int(time.time())}.mp4"
             # Remove query parameters from filename
             filename = filename.split('?')[0]
         
-        dest_path = os.path.join(self.download_dir, filename)
+        dest_path = self._unique_path(filename)
+        return await self._reserved_transfer(
+            f"url:{url}", dest_path, status_message,
+            lambda: self._download_from_url(url, status_message, filename, dest_path)
+        )
+    
+    async def _reserved_transfer(self, key: str, dest_path: str, status_message, download) -> Optional[str]:
+        """
+        Run download() under the transfer lock for key. A failed or cancelled download
+        removes its reserved destination, so no empty or preallocated file is left for
+        a later merge or cleanup to take as an input.
+        """
+        result = None
+        try:
+            async with _transfer(key, status_message):
+                result = await download()
+            return result
+        finally:
+            if not result and os.path.exists(dest_path):
+                os.remove(dest_path)
+    
+    async def _download_from_url(self, url: str, status_message, filename: str, dest_path: str) -> Optional[str]:
+        # Same URL and validator seen before: link the stored content, no download
+        identity = await self.remote_identity(url)
+        if identity and (input_store.resolve(identity) if input_store else finished_downloads.get(f"url:{identity}")):
+            # The probe may be cached: confirm the validator before reusing stored content
+            identity = await self.remote_identity(url, fresh=True)
+        if input_store:
+            blob_key = input_store.resolve(identity) if identity else None
+            hit = bool(blob_key) and input_store.link(blob_key, dest_path)
+        else:
+            blob_key = f"url:{identity}" if identity else None
+            hit = bool(blob_key) and self._link_finished(blob_key, dest_path)
+        if hit:
+            remember_input_identity(dest_path, blob_key)
+            LOGGER.info(f"Input store hit, skipping download: {filename}")
+            await smart_progress_editor(status_message, f"✅ **File Already Downloaded!**\n`{filename}`")
+            self.downloaded_files.append(dest_path)
+            return dest_path
         
-        # Avoid duplicate downloads
-        if os.path.exists(dest_path):
-            existing_size = os.path.getsize(dest_path)
-            if existing_size > 0:
-                LOGGER.info(f"File already exists, skipping download: {filename}")
-                await status_message.edit_text(f"✅ **File Already Downloaded!**\n`{filename}`")
-                return dest_path
+        # Stored inputs are written inside the store and linked here once complete
+        write_path = input_store.temp_path("url") if input_store else dest_path
         
         try:
             session = await self._get_session()
@@ -126,7 +237,15 @@ class EnhancedDownloader:
                 f"🔗 **Connecting to URL...**\n➢ `{filename[:50]}{'...' if len(filename) > 50 else ''}`\n➢ **Status:** Establishing connection..."
             )
             
-            async with session.get(url) as resp:
+            # Range-capable servers get several segment connections at once
+            range_info = await self._probe_range(url)
+            if Config.HTTP_DOWNLOAD_CONNECTIONS > 1 and range_info['size'] >= Config.HTTP_PARALLEL_MIN_SIZE:
+                try:
+                    return await self._download_segmented(url, range_info, filename, dest_path, identity, status_message)
+                except RangeNotSupported as e:
+                    LOGGER.info(f"Ranged download refused ({e}), using a single stream: {url[:50]}")
+            
+            async with session.get(url, timeout=self.timeout) as resp:
                 if resp.status != 200:
                     error_msg = f"❌ **Download Failed!**\n**Status:** {resp.status}\n**URL:** `{url[:50]}...`"
                     if resp.status == 403:
@@ -136,7 +255,7 @@ class EnhancedDownloader:
                     elif resp.status == 429:
                         error_msg += "\n**Reason:** Rate limited, try again later"
                     
-                    await status_message.edit_text(error_msg)
+                    await smart_progress_editor(status_message, error_msg)
                     performance_monitor.end_operation(f"url_download_{self.user_id}", success=False)
                     return None
                 
@@ -144,19 +263,12 @@ class EnhancedDownloader:
                 total_size = int(resp.headers.get('content-length', 0))
                 content_type = resp.headers.get('content-type', 'unknown')
                 
-                # Cache file info
-                file_info = {
-                    'size': total_size,
-                    'content_type': content_type,
-                    'filename': filename
-                }
-                cache.set(cache_key, file_info, ttl=3600)  # Cache for 1 hour
-                
                 # Check file size limits
                 max_size = Config.MAX_FILE_SIZE_PREMIUM if Config.IS_PREMIUM else Config.MAX_FILE_SIZE_FREE
                 if total_size > max_size:
                     size_limit = "4GB" if Config.IS_PREMIUM else "2GB"
-                    await status_message.edit_text(
+                    await smart_progress_editor(
+                        status_message,
                         f"❌ **File Too Large!**\n"
                         f"**File Size:** `{get_readable_file_size(total_size)}`\n"
                         f"**Limit:** `{size_limit}`\n"
@@ -168,10 +280,12 @@ class EnhancedDownloader:
                 downloaded = 0
                 start_time = time.time()
                 last_update = 0
+                digest = hashlib.sha256()  # Content key for the input store (hashed on the writer thread)
                 
-                with open(dest_path, 'wb') as f:
+                # Disk writes and hashing run off the event loop; a slow disk throttles the socket reads
+                async with AsyncFileWriter(write_path, total_size or None, hasher=digest) as writer:
                     async for chunk in resp.content.iter_chunked(Config.DOWNLOAD_CHUNK_SIZE):
-                        f.write(chunk)
+                        await writer.write(chunk)
                         downloaded += len(chunk)
                         
                         # Update progress with throttling
@@ -195,17 +309,25 @@ class EnhancedDownloader:
                             last_update = current_time
                 
                 # Verify download completion
-                final_size = os.path.getsize(dest_path)
+                final_size = os.path.getsize(write_path)
                 if total_size > 0 and final_size != total_size:
-                    await status_message.edit_text("❌ **Download Incomplete!** File may be corrupted.")
-                    os.remove(dest_path)
+                    await smart_progress_editor(status_message, "❌ **Download Incomplete!** File may be corrupted.")
+                    os.remove(write_path)
                     return None
                 
+                blob_key = sha256_blob_key(digest.hexdigest())
+                if input_store:
+                    input_store.commit(write_path, blob_key, dest_path, identity)
+                elif identity:
+                    finished_downloads.set(f"url:{identity}", dest_path)
+                remember_input_identity(dest_path, blob_key)
+                
                 # Success message
                 download_time = time.time() - start_time
                 avg_speed = final_size / download_time if download_time > 0 else 0
                 
-                await status_message.edit_text(
+                await smart_progress_editor(
+                    status_message,
                     f"✅ **Download Complete!**\n"
                     f"➢ **File:** `{filename}`\n"
                     f"➢ **Size:** `{get_readable_file_size(final_size)}`\n"
@@ -222,39 +344,154 @@ class EnhancedDownloader:
                 
         except asyncio.TimeoutError:
             error_msg = "❌ **Download Timeout!**\nThe download took too long and was cancelled."
-            await status_message.edit_text(error_msg)
+            await smart_progress_editor(status_message, error_msg)
             LOGGER.error(f"Download timeout for {url}")
         except aiohttp.ClientError as e:
             error_msg = f"❌ **Network Error!**\nFailed to connect: `{str(e)}`"
-            await status_message.edit_text(error_msg)
+            await smart_progress_editor(status_message, error_msg)
             LOGGER.error(f"Network error downloading {url}: {e}")
         except Exception as e:
             error_msg = f"❌ **Download Failed!**\nUnexpected error: `{str(e)}`"
-            await status_message.edit_text(error_msg)
+            await smart_progress_editor(status_message, error_msg)
             LOGGER.error(f"Unexpected error downloading {url}: {e}")
         
+        if input_store and os.path.exists(write_path):
+            os.remove(write_path)
         performance_monitor.end_operation(f"url_download_{self.user_id}", success=False)
         return None
     
+    async def _download_segmented(
+        self,
+        url: str,
+        range_info: Dict[str, Any],
+        filename: str,
+        dest_path: str,
+        identity: Optional[str],
+        status_message
+    ) -> Optional[str]:
+        """
+        Segmented download for range-capable servers (called by download_from_url).
+        Progress is kept in a stable partial file, so sending the same link again
+        after a failure resumes it. Raises RangeNotSupported to request a single stream.
+        """
+        total_size = range_info['size']
+        max_size = Config.MAX_FILE_SIZE_PREMIUM if Config.IS_PREMIUM else Config.MAX_FILE_SIZE_FREE
+        if total_size > max_size:
+            size_limit = "4GB" if Config.IS_PREMIUM else "2GB"
+            await smart_progress_editor(
+                status_message,
+                f"❌ **File Too Large!**\n"
+                f"**File Size:** `{get_readable_file_size(total_size)}`\n"
+                f"**Limit:** `{size_limit}`\n"
+                f"**Solution:** Use premium account for larger files"
+            )
+            performance_monitor.end_operation(f"url_download_{self.user_id}", success=False)
+            return None
+        
+        partial_path = (
+            input_store.partial_path(partial_name(url)) if input_store
+            else os.path.join(self.download_dir, f"{partial_name(url)}.part")
+        )
+        start_time = time.time()
+        download = None
+        
+        async def progress_callback(current, total):
+            progress = current / total if total > 0 else 0
+            elapsed_time = time.time() - start_time
+            # Aggregate throughput of this run (bytes resumed from disk are not counted)
+            speed = download.fetched_bytes / elapsed_time if elapsed_time > 0 else 0
+            eta = (total - current) / speed if speed > 0 else 0
+            
+            progress_text = (
+                f"📥 **Downloading from URL...**\n"
+                f"➢ `{filename}`\n"
+                f"➢ {self._get_progress_bar(progress)} `{progress:.1%}`\n"
+                f"➢ **Size:** `{get_readable_file_size(current)}` / "
+                f"`{get_readable_file_size(total)}`\n"
+                f"➢ **Speed:** `{get_readable_file_size(int(speed))}/s` over "
+                f"`{Config.HTTP_DOWNLOAD_CONNECTIONS}` connections\n"
+                f"➢ **ETA:** `{format_progress_time(int(eta))}`"
+            )
+            await smart_progress_editor(status_message, progress_text)
+        
+        download = SegmentedHTTPDownload(
+            await self._get_session(), url, partial_path, total_size,
+            range_validator(range_info['etag'], range_info['last_modified']),
+            Config.HTTP_DOWNLOAD_CONNECTIONS, progress_callback
+        )
+        if not await download.run():
+            await smart_progress_editor(
+                status_message,
+                "❌ **Download Interrupted!**\nProgress is saved, send the link again to resume."
+            )
+            performance_monitor.end_operation(f"url_download_{self.user_id}", success=False)
+            return None
+        
+        if input_store:
+            # Segments arrive out of order, so the content key is hashed afterwards
+            digest = await asyncio.get_running_loop().run_in_executor(None, sha256_file, partial_path)
+            input_store.commit(partial_path, sha256_blob_key(digest), dest_path, identity)
+            remember_input_identity(dest_path, sha256_blob_key(digest))
+        else:
+            os.replace(partial_path, dest_path)
+            if identity:
+                finished_downloads.set(f"url:{identity}", dest_path)
+                remember_input_identity(dest_path, f"url:{identity}")
+        
+        # Success message
+        download_time = time.time() - start_time
+        avg_speed = download.fetched_bytes / download_time if download_time > 0 else 0
+        
+        await smart_progress_editor(
+            status_message,
+            f"✅ **Download Complete!**\n"
+            f"➢ **File:** `{filename}`\n"
+            f"➢ **Size:** `{get_readable_file_size(total_size)}`\n"
+            f"➢ **Time:** `{format_progress_time(int(download_time))}`\n"
+            f"➢ **Speed:** `{get_readable_file_size(int(avg_speed))}/s`\n"
+            f"➢ **Type:** `{range_info['content_type']}`"
+        )
+        
+        self.downloaded_files.append(dest_path)
+        performance_monitor.end_operation(f"url_download_{self.user_id}", success=True)
+        LOGGER.info(f"Successfully downloaded: {filename} ({get_readable_file_size(total_size)})")
+        
+        return dest_path
+    
     async def download_from_telegram(self, message: Message, status_message) -> Optional[str]:
         """
         Download file from Telegram with enhanced progress tracking
         Maintains compatibility with old repo's message handling
         """
+        media = message and (message.video or message.document or message.audio)
+        if not media:
+            await smart_progress_editor(status_message, "❌ **No Media Found!** The message doesn't contain a downloadable file.")
+            return None
+        
+        filename = media.file_name or f"telegram_file_{int(time.time())}.{self._get_file_extension(media)}"
+        dest_path = self._unique_path(filename)
+        return await self._reserved_transfer(
+            telegram_blob_key(media.file_unique_id), dest_path, status_message,
+            lambda: self._download_from_telegram(message, media, status_message, filename, dest_path)
+        )
+    
+    async def _download_from_telegram(self, message: Message, media, status_message, filename: str, dest_path: str) -> Optional[str]:
         try:
-            media = message.video or message.document or message.audio
-            if not media:
-                await status_message.edit_text("❌ **No Media Found!** The message doesn't contain a downloadable file.")
-                return None
-            
-            filename = media.file_name or f"telegram_file_{int(time.time())}.{self._get_file_extension(media)}"
-            dest_path = os.path.join(self.download_dir, filename)
+            # Already stored (earlier merge, retry or another user): link it, no download
+            blob_key = telegram_blob_key(media.file_unique_id)
+            if input_store.link(blob_key, dest_path) if input_store else self._link_finished(blob_key, dest_path):
+                remember_input_identity(dest_path, blob_key)
+                LOGGER.info(f"Input store hit, skipping Telegram download: {filename}")
+                await smart_progress_editor(status_message, f"✅ **File Already Downloaded!**\n`{filename}`")
+                self.downloaded_files.append(dest_path)
+                return dest_path
             
             # Check file size limits
             max_size = Config.MAX_FILE_SIZE_PREMIUM if Config.IS_PREMIUM else Config.MAX_FILE_SIZE_FREE
             if media.file_size > max_size:
                 size_limit = "4GB" if Config.IS_PREMIUM else "2GB"
-                await status_message.edit_text(
+                await smart_progress_editor(
+                    status_message,
                     f"❌ **File Too Large!**\n"
                     f"**File:** `{filename}`\n"
                     f"**Size:** `{get_readable_file_size(media.file_size)}`\n"
@@ -269,10 +506,15 @@ class EnhancedDownloader:
             # Progress callback for pyrogram download
             start_time = time.time()
             
+            parallel = Config.TG_DOWNLOAD_CONNECTIONS > 1 and media.file_size >= Config.TG_PARALLEL_MIN_SIZE
+            download = None
+            
             async def progress_callback(current, total):
                 progress = current / total if total > 0 else 0
                 elapsed_time = time.time() - start_time
-                speed = current / elapsed_time if elapsed_time > 0 else 0
+                # Aggregate throughput of this run (bytes resumed from disk are not counted)
+                fetched = download.fetched_bytes if download else current
+                speed = fetched / elapsed_time if elapsed_time > 0 else 0
                 eta = (total - current) / speed if speed > 0 else 0
                 
                 progress_text = (
@@ -281,30 +523,63 @@ class EnhancedDownloader:
                     f"➢ {self._get_progress_bar(progress)} `{progress:.1%}`\n"
                     f"➢ **Size:** `{get_readable_file_size(current)}` / "
                     f"`{get_readable_file_size(total)}`\n"
-                    f"➢ **Speed:** `{get_readable_file_size(int(speed))}/s`\n"
+                    f"➢ **Speed:** `{get_readable_file_size(int(speed))}/s`"
+                    f"{f' over `{Config.TG_DOWNLOAD_CONNECTIONS}` connections' if parallel else ''}\n"
                     f"➢ **ETA:** `{format_progress_time(int(eta))}`"
                 )
                 await smart_progress_editor(status_message, progress_text)
             
-            # Download the file
-            file_path = await message.download(
-                file_name=dest_path,
-                progress=progress_callback
-            )
+            if parallel:
+                # Parallel ranges into a stable partial file that survives errors and restarts
+                partial_path = (
+                    input_store.partial_path(blob_key) if input_store
+                    else os.path.join(self.download_dir, f"{media.file_unique_id}.part")
+                )
+                download = ParallelTelegramDownload(
+                    message._client, message, partial_path,
+                    Config.TG_DOWNLOAD_CONNECTIONS, progress_callback
+                )
+                if not await download.run():
+                    await smart_progress_editor(
+                        status_message,
+                        "❌ **Download Interrupted!**\nProgress is saved, send the merge again to resume."
+                    )
+                    performance_monitor.end_operation(f"tg_download_{self.user_id}", success=False)
+                    return None
+                
+                if input_store:
+                    file_path = partial_path
+                else:
+                    os.replace(partial_path, dest_path)
+                    file_path = dest_path
+            else:
+                # Download the file (into the store when enabled, then linked to dest_path)
+                file_path = await message.download(
+                    file_name=input_store.temp_path(blob_key) if input_store else dest_path,
+                    progress=progress_callback
+                )
             
             # Verify download
-            if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-                await status_message.edit_text("❌ **Download Failed!** File may be corrupted or incomplete.")
-                if os.path.exists(file_path):
+            if not file_path or not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+                await smart_progress_editor(status_message, "❌ **Download Failed!** File may be corrupted or incomplete.")
+                if file_path and os.path.exists(file_path):
                     os.remove(file_path)
                 return None
             
+            if input_store:
+                input_store.commit(file_path, blob_key, dest_path)
+                file_path = dest_path
+            else:
+                finished_downloads.set(blob_key, file_path)
+            remember_input_identity(file_path, blob_key)
+            
             # Success message
             download_time = time.time() - start_time
             file_size = os.path.getsize(file_path)
             avg_speed = file_size / download_time if download_time > 0 else 0
             
-            await status_message.edit_text(
+            await smart_progress_editor(
+                status_message,
                 f"✅ **Download Complete!**\n"
                 f"➢ **File:** `{filename}`\n"
                 f"➢ **Size:** `{get_readable_file_size(file_size)}`\n"
@@ -320,7 +595,7 @@ class EnhancedDownloader:
             
         except Exception as e:
             error_msg = f"❌ **Telegram Download Failed!**\nError: `{str(e)}`"
-            await status_message.edit_text(error_msg)
+            await smart_progress_editor(status_message, error_msg)
             LOGGER.error(f"Telegram download error: {e}")
             performance_monitor.end_operation(f"tg_download_{self.user_id}", success=False)
             return None
@@ -349,11 +624,6 @@ class EnhancedDownloader:
     async def cleanup(self):
         """Clean up resources and temporary files"""
         try:
-            # Close HTTP session
-            if self.session and not self.session.closed:
-                await self.session.close()
-                LOGGER.debug(f"Closed HTTP session for user {self.user_id}")
-            
             # Optional: Clean up downloaded files (if auto-cleanup is enabled)
             if Config.AUTO_DELETE_FILES and hasattr(self, 'downloaded_files'):
                 for file_path in self.downloaded_files:
@@ -375,7 +645,7 @@ class EnhancedDownloader:
             'user_id': self.user_id,
             'download_dir': self.download_dir,
             'files_downloaded': len(self.downloaded_files) if hasattr(self, 'downloaded_files') else 0,
-            'session_active': self.session and not self.session.closed if self.session else False
+            'session_active': http_pool.active
         }
 
 # Legacy functions for compatibility with old repo
@@ -0,0 +1,250 @@
+# Enhanced Encoder Calibration Module
+# Benchmarks the configured video encoder on this host and persists the best preset/thread profile
+
+import os
+import json
+import time
+from typing import List, Optional, Callable, Dict, Any
+from config import Config
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler
+from __init__ import LOGGER
+
+# x264/x265 presets from fastest to slowest
+PRESET_ORDER = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow']
+
+# Encoders that understand the preset names above
+CALIBRATABLE_ENCODERS = ('libx264', 'libx265')
+
+# Synthetic clip used for every benchmark run
+CALIBRATION_SIZE = "1280x720"
+CALIBRATION_FPS = 30
+
+class EncoderProfile:
+    """Encoder settings chosen for this host (falls back to the static config)"""
+
+    def __init__(
+        self,
+        codec: str,
+        preset: str,
+        threads: Optional[int] = None,
+        fps: float = 0.0,
+        speed: float = 0.0,
+        cpus: int = 0,
+        calibrated_at: float = 0.0
+    ):
+        self.codec = codec
+        self.preset = preset
+        self.threads = threads          # ffmpeg threads per job (None = scheduler budget)
+        self.fps = fps                  # Measured 720p encode fps
+        self.speed = speed              # Measured realtime factor
+        self.cpus = cpus
+        self.calibrated_at = calibrated_at
+
+    @property
+    def calibrated(self) -> bool:
+        return self.calibrated_at > 0
+
+    def clamp_preset(self, preset: str) -> str:
+        """Never use a preset slower than this host can sustain"""
+        if not self.calibrated or preset not in PRESET_ORDER or self.preset not in PRESET_ORDER:
+            return preset
+        return PRESET_ORDER[min(PRESET_ORDER.index(preset), PRESET_ORDER.index(self.preset))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'codec': self.codec,
+            'preset': self.preset,
+            'threads': self.threads,
+            'fps': self.fps,
+            'speed': self.speed,
+            'cpus': self.cpus,
+            'calibrated_at': self.calibrated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'EncoderProfile':
+        return cls(
+            codec=data['codec'],
+            preset=data['preset'],
+            threads=data.get('threads'),
+            fps=float(data.get('fps', 0)),
+            speed=float(data.get('speed', 0)),
+            cpus=int(data.get('cpus', 0)),
+            calibrated_at=float(data.get('calibrated_at', 0))
+        )
+
+    @classmethod
+    def default(cls) -> 'EncoderProfile':
+        return cls(codec=Config.VIDEO_CODEC, preset=Config.FFMPEG_PRESET)
+
+def load_encoder_profile() -> EncoderProfile:
+    """Load the persisted profile if it still matches the configured codec and host"""
+    try:
+        if os.path.exists(Config.ENCODER_PROFILE_FILE):
+            with open(Config.ENCODER_PROFILE_FILE, 'r', encoding='utf-8') as f:
+                profile = EncoderProfile.from_dict(json.load(f))
+
+            if profile.codec == Config.VIDEO_CODEC and profile.cpus == ffmpeg_scheduler.cpus:
+                LOGGER.info(f"Loaded encoder profile: {profile.preset}, {profile.threads} threads, {profile.speed:.2f}x")
+                return profile
+
+            LOGGER.info("Encoder profile is for a different codec or host, ignoring it")
+    except Exception as e:
+        LOGGER.warning(f"Could not load encoder profile: {e}")
+
+    return EncoderProfile.default()
+
+class EncoderCalibrator:
+    """Encode a short lavfi testsrc clip at several presets and thread counts and keep the best"""
+
+    def __init__(self):
+        self.running = False
+
+    def _thread_candidates(self) -> List[int]:
+        cpus = ffmpeg_scheduler.cpus
+        return sorted({1, max(1, cpus // 2), cpus})
+
+    def _preset_candidates(self) -> List[str]:
+        presets = [p.strip() for p in Config.CALIBRATION_PRESETS.split(',') if p.strip() in PRESET_ORDER]
+        return sorted(set(presets), key=PRESET_ORDER.index)
+
+    async def _benchmark(self, preset: str, threads: int) -> Optional[float]:
+        """Encode the synthetic clip once and return the achieved fps"""
+        seconds = Config.CALIBRATION_SECONDS
+        cmd = [
+            'ffmpeg', '-y', '-f', 'lavfi',
+            '-i', f"testsrc2=size={CALIBRATION_SIZE}:rate={CALIBRATION_FPS}:duration={seconds}",
+            '-c:v', Config.VIDEO_CODEC,
+            '-preset', preset,
+            '-crf', str(Config.VIDEO_CRF),
+            '-pix_fmt', 'yuv420p',
+            '-threads', str(threads),
+            '-f', 'null', '-'
+        ]
+
+        # Owner lane: calibration should not sit behind user jobs
+        result = await run_ffmpeg(
+            cmd,
+            duration=seconds,
+            operation=f"Calibration {preset}/{threads}t",
+            user_id=int(Config.OWNER) if Config.OWNER else None
+        )
+        if not result.success or result.elapsed <= 0:
+            return None
+        return seconds * CALIBRATION_FPS / result.elapsed
+
+    async def calibrate(self, progress_callback: Optional[Callable] = None) -> Optional[EncoderProfile]:
+        """
+        Run the benchmark matrix and persist the chosen profile.
+        The slowest (best quality) preset that still meets CALIBRATION_TARGET_SPEED wins;
+        for it, the fewest threads within 10% of its best fps are used.
+        """
+        global encoder_profile
+
+        if Config.VIDEO_CODEC not in CALIBRATABLE_ENCODERS:
+            LOGGER.warning(f"Calibration not supported for {Config.VIDEO_CODEC}")
+            return None
+        if self.running:
+            LOGGER.warning("Encoder calibration already running")
+            return None
+
+        self.running = True
+        try:
+            presets = self._preset_candidates()
+            thread_counts = self._thread_candidates()
+            total_runs = len(presets) * len(thread_counts)
+            results = {}  # preset -> {threads: fps}
+            completed = 0
+
+            LOGGER.info(f"Calibrating {Config.VIDEO_CODEC}: presets {presets}, threads {thread_counts}")
+
+            for preset in presets:
+                results[preset] = {}
+                for threads in thread_counts:
+                    fps = await self._benchmark(preset, threads)
+                    completed += 1
+                    if fps:
+                        results[preset][threads] = fps
+                        LOGGER.info(f"Calibration {preset}/{threads} threads: {fps:.1f} fps")
+
+                    if progress_callback:
+                        try:
+                            await progress_callback(completed, total_runs, preset, threads, fps)
+                        except Exception as e:
+                            LOGGER.warning(f"Calibration progress callback error: {e}")
+
+            profile = self._choose_profile(results)
+            if not profile:
+                LOGGER.error("Encoder calibration failed: no benchmark run succeeded")
+                return None
+
+            self._save(profile)
+            encoder_profile = profile
+            ffmpeg_scheduler.preferred_threads = profile.threads
+            LOGGER.info(
+                f"Encoder calibrated: {profile.preset}, {profile.threads} threads, "
+                f"{profile.fps:.1f} fps ({profile.speed:.2f}x realtime)"
+            )
+            return profile
+
+        finally:
+            self.running = False
+
+    def _choose_profile(self, results: Dict[str, Dict[int, float]]) -> Optional[EncoderProfile]:
+        best_per_preset = {}
+        for preset, runs in results.items():
+            if not runs:
+                continue
+            top_fps = max(runs.values())
+            # Extra threads that add less than 10% are not worth taking from other jobs
+            threads = min(t for t, fps in runs.items() if fps >= top_fps * 0.9)
+            best_per_preset[preset] = (threads, runs[threads])
+
+        if not best_per_preset:
+            return None
+
+        target_fps = Config.CALIBRATION_TARGET_SPEED * CALIBRATION_FPS
+        ordered = sorted(best_per_preset, key=PRESET_ORDER.index)
+        meeting = [p for p in ordered if best_per_preset[p][1] >= target_fps]
+        # Slowest preset that keeps up, otherwise the fastest one we measured
+        preset = meeting[-1] if meeting else ordered[0]
+        threads, fps = best_per_preset[preset]
+
+        return EncoderProfile(
+            codec=Config.VIDEO_CODEC,
+            preset=preset,
+            threads=threads,
+            fps=fps,
+            speed=fps / CALIBRATION_FPS,
+            cpus=ffmpeg_scheduler.cpus,
+            calibrated_at=time.time()
+        )
+
+    def _save(self, profile: EncoderProfile):
+        try:
+            temp_path = f"{Config.ENCODER_PROFILE_FILE}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(profile.to_dict(), f, indent=2)
+            os.replace(temp_path, Config.ENCODER_PROFILE_FILE)
+        except Exception as e:
+            LOGGER.error(f"Could not save encoder profile: {e}")
+
+def get_encoder_profile() -> EncoderProfile:
+    """Current encoder profile (calibrated or static config)"""
+    return encoder_profile
+
+# Global profile and calibrator instances
+encoder_profile = load_encoder_profile()
+ffmpeg_scheduler.preferred_threads = encoder_profile.threads
+encoder_calibrator = EncoderCalibrator()
+
+# Export calibration components
+__all__ = [
+    'EncoderProfile',
+    'EncoderCalibrator',
+    'encoder_calibrator',
+    'get_encoder_profile',
+    'load_encoder_profile',
+    'PRESET_ORDER'
+]
@@ -0,0 +1,127 @@
+# Enhanced Fast Path Module
+# Lossless concat strategies tried before re-encoding, with per-fingerprint success history
+
+import os
+import json
+import time
+from typing import List, Optional, Dict, Any, NamedTuple
+from config import Config
+from helpers.merge_planner import StreamFingerprint
+from __init__ import LOGGER
+
+# Bitstream filters that turn MP4/MKV-style (length-prefixed) video into Annex B for MPEG-TS
+ANNEXB_FILTERS = {
+    'h264': 'h264_mp4toannexb',
+    'hevc': 'hevc_mp4toannexb'
+}
+
+# Audio codecs the MPEG-TS muxer can carry
+TS_AUDIO_CODECS = ('aac', 'mp3', 'mp2', 'ac3', 'eac3', 'opus')
+
+# Fingerprints remembered in the history file
+MAX_HISTORY_ENTRIES = 500
+
+class CopyStrategy(NamedTuple):
+    """One way of joining segments without re-encoding"""
+    name: str
+    label: str
+    genpts: bool = False            # Regenerate missing PTS and shift negative timestamps
+    ts_intermediates: bool = False  # Remux every input to MPEG-TS first
+    container: Optional[str] = None # Force this output extension
+
+    def supports(self, fingerprint: Optional[StreamFingerprint]) -> bool:
+        if not self.ts_intermediates or fingerprint is None:
+            return True
+        if fingerprint.video_codec not in ANNEXB_FILTERS:
+            return False
+        return not fingerprint.has_audio or fingerprint.audio_codec in TS_AUDIO_CODECS
+
+    def output_path(self, output_path: str) -> str:
+        if not self.container:
+            return output_path
+        return os.path.splitext(output_path)[0] + self.container
+
+# Cheapest first: plain copy, then timestamp repair, then TS remux, then a container that holds anything
+COPY_STRATEGIES = [
+    CopyStrategy('copy', 'direct copy'),
+    CopyStrategy('genpts', 'regenerated timestamps', genpts=True),
+    CopyStrategy('mpegts', 'MPEG-TS intermediates', genpts=True, ts_intermediates=True),
+    CopyStrategy('mkv', 'Matroska output', genpts=True, container='.mkv')
+]
+
+def fingerprint_key(fingerprint: StreamFingerprint) -> str:
+    return "|".join(str(value) for value in fingerprint)
+
+class FastPathHistory:
+    """
+    Which copy strategy worked (or failed) for each stream fingerprint.
+    Later merges of the same kind of input go straight to the strategy that worked
+    and skip the ones that already failed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = self._load()  # key -> {'success': name|None, 'failed': [names], 'updated': ts}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            LOGGER.warning(f"Could not load fast path history: {e}")
+        return {}
+
+    def _save(self):
+        if len(self.entries) > MAX_HISTORY_ENTRIES:
+            oldest = sorted(self.entries, key=lambda key: self.entries[key].get('updated', 0))
+            for key in oldest[:len(self.entries) - MAX_HISTORY_ENTRIES]:
+                del self.entries[key]
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            LOGGER.error(f"Could not save fast path history: {e}")
+
+    def strategies_for(self, fingerprint: Optional[StreamFingerprint]) -> List[CopyStrategy]:
+        """Strategies to try, in order, for inputs with this fingerprint"""
+        candidates = [strategy for strategy in COPY_STRATEGIES if strategy.supports(fingerprint)]
+        if fingerprint is None:
+            return candidates
+
+        entry = self.entries.get(fingerprint_key(fingerprint))
+        if not entry:
+            return candidates
+
+        ordered = sorted(candidates, key=lambda strategy: strategy.name != entry.get('success'))
+        remaining = [strategy for strategy in ordered if strategy.name not in entry.get('failed', [])]
+        # Never rule out every strategy: an input-specific failure should not block the fast path forever
+        return remaining or candidates
+
+    def record(self, fingerprint: Optional[StreamFingerprint], strategy: CopyStrategy, success: bool):
+        if fingerprint is None:
+            return
+        entry = self.entries.setdefault(fingerprint_key(fingerprint), {'success': None, 'failed': []})
+        if success:
+            entry['success'] = strategy.name
+            if strategy.name in entry['failed']:
+                entry['failed'].remove(strategy.name)
+        elif strategy.name != entry['success'] and strategy.name not in entry['failed']:
+            entry['failed'].append(strategy.name)
+        entry['updated'] = time.time()
+        self._save()
+
+# Global history instance
+fast_path_history = FastPathHistory(Config.FAST_PATH_HISTORY_FILE)
+
+# Export fast path components
+__all__ = [
+    'CopyStrategy',
+    'COPY_STRATEGIES',
+    'ANNEXB_FILTERS',
+    'FastPathHistory',
+    'fast_path_history',
+    'fingerprint_key'
+]
@@ -3,13 +3,61 @@
 
 import os
 import re
-import json
+import shutil
 import asyncio
 import subprocess
 from typing import Dict, List, Optional, Tuple, Any
 from config import Config
+from helpers.ffmpeg_runner import run_ffmpeg, probe_duration
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler
+from helpers.encoder_calibration import get_encoder_profile
+from helpers.media_probe import media_probe
+from helpers.thumbnails import thumbnail_cache
 from __init__ import LOGGER
 
+# Stream-copy targets for extraction: codec -> (extension, output codec)
+# Containers are chosen so the original bitstream fits unchanged
+SUBTITLE_OUTPUTS = {
+    'subrip': ('srt', 'copy'),
+    'ass': ('ass', 'copy'),
+    'ssa': ('ass', 'copy'),
+    'webvtt': ('vtt', 'copy'),
+    'mov_text': ('srt', 'srt'),             # MP4 text has no standalone container
+    'hdmv_pgs_subtitle': ('sup', 'copy'),
+    'dvd_subtitle': ('mks', 'copy'),
+    'dvb_subtitle': ('mks', 'copy')
+}
+AUDIO_OUTPUTS = {
+    'aac': ('m4a', 'copy'),
+    'alac': ('m4a', 'copy'),
+    'mp3': ('mp3', 'copy'),
+    'ac3': ('ac3', 'copy'),
+    'eac3': ('eac3', 'copy'),
+    'dts': ('dts', 'copy'),
+    'flac': ('flac', 'copy'),
+    'opus': ('opus', 'copy'),
+    'vorbis': ('ogg', 'copy')
+}
+FALLBACK_OUTPUTS = {
+    'subtitle': ('srt', 'srt'),
+    'audio': ('mka', 'copy')                # Matroska takes any audio codec as-is
+}
+
+# Subtitle muxing: MP4 only carries text as mov_text, Matroska copies these as-is
+MP4_CONTAINERS = ('.mp4', '.m4v', '.mov')
+MP4_SUBTITLE_CODECS = ('subrip', 'mov_text', 'webvtt', 'text')
+MATROSKA_SUBTITLE_CODECS = ('subrip', 'ass', 'ssa', 'webvtt', 'hdmv_pgs_subtitle', 'dvd_subtitle', 'dvb_subtitle')
+
+# Used when ffprobe cannot tell a subtitle file's codec
+SUBTITLE_CODECS_BY_EXTENSION = {
+    '.srt': 'subrip',
+    '.ass': 'ass',
+    '.ssa': 'ass',
+    '.vtt': 'webvtt',
+    '.sup': 'hdmv_pgs_subtitle',
+    '.idx': 'dvd_subtitle'
+}
+
 class FFmpegHelper:
     """Enhanced FFmpeg helper with advanced operations"""
     
@@ -25,36 +73,14 @@ class FFmpegHelper:
     
     @staticmethod
     async def get_video_info(file_path: str) -> Dict[str, Any]:
-        """Get comprehensive video information using ffprobe"""
+        """Get comprehensive video information using ffprobe (cached by the probe service)"""
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_format', '-show_streams', '-show_chapters', file_path
-        ]
-        
-        try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
-            
-            if process.returncode == 0:
-                probe_data = json.loads(stdout.decode('utf-8'))
-                return FFmpegHelper._parse_probe_data(probe_data)
-            else:
-                error_msg = stderr.decode('utf-8', errors='ignore')
-                LOGGER.error(f"FFprobe failed: {error_msg}")
-                return {}
-                
-        except asyncio.TimeoutError:
-            LOGGER.error(f"FFprobe timeout for file: {file_path}")
-            return {}
-        except Exception as e:
-            LOGGER.error(f"FFprobe error: {e}")
+        info = await media_probe.probe(file_path)
+        if not info.ok:
             return {}
+        return FFmpegHelper._parse_probe_data(info.data)
     
     @staticmethod
     def _parse_probe_data(probe_data: Dict) -> Dict[str, Any]:
@@ -200,7 +226,7 @@ class FFmpegHelper:
                 '-map', '[outv]', '-map', '[outa]',
                 '-c:v', Config.VIDEO_CODEC,
                 '-crf', str(Config.VIDEO_CRF),
-                '-preset', Config.FFMPEG_PRESET,
+                '-preset', get_encoder_profile().preset,
                 '-c:a', Config.AUDIO_CODEC,
                 '-b:a', Config.AUDIO_BITRATE,
                 output_file
@@ -255,38 +281,106 @@ class FFmpegHelper:
             LOGGER.error(f"Audio addition failed: {e}")
             return False
     
+    @staticmethod
+    async def subtitle_codec(subtitle_file: str) -> str:
+        """Codec of a subtitle file (ffprobe first, file extension as fallback)"""
+        info = await media_probe.probe(subtitle_file)
+        streams = info.streams_of('subtitle')
+        if streams and streams[0].get('codec_name'):
+            return streams[0]['codec_name']
+        extension = os.path.splitext(subtitle_file)[1].lower()
+        return SUBTITLE_CODECS_BY_EXTENSION.get(extension, 'unknown')
+    
+    @staticmethod
+    async def subtitle_container(video_file: str, subtitle_files: List[str]) -> str:
+        """
+        Output container for a subtitle mux: 'mp4' only when the video is already MP4
+        and every subtitle track is plain text, otherwise 'mkv' (keeps ASS styling
+        and image subtitles without conversion)
+        """
+        if os.path.splitext(video_file)[1].lower() not in MP4_CONTAINERS:
+            return 'mkv'
+        
+        info = await media_probe.probe(video_file)
+        codecs = [stream.get('codec_name') for stream in info.streams_of('subtitle')]
+        for subtitle_file in subtitle_files:
+            codecs.append(await FFmpegHelper.subtitle_codec(subtitle_file))
+        
+        return 'mp4' if all(codec in MP4_SUBTITLE_CODECS for codec in codecs) else 'mkv'
+    
+    @staticmethod
+    def _subtitle_tags(subtitle_file: str) -> Tuple[Optional[str], str]:
+        """Language and title from names like 'Movie.eng.srt' or 'Movie.en.forced.ass'"""
+        base_name = os.path.splitext(os.path.basename(subtitle_file))[0]
+        language = None
+        for part in reversed(base_name.split('.')[1:]):
+            if part.isalpha() and len(part) in (2, 3):
+                language = part.lower()
+                break
+        return language, base_name
+    
     @staticmethod
     async def add_subtitles_to_video(
         video_file: str,
         subtitle_files: List[str],
         output_file: str,
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[callable] = None,
+        user_id: Optional[int] = None,
+        queue_callback: Optional[callable] = None
     ) -> bool:
-        """Add subtitle tracks to video"""
+        """
+        Add subtitle tracks to video in one remux.
+        Subtitles are stream-copied when the output container (from output_file,
+        see subtitle_container) can hold them; tags are written in the same pass.
+        """
         try:
+            mp4_output = os.path.splitext(output_file)[1].lower() in MP4_CONTAINERS
+            video_info = await media_probe.probe(video_file)
+            codecs = [stream.get('codec_name') for stream in video_info.streams_of('subtitle')]
+            existing = len(codecs)
+            for subtitle_file in subtitle_files:
+                codecs.append(await FFmpegHelper.subtitle_codec(subtitle_file))
+            
             cmd = ['ffmpeg', '-y', '-i', video_file]
             
             # Add subtitle inputs
             for subtitle_file in subtitle_files:
                 cmd.extend(['-i', subtitle_file])
             
-            # Map video and audio streams
-            cmd.extend(['-map', '0:v', '-map', '0:a'])
+            # Map video, audio if any (silent videos have none) and existing subtitles
+            cmd.extend(['-map', '0:v', '-map', '0:a?', '-map', '0:s?'])
             
             # Map subtitle streams
             for i in range(len(subtitle_files)):
                 cmd.extend(['-map', f'{i+1}:s'])
             
-            # Output settings
             cmd.extend([
                 '-c:v', 'copy',  # Copy video without re-encoding
-                '-c:a', 'copy',  # Copy audio without re-encoding
-                '-c:s', 'mov_text',  # Convert subtitles to MP4 compatible format
-                output_file
+                '-c:a', 'copy'   # Copy audio without re-encoding
             ])
             
+            # Per-track subtitle codec: copy where the container allows it
+            for n, codec in enumerate(codecs):
+                if mp4_output:
+                    subtitle_codec = 'mov_text'
+                elif codec in MATROSKA_SUBTITLE_CODECS:
+                    subtitle_codec = 'copy'
+                else:
+                    subtitle_codec = 'srt'
+                cmd.extend([f'-c:s:{n}', subtitle_codec])
+            
+            # Language/title tags for the added tracks
+            for n, subtitle_file in enumerate(subtitle_files, start=existing):
+                language, title = FFmpegHelper._subtitle_tags(subtitle_file)
+                if language:
+                    cmd.extend([f'-metadata:s:s:{n}', f'language={language}'])
+                cmd.extend([f'-metadata:s:s:{n}', f'title={title}'])
+            
+            cmd.append(output_file)
+            
             return await FFmpegHelper._run_ffmpeg_with_progress(
-                cmd, progress_callback, "Adding subtitles"
+                cmd, progress_callback, "Adding subtitles",
+                user_id=user_id, queue_callback=queue_callback
             )
             
         except Exception as e:
@@ -320,52 +414,97 @@ class FFmpegHelper:
             return False
     
     @staticmethod
-    async def extract_subtitles(
+    async def extract_streams(
         video_file: str,
         output_dir: str,
-        progress_callback: Optional[callable] = None
-    ) -> List[str]:
-        """Extract all subtitle streams from video"""
+        stream_types: Tuple[str, ...] = ('audio', 'subtitle'),
+        progress_callback: Optional[callable] = None,
+        user_id: Optional[int] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Extract every audio/subtitle stream in a single ffmpeg read.
+        Each stream gets its own -map/output pair and is stream-copied into a
+        container that fits its codec (ASS stays ASS, AAC goes to .m4a).
+        If the single pass fails (one stream that cannot be copied fails the whole
+        command), the streams are retried one by one so the others are still kept.
+        Returns (stream type, output file) pairs.
+        """
         try:
-            # Get video info to find subtitle streams
             video_info = await FFmpegHelper.get_video_info(video_file)
-            subtitle_streams = video_info.get('subtitle_streams', [])
-            
-            if not subtitle_streams:
+            base_name = os.path.splitext(os.path.basename(video_file))[0]
+            duration = video_info.get('duration')
+            
+            # (stream type, output file, output arguments) per stream
+            outputs_spec = []
+            for stream_type in stream_types:
+                for i, stream in enumerate(video_info.get(f'{stream_type}_streams', [])):
+                    outputs = SUBTITLE_OUTPUTS if stream_type == 'subtitle' else AUDIO_OUTPUTS
+                    extension, codec = outputs.get(stream['codec'], FALLBACK_OUTPUTS[stream_type])
+                    language = stream.get('language', 'unknown')
+                    
+                    output_file = os.path.join(output_dir, f"{base_name}.{stream_type}.{language}.{i}.{extension}")
+                    # -threads is per output, so every output gets the scheduler's budget
+                    arguments = [
+                        '-map', f"0:{stream['index']}", '-c', codec,
+                        '-threads', str(ffmpeg_scheduler.threads_per_job()), output_file
+                    ]
+                    outputs_spec.append((stream_type, output_file, arguments))
+            
+            if not outputs_spec:
                 return []
             
-            extracted_files = []
-            base_name = os.path.splitext(os.path.basename(video_file))[0]
+            def remove_outputs(spec):
+                for _, output_file, _ in spec:
+                    if os.path.exists(output_file):
+                        os.remove(output_file)
             
-            for i, subtitle in enumerate(subtitle_streams):
-                stream_index = subtitle['index']
-                language = subtitle.get('language', 'unknown')
-                
-                output_file = os.path.join(
-                    output_dir, 
-                    f"{base_name}.{language}.{i}.srt"
-                )
-                
-                cmd = [
-                    'ffmpeg', '-y', '-i', video_file,
-                    '-map', f'0:s:{i}',
-                    '-c:s', 'srt',
-                    output_file
-                ]
-                
-                success = await FFmpegHelper._run_ffmpeg_with_progress(
-                    cmd, progress_callback, f"Extracting subtitle {i+1}"
-                )
-                
-                if success and os.path.exists(output_file):
-                    extracted_files.append(output_file)
+            cmd = ['ffmpeg', '-y', '-i', video_file]
+            for _, _, arguments in outputs_spec:
+                cmd += arguments
+            
+            success = await FFmpegHelper._run_ffmpeg_with_progress(
+                cmd, progress_callback, f"Extracting {len(outputs_spec)} streams",
+                duration=duration, user_id=user_id
+            )
             
-            return extracted_files
+            if not success:
+                remove_outputs(outputs_spec)
+                if len(outputs_spec) == 1:
+                    return []
+                
+                LOGGER.warning(f"Single-pass stream extraction failed, retrying {len(outputs_spec)} streams one by one")
+                for n, spec in enumerate(outputs_spec, start=1):
+                    stream_type, output_file, arguments = spec
+                    if not await FFmpegHelper._run_ffmpeg_with_progress(
+                        ['ffmpeg', '-y', '-i', video_file] + arguments, progress_callback,
+                        f"Extracting stream {n}/{len(outputs_spec)}",
+                        duration=duration, user_id=user_id
+                    ):
+                        LOGGER.warning(f"Could not extract {stream_type} stream to {os.path.basename(output_file)}")
+                        remove_outputs([spec])
+            
+            return [
+                (stream_type, output_file) for stream_type, output_file, _ in outputs_spec
+                if os.path.exists(output_file) and os.path.getsize(output_file) > 0
+            ]
             
         except Exception as e:
-            LOGGER.error(f"Subtitle extraction failed: {e}")
+            LOGGER.error(f"Stream extraction failed: {e}")
             return []
     
+    @staticmethod
+    async def extract_subtitles(
+        video_file: str,
+        output_dir: str,
+        progress_callback: Optional[callable] = None,
+        user_id: Optional[int] = None
+    ) -> List[str]:
+        """Extract all subtitle streams from video (one pass, original formats kept)"""
+        extracted = await FFmpegHelper.extract_streams(
+            video_file, output_dir, ('subtitle',), progress_callback, user_id
+        )
+        return [output_file for _, output_file in extracted]
+    
     @staticmethod
     async def generate_thumbnail(
         video_file: str,
@@ -374,28 +513,31 @@ class FFmpegHelper:
         width: int = 320,
         height: int = 180
     ) -> bool:
-        """Generate thumbnail from video"""
+        """Generate thumbnail from video (middle frame via the shared thumbnail cache by default)"""
         try:
             if timestamp is None:
-                # Get video duration and use middle frame
-                video_info = await FFmpegHelper.get_video_info(video_file)
-                duration = video_info.get('duration', 0)
-                timestamp = duration / 2 if duration > 0 else 10
+                thumbnail_path = await thumbnail_cache.thumbnail(video_file, size=(width, height))
+                if not thumbnail_path:
+                    return False
+                shutil.copyfile(thumbnail_path, output_file)
+                return True
             
+            # -ss before -i seeks to the nearest keyframe instead of decoding up to it
             cmd = [
-                'ffmpeg', '-y', '-i', video_file,
-                '-ss', str(timestamp),
-                '-vframes', '1',
+                'ffmpeg', '-y', '-ss', str(timestamp), '-i', video_file,
+                '-frames:v', '1',
                 '-filter:v', f'scale={width}:{height}',
                 '-q:v', '2',
                 output_file
             ]
             
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
+            async with ffmpeg_scheduler.probe():
+                process = await asyncio.create_subprocess_exec(
+                    *ffmpeg_scheduler.prepare_command(cmd, threads=False),
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+                
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
             
             return process.returncode == 0 and os.path.exists(output_file)
             
@@ -407,74 +549,48 @@ class FFmpegHelper:
     async def _run_ffmpeg_with_progress(
         cmd: List[str],
         progress_callback: Optional[callable] = None,
-        operation: str = "Processing"
+        operation: str = "Processing",
+        duration: Optional[float] = None,
+        user_id: Optional[int] = None,
+        queue_callback: Optional[callable] = None
     ) -> bool:
-        """Run FFmpeg command with progress monitoring"""
+        """
+        Run FFmpeg command through the shared job runner.
+        The callback receives an FFmpegProgress snapshot (percent, eta, speed, ...).
+        """
         try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
+            if duration is None:
+                duration = await probe_duration(FFmpegHelper._first_input(cmd))
             
-            # Monitor progress
-            start_time = time.time()
-            last_update = 0
-            
-            while process.returncode is None:
-                current_time = time.time()
-                
-                if progress_callback and (current_time - last_update) >= 3.0:
-                    elapsed = current_time - start_time
-                    if hasattr(progress_callback, '__call__'):
-                        try:
-                            await progress_callback(operation, elapsed)
-                        except Exception as e:
-                            LOGGER.warning(f"Progress callback error: {e}")
-                    last_update = current_time
-                
-                await asyncio.sleep(1)
-                
-                try:
-                    await asyncio.wait_for(process.wait(), timeout=0.1)
-                    break
-                except asyncio.TimeoutError:
-                    continue
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                error_output = stderr.decode('utf-8', errors='ignore')[-500:]
-                LOGGER.error(f"FFmpeg error: {error_output}")
-                return False
-            
-            return True
+            result = await run_ffmpeg(
+                cmd, duration, operation, progress_callback,
+                user_id=user_id, queue_callback=queue_callback
+            )
+            return result.success
             
         except Exception as e:
             LOGGER.error(f"FFmpeg execution error: {e}")
             return False
+    
+    @staticmethod
+    def _first_input(cmd: List[str]) -> Optional[str]:
+        """Return the first -i argument of an ffmpeg command"""
+        try:
+            return cmd[cmd.index('-i') + 1]
+        except (ValueError, IndexError):
+            return None
 
 # Legacy functions for compatibility with old repo
 def get_duration(file_path: str) -> int:
     """Legacy function to get video duration"""
-    try:
-        result = subprocess.run([
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_format', file_path
-        ], capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            duration = data.get('format', {}).get('duration', '0')
-            return int(float(duration))
-        return 0
-    except Exception:
-        return 0
+    return int(media_probe.probe_sync(file_path, quick=True).duration)
 
 def get_thumbnail(video_path: str, thumbnail_path: str, timestamp: str = "10") -> bool:
     """Legacy function to generate thumbnail"""
     try:
         cmd = [
             'ffmpeg', '-hide_banner', '-loglevel', 'error',
-            '-i', video_path, '-ss', timestamp, '-vframes', '1',
+            '-ss', timestamp, '-i', video_path, '-frames:v', '1',
             '-c:v', 'mjpeg', '-f', 'image2', '-y', thumbnail_path
         ]
         
@@ -485,24 +601,8 @@ def get_thumbnail(video_path: str, thumbnail_path: str, timestamp: str = "10") -
 
 def get_video_resolution(file_path: str) -> Tuple[int, int]:
     """Legacy function to get video resolution"""
-    try:
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_streams', '-select_streams', 'v:0', file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            streams = data.get('streams', [])
-            if streams:
-                width = streams[0].get('width', 0)
-                height = streams.get('height', 0)
-                return width, height
-        return 0, 0
-    except Exception:
-        return 0, 0
+    info = media_probe.probe_sync(file_path, quick=True)
+    return info.width, info.height
 
 # Export FFmpeg helper functions
 __all__ = [
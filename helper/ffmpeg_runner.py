@@ -0,0 +1,250 @@
+# Enhanced FFmpeg Job Runner
+# Shared async runner that reads ffmpeg's -progress stream for real progress reporting
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import List, Optional, Callable
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler
+from __init__ import LOGGER
+
+# Number of stderr lines kept for error reporting (bounded ring buffer)
+STDERR_TAIL_LINES = 40
+
+# Input options for HTTP(S) sources: survive dropped connections and resume with range reads
+REMOTE_INPUT_OPTIONS = [
+    '-reconnect', '1',
+    '-reconnect_streamed', '1',
+    '-reconnect_on_network_error', '1',
+    '-reconnect_delay_max', '10'
+]
+
+def is_remote_input(path: str) -> bool:
+    """Whether ffmpeg should read this input over HTTP(S) instead of from disk"""
+    return path.startswith(('http://', 'https://'))
+
+def input_args(path: str) -> List[str]:
+    """ffmpeg -i arguments for a local or remote input"""
+    options = REMOTE_INPUT_OPTIONS if is_remote_input(path) else []
+    return options + ['-i', path]
+
+class FFmpegProgress:
+    """Snapshot of a running ffmpeg job built from the -progress key/value stream"""
+
+    def __init__(self, operation: str, duration: float = 0.0):
+        self.operation = operation
+        self.duration = duration      # Expected output duration in seconds (0 = unknown)
+        self.out_time = 0.0           # Seconds of output written so far
+        self.speed = 0.0              # Encoding speed relative to realtime
+        self.fps = 0.0
+        self.total_size = 0           # Output bytes written so far
+        self.elapsed = 0.0
+        self.done = False
+
+    @property
+    def percent(self) -> float:
+        """Completion percentage based on the probed duration"""
+        if self.done:
+            return 100.0
+        if self.duration <= 0:
+            return 0.0
+        return min(self.out_time / self.duration * 100, 99.9)
+
+    @property
+    def eta(self) -> float:
+        """Remaining wall time in seconds"""
+        if self.duration <= 0 or self.out_time <= 0:
+            return 0.0
+        remaining = max(self.duration - self.out_time, 0.0)
+        if self.speed > 0:
+            return remaining / self.speed
+        # Fall back to the observed rate when ffmpeg reports speed=N/A
+        return remaining * self.elapsed / self.out_time
+
+class FFmpegResult:
+    """Outcome of a finished ffmpeg job"""
+
+    def __init__(self, returncode: int, stderr_tail: List[str], elapsed: float, progress: FFmpegProgress):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.elapsed = elapsed
+        self.progress = progress
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def error_output(self) -> str:
+        return "\n".join(self.stderr_tail)
+
+class FFmpegJob:
+    """
+    Run a single ffmpeg command with -progress reporting.
+    stdout carries the progress stream and stderr is drained into a ring buffer,
+    so neither pipe can fill up and stall the encoder.
+    The process only starts once the global scheduler grants it a slot.
+    """
+
+    def __init__(
+        self,
+        cmd: List[str],
+        duration: float = 0.0,
+        operation: str = "Processing",
+        progress_callback: Optional[Callable] = None,
+        update_interval: float = 3.0,
+        user_id: Optional[int] = None,
+        queue_callback: Optional[Callable] = None
+    ):
+        self.cmd = cmd
+        self.user_id = user_id
+        self.queue_callback = queue_callback  # async cb(position) while waiting for a slot
+        self.operation = operation
+        self.progress_callback = progress_callback
+        self.update_interval = update_interval
+        self.progress = FFmpegProgress(operation, duration)
+        self.stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self.process = None
+        self._last_report = 0.0
+
+    def _build_command(self) -> List[str]:
+        """Insert progress options right after the ffmpeg binary"""
+        return [self.cmd[0], '-nostdin', '-progress', 'pipe:1', '-nostats'] + list(self.cmd[1:])
+
+    async def run(self) -> FFmpegResult:
+        """Run the job to completion and return its result"""
+        lane = ffmpeg_scheduler.lane_for(self.user_id)
+
+        async with ffmpeg_scheduler.job(self.user_id, self.queue_callback):
+            start_time = time.time()
+
+            self.process = await asyncio.create_subprocess_exec(
+                *ffmpeg_scheduler.prepare_command(self._build_command(), lane),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            try:
+                await asyncio.gather(
+                    self._read_progress(self.process.stdout, start_time),
+                    self._read_stderr(self.process.stderr)
+                )
+                returncode = await self.process.wait()
+            except asyncio.CancelledError:
+                await self.kill()
+                raise
+
+        self.progress.elapsed = time.time() - start_time
+        if returncode == 0:
+            self.progress.done = True
+            await self._report(force=True)
+
+        return FFmpegResult(returncode, list(self.stderr_tail), self.progress.elapsed, self.progress)
+
+    async def kill(self):
+        """Terminate the ffmpeg process if it is still running"""
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.kill()
+                await self.process.wait()
+            except ProcessLookupError:
+                pass
+
+    async def _read_progress(self, stream, start_time: float):
+        """Parse the key=value blocks emitted by -progress pipe:1"""
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+
+            key, _, value = line.decode('utf-8', errors='ignore').strip().partition('=')
+            self._apply_progress_value(key, value)
+
+            # Every block ends with progress=continue|end
+            if key == 'progress':
+                self.progress.elapsed = time.time() - start_time
+                await self._report()
+
+    def _apply_progress_value(self, key: str, value: str):
+        """Update the progress snapshot with a single key/value pair"""
+        try:
+            if key in ('out_time_us', 'out_time_ms'):
+                # out_time_ms is also reported in microseconds by ffmpeg
+                if value.lstrip('-').isdigit():
+                    self.progress.out_time = max(int(value) / 1_000_000, 0.0)
+            elif key == 'speed':
+                value = value.rstrip('x').strip()
+                self.progress.speed = float(value) if value and value != 'N/A' else 0.0
+            elif key == 'fps':
+                self.progress.fps = float(value)
+            elif key == 'total_size':
+                if value.isdigit():
+                    self.progress.total_size = int(value)
+        except ValueError:
+            pass
+
+    async def _read_stderr(self, stream):
+        """Drain stderr into the bounded ring buffer"""
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            text = line.decode('utf-8', errors='ignore').rstrip()
+            if text:
+                self.stderr_tail.append(text)
+
+    async def _report(self, force: bool = False):
+        """Invoke the progress callback, throttled to update_interval"""
+        if not self.progress_callback:
+            return
+
+        now = time.time()
+        if not force and (now - self._last_report) < self.update_interval:
+            return
+        self._last_report = now
+
+        try:
+            await self.progress_callback(self.progress)
+        except Exception as e:
+            LOGGER.warning(f"Progress callback error: {e}")
+
+async def run_ffmpeg(
+    cmd: List[str],
+    duration: float = 0.0,
+    operation: str = "Processing",
+    progress_callback: Optional[Callable] = None,
+    update_interval: float = 3.0,
+    user_id: Optional[int] = None,
+    queue_callback: Optional[Callable] = None
+) -> FFmpegResult:
+    """Run an ffmpeg command through the shared job runner and global scheduler"""
+    job = FFmpegJob(cmd, duration, operation, progress_callback, update_interval, user_id, queue_callback)
+    result = await job.run()
+
+    if not result.success:
+        LOGGER.error(f"FFmpeg {operation} failed ({result.returncode}): {result.error_output[-500:]}")
+
+    return result
+
+async def probe_duration(*file_paths: str) -> float:
+    """Sum the container durations of the given files (0 when unknown)"""
+    # Imported here: the probe service itself builds on this module
+    from helpers.media_probe import media_probe
+    
+    file_paths = [p for p in file_paths if p and (is_remote_input(p) or os.path.exists(p))]
+    infos = await asyncio.gather(*(media_probe.probe(file_path, quick=True) for file_path in file_paths))
+    return sum(info.duration for info in infos)
+
+# Export runner components
+__all__ = [
+    'FFmpegProgress',
+    'FFmpegResult',
+    'FFmpegJob',
+    'run_ffmpeg',
+    'probe_duration',
+    'is_remote_input',
+    'input_args',
+    'REMOTE_INPUT_OPTIONS'
+]
@@ -0,0 +1,230 @@
+# Enhanced FFmpeg Scheduler
+# Process-wide gate for every ffmpeg/ffprobe spawn: concurrency limit, CPU budget and priority lanes
+
+import os
+import math
+import heapq
+import shutil
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import List, Optional, Callable
+from config import Config
+from helpers.status_renderer import smart_progress_editor
+from __init__ import LOGGER
+
+# Priority lanes (lower runs first)
+OWNER_LANE = 0
+PREMIUM_LANE = 1
+FREE_LANE = 2
+
+LANE_NAMES = {
+    OWNER_LANE: "owner",
+    PREMIUM_LANE: "premium",
+    FREE_LANE: "free"
+}
+
+# How often a waiting job re-checks its queue position
+QUEUE_REFRESH_SECONDS = 5.0
+
+def available_cpus() -> int:
+    """CPUs this process can actually use, honouring affinity and cgroup quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+
+    # docker-compose `cpus:` limits show up as a CFS quota, not as fewer cores
+    quota = period = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            fields = f.read().split()
+        if fields and fields[0] != 'max':
+            quota, period = int(fields[0]), int(fields[1])
+    except (OSError, ValueError, IndexError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                quota = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+        except (OSError, ValueError):
+            pass
+
+    if quota and period and quota > 0:
+        cpus = min(cpus, math.ceil(quota / period))
+
+    return max(1, cpus)
+
+class FFmpegScheduler:
+    """
+    Central scheduler for ffmpeg/ffprobe processes.
+    Encodes wait for one of max_jobs slots in priority order (owner, premium, free);
+    probes and single-frame jobs use a separate, wider gate so they never queue behind encodes.
+    """
+
+    def __init__(self, max_jobs: int, max_probes: int, cpus: int):
+        self.max_jobs = max(1, max_jobs)
+        self.cpus = max(1, cpus)
+        self.running = 0
+        self._waiting = []  # heap of (lane, sequence, future)
+        self._sequence = itertools.count()
+        self._probe_semaphore = asyncio.Semaphore(max(1, max_probes))
+        self.preferred_threads = None  # Set by encoder calibration
+        self._nice = shutil.which('nice')
+        self._ionice = shutil.which('ionice')
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiting if not future.done())
+
+    def lane_for(self, user_id: Optional[int]) -> int:
+        """Map a user to a priority lane"""
+        if user_id is None:
+            return FREE_LANE
+        if Config.OWNER and str(user_id) == str(Config.OWNER):
+            return OWNER_LANE
+        if user_id in Config.PREMIUM_USERS:
+            return PREMIUM_LANE
+        return FREE_LANE
+
+    def threads_per_job(self) -> int:
+        """ffmpeg -threads value so running jobs together fit the CPU budget"""
+        budget = max(1, self.cpus // self.max_jobs)
+        if self.preferred_threads:
+            return max(1, min(budget, self.preferred_threads))
+        return budget
+
+    def prepare_command(self, cmd: List[str], lane: int = FREE_LANE, threads: bool = True) -> List[str]:
+        """Apply the CPU budget to a command: -threads plus nice/ionice prefixes"""
+        cmd = list(cmd)
+
+        if threads and os.path.basename(cmd[0]) == 'ffmpeg' and '-threads' not in cmd:
+            # -threads is an output option, so it goes right before the output file
+            # (multi-output commands set -threads on each output themselves)
+            cmd[-1:-1] = ['-threads', str(self.threads_per_job())]
+
+        # Lower lanes run nicer so the owner's jobs win CPU contention
+        prefix = []
+        if self._nice:
+            prefix += [self._nice, '-n', str(min(19, Config.FFMPEG_NICE + lane * 2))]
+        if self._ionice and Config.FFMPEG_IONICE_CLASS:
+            # -t: run anyway if the host refuses I/O priorities
+            prefix += [self._ionice, '-t', '-c', str(Config.FFMPEG_IONICE_CLASS)]
+            if Config.FFMPEG_IONICE_CLASS == 2:
+                prefix += ['-n', str(min(7, 4 + lane))]
+
+        return prefix + cmd
+
+    @asynccontextmanager
+    async def job(self, user_id: Optional[int] = None, on_queue_position: Optional[Callable] = None):
+        """
+        Hold an encode slot for the duration of the block.
+        on_queue_position(position) is awaited whenever a waiting job's position changes.
+        """
+        await self._acquire(self.lane_for(user_id), on_queue_position)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def probe(self):
+        """Hold a probe slot (ffprobe, single-frame thumbnails)"""
+        async with self._probe_semaphore:
+            yield
+
+    async def _acquire(self, lane: int, on_queue_position: Optional[Callable]):
+        if self.running < self.max_jobs and not self.queued:
+            self.running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (lane, next(self._sequence), future)
+        heapq.heappush(self._waiting, entry)
+        LOGGER.debug(f"FFmpeg job queued in {LANE_NAMES[lane]} lane ({self.queued} waiting)")
+
+        last_position = None
+        try:
+            while True:
+                position = self._position(entry)
+                if on_queue_position and position and position != last_position:
+                    last_position = position
+                    try:
+                        await on_queue_position(position)
+                    except Exception as e:
+                        LOGGER.warning(f"Queue position callback error: {e}")
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout=QUEUE_REFRESH_SECONDS)
+                    return
+                except asyncio.TimeoutError:
+                    continue
+
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self._release()
+            else:
+                future.cancel()
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the next waiter so running never dips below the limit
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.running -= 1
+
+    def _position(self, entry) -> int:
+        """1-based position of a waiting entry (0 once it has a slot)"""
+        if entry[2].done():
+            return 0
+        return 1 + sum(
+            1 for other in self._waiting
+            if not other[2].done() and other[:2] < entry[:2]
+        )
+
+    def get_stats(self) -> dict:
+        """Scheduler statistics for /stats"""
+        return {
+            'running': self.running,
+            'queued': self.queued,
+            'max_jobs': self.max_jobs,
+            'threads_per_job': self.threads_per_job(),
+            'cpus': self.cpus
+        }
+
+def queue_status_callback(status_message, operation: str) -> Callable:
+    """Build a queue callback that shows a waiting job's position in the user's status message"""
+    async def update(position: int):
+        await smart_progress_editor(
+            status_message,
+            f"⏳ **Waiting for Encoder Slot...**\n"
+            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+            f"🔧 **Task:** {operation}\n"
+            f"📍 **Queue Position:** `{position}`\n"
+            f"⚙️ **Running Jobs:** `{ffmpeg_scheduler.running}/{ffmpeg_scheduler.max_jobs}`"
+        )
+    return update
+
+_cpus = available_cpus()
+ffmpeg_scheduler = FFmpegScheduler(
+    max_jobs=Config.MAX_FFMPEG_JOBS or _cpus,
+    max_probes=Config.MAX_FFPROBE_JOBS,
+    cpus=_cpus
+)
+
+# Export scheduler components
+__all__ = [
+    'FFmpegScheduler',
+    'ffmpeg_scheduler',
+    'available_cpus',
+    'queue_status_callback',
+    'OWNER_LANE',
+    'PREMIUM_LANE',
+    'FREE_LANE'
+]
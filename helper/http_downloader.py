@@ -0,0 +1,203 @@
+# Enhanced Segmented HTTP Downloader
+# Ranged segment downloads over several connections, resumable across attempts
+
+import os
+import math
+import time
+import asyncio
+import shutil
+import hashlib
+import aiohttp
+from typing import Optional, Callable, Dict, List
+from config import Config
+from helpers.ranged_download import RangedDownload
+from __init__ import LOGGER
+
+# Bytes per ranged GET; a failed segment is fetched again from its start
+SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Failed segments are retried this many times in total before the download gives up
+MAX_SEGMENT_FAILURES = 8
+
+class RangeNotSupported(Exception):
+    """Server answered a ranged GET with the whole body (no ranges, or the content changed)"""
+
+def range_validator(etag: Optional[str], last_modified: Optional[str]) -> Optional[str]:
+    """Validator usable in If-Range: a strong ETag, else Last-Modified"""
+    if etag and not etag.startswith('W/'):
+        return etag
+    return last_modified
+
+def partial_name(url: str) -> str:
+    """Stable partial file name for a URL, so a retry finds the earlier progress"""
+    return f"url_{hashlib.sha1(url.encode()).hexdigest()[:20]}"
+
+class SegmentedHTTPDownload(RangedDownload):
+    """
+    One URL downloaded as SEGMENT_SIZE ranges over several connections.
+    Segments are written with pwrite into a preallocated file and completed segments
+    are recorded in <path>.json with the URL validator. Every ranged GET carries
+    If-Range, so a changed file comes back as a 200 and the download restarts cleanly
+    instead of mixing old and new bytes. RangeNotSupported is raised (with the partial
+    file removed) when the caller should fall back to a single stream.
+    """
+
+    kind = "Segmented"
+    piece_name = "segments"
+    fatal_errors = (RangeNotSupported,)
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        path: str,
+        size: int,
+        validator: Optional[str],
+        connections: int,
+        progress_callback: Optional[Callable] = None
+    ):
+        self.session = session
+        self.url = url
+        self.validator = validator
+        super().__init__(
+            path, size, math.ceil(size / SEGMENT_SIZE), connections, MAX_SEGMENT_FAILURES, progress_callback
+        )
+
+    @property
+    def label(self) -> str:
+        return self.url[:50]
+
+    def _segment_bounds(self, index: int):
+        start = index * SEGMENT_SIZE
+        return start, min(self.size, start + SEGMENT_SIZE) - 1
+
+    def _sidecar_state(self):
+        return {'url': self.url, 'size': self.size, 'validator': self.validator}
+
+    def _can_resume(self) -> bool:
+        return bool(self.validator)  # Without a validator old bytes cannot be trusted
+
+    def _piece_length(self, index: int) -> int:
+        start, end = self._segment_bounds(index)
+        return end - start + 1
+
+    def _pending_items(self) -> List[int]:
+        return [index for index in range(self.total_pieces) if index not in self.done]
+
+    def _describe(self, item) -> str:
+        return f"URL segment {item}"
+
+    async def _fetch(self, fd: int, index: int):
+        start, end = self._segment_bounds(index)
+        headers = {'Range': f"bytes={start}-{end}"}
+        if self.validator:
+            headers['If-Range'] = self.validator
+
+        offset = start
+        try:
+            async with self.session.get(self.url, headers=headers) as resp:
+                if resp.status == 200:
+                    raise RangeNotSupported(f"server sent the full body for segment {index}")
+                if resp.status != 206:
+                    raise IOError(f"HTTP {resp.status}")
+
+                async for chunk in resp.content.iter_chunked(Config.DOWNLOAD_CHUNK_SIZE):
+                    await self._write(fd, chunk, offset)
+                    offset += len(chunk)
+                    self.fetched_bytes += len(chunk)
+                    await self._report_progress()
+
+            if offset != end + 1:
+                raise IOError(f"segment {index} ended early at byte {offset}")
+        except BaseException:
+            self.fetched_bytes -= offset - start  # Partial bytes are fetched again
+            raise
+
+        self._piece_done(index)
+
+async def benchmark_segmented(
+    size_mb: int = 64,
+    bandwidth_mb: float = 4.0,
+    connections: Optional[List[int]] = None
+) -> Dict[int, float]:
+    """
+    Download the same file from a local stand-in server that throttles every
+    connection to bandwidth_mb MiB/s, once per connection count (1 = a single
+    plain GET). Returns {connections: MiB/s}.
+    """
+    from aiohttp import web
+
+    size = size_mb * 1024 * 1024
+    body = os.urandom(1024 * 1024)
+    etag = '"benchmark"'
+
+    async def handler(request):
+        start, end = 0, size - 1
+        ranged = request.http_range.start is not None
+        if ranged:
+            start = request.http_range.start
+            end = (request.http_range.stop or size) - 1
+        response = web.StreamResponse(
+            status=206 if ranged else 200,
+            headers={'ETag': etag, 'Accept-Ranges': 'bytes', 'Content-Length': str(end - start + 1)}
+        )
+        if ranged:
+            response.headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        await response.prepare(request)
+
+        piece = 64 * 1024
+        delay = piece / (bandwidth_mb * 1024 * 1024)
+        offset = start
+        while offset <= end:
+            length = min(piece, end - offset + 1)
+            position = offset % len(body)
+            chunk = (body[position:] + body)[:length]
+            await response.write(chunk)
+            offset += length
+            await asyncio.sleep(delay)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get('/sample.bin', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/sample.bin"
+
+    work_dir = os.path.join(Config.DOWNLOAD_DIR, "http_benchmark")
+    os.makedirs(work_dir, exist_ok=True)
+    results = {}
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            for count in connections or [1, 2, 4, 8]:
+                path = os.path.join(work_dir, f"sample_{count}.bin")
+                start = time.perf_counter()
+                if count == 1:
+                    async with session.get(url) as resp:
+                        with open(path, 'wb') as f:
+                            async for chunk in resp.content.iter_chunked(Config.DOWNLOAD_CHUNK_SIZE):
+                                f.write(chunk)
+                else:
+                    await SegmentedHTTPDownload(session, url, path, size, etag, count).run()
+                elapsed = time.perf_counter() - start
+                results[count] = size / elapsed / (1024 * 1024) if os.path.getsize(path) == size else 0.0
+                LOGGER.info(f"HTTP benchmark {count} connection(s): {results[count]:.1f} MiB/s")
+                os.remove(path)
+    finally:
+        await runner.cleanup()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+# Export segmented download components
+__all__ = [
+    'SegmentedHTTPDownload',
+    'RangeNotSupported',
+    'range_validator',
+    'partial_name',
+    'benchmark_segmented',
+    'SEGMENT_SIZE'
+]
@@ -0,0 +1,121 @@
+# Enhanced HTTP Session Pool
+# One aiohttp session for the whole bot: shared keep-alive connections and a TTL DNS cache
+
+import asyncio
+import aiohttp
+from typing import Dict, Any
+from config import Config
+from __init__ import LOGGER
+
+class HTTPSessionPool:
+    """
+    Process-wide aiohttp session owned by the bot.
+    Downloads, range probes and GoFile uploads all borrow it, so TLS connections
+    and DNS answers are reused across users and jobs. Created lazily on the running
+    loop and closed once in EnhancedMergeBot.stop().
+    """
+
+    def __init__(self, limit: int, limit_per_host: int, dns_ttl: int, keepalive: int):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self._session = None
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.requests += 1
+
+        async def on_connection_create_end(session, context, params):
+            self.new_connections += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.reused_connections += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            self.dns_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            self.dns_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def session(self) -> aiohttp.ClientSession:
+        """The shared session (callers must not close it)"""
+        if self._session and not self._session.closed:
+            return self._session
+
+        async with self._lock:
+            if not self._session or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_ttl,
+                    keepalive_timeout=self.keepalive,
+                    enable_cleanup_closed=True
+                )
+                # No total timeout: transfers are long; stalls are caught by sock_read
+                timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=timeout,
+                    headers={'User-Agent': 'Enhanced-MERGE-BOT/6.0 (Telegram Bot)'},
+                    trace_configs=[self._trace_config()]
+                )
+                LOGGER.info(f"Created shared HTTP session (limit {self.limit}, {self.limit_per_host}/host)")
+        return self._session
+
+    @property
+    def active(self) -> bool:
+        return bool(self._session and not self._session.closed)
+
+    async def close(self):
+        if self.active:
+            await self._session.close()
+            # Let SSL transports finish closing before the loop stops
+            await asyncio.sleep(0.25)
+            LOGGER.info("Closed shared HTTP session")
+        self._session = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for /stats"""
+        connector = self._session.connector if self.active else None
+        idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values()) if connector else 0
+        in_use = len(getattr(connector, '_acquired', ())) if connector else 0
+        return {
+            'active': self.active,
+            'in_use': in_use,
+            'idle': idle,
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'dns_hits': self.dns_hits,
+            'dns_misses': self.dns_misses
+        }
+
+# Global HTTP session pool
+http_pool = HTTPSessionPool(
+    Config.HTTP_POOL_SIZE,
+    Config.HTTP_POOL_PER_HOST,
+    Config.HTTP_DNS_TTL,
+    Config.HTTP_KEEPALIVE
+)
+
+# Export pool components
+__all__ = [
+    'HTTPSessionPool',
+    'http_pool'
+]
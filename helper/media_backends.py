@@ -0,0 +1,199 @@
+# Enhanced Media Metadata Backends
+# In-process header parsers (hachoir/mutagen) that answer basic probes without spawning ffprobe
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+from config import Config
+from __init__ import LOGGER
+
+try:
+    from hachoir.core import config as hachoir_config
+    from hachoir.parser import createParser
+    from hachoir.metadata import extractMetadata
+    hachoir_config.quiet = True  # Header oddities are ours to handle, not stderr noise
+except ImportError:
+    createParser = extractMetadata = None
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+# Containers each parser reads reliably; anything else goes to ffprobe
+MP4_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+MATROSKA_EXTENSIONS = ('.mkv', '.webm')
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.flac', '.ogg', '.opus', '.wav')
+
+# Matroska codec ids -> ffprobe codec names
+MATROSKA_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264',
+    'V_MPEGH/ISO/HEVC': 'hevc',
+    'V_VP8': 'vp8',
+    'V_VP9': 'vp9',
+    'V_AV1': 'av1',
+    'A_AAC': 'aac',
+    'A_OPUS': 'opus',
+    'A_VORBIS': 'vorbis',
+    'A_AC3': 'ac3',
+    'A_EAC3': 'eac3',
+    'A_MPEG/L3': 'mp3',
+    'A_FLAC': 'flac'
+}
+
+# mutagen stream classes -> ffprobe codec names
+MUTAGEN_CODECS = {
+    'MPEGInfo': 'mp3',
+    'FLACStreamInfo': 'flac',
+    'OggOpusInfo': 'opus',
+    'OggVorbisInfo': 'vorbis',
+    'AACInfo': 'aac',
+    'WAVEStreamInfo': 'pcm_s16le'
+}
+
+def _format(duration: float, bitrate: int = 0, format_name: str = '') -> Dict[str, Any]:
+    """ffprobe-shaped format section"""
+    return {
+        'format_name': format_name,
+        'duration': str(duration),
+        'bit_rate': str(bitrate) if bitrate else None
+    }
+
+def _video_stream(width: int, height: int, codec: Optional[str] = None) -> Dict[str, Any]:
+    return {'codec_type': 'video', 'codec_name': codec or 'unknown', 'width': width, 'height': height}
+
+def _audio_stream(codec: Optional[str] = None, sample_rate: int = 0, channels: int = 0) -> Dict[str, Any]:
+    return {
+        'codec_type': 'audio',
+        'codec_name': codec or 'unknown',
+        'sample_rate': str(sample_rate) if sample_rate else None,
+        'channels': channels or None
+    }
+
+def _mutagen_audio(path: str) -> Optional[Dict[str, Any]]:
+    """Audio stream info from mutagen (also reads the audio track of MP4 files)"""
+    media = mutagen.File(path)
+    if not media or not getattr(media.info, 'length', 0):
+        return None
+    info = media.info
+    codec = MUTAGEN_CODECS.get(type(info).__name__)
+    if type(info).__name__ == 'MP4Info':
+        codec = 'aac' if (info.codec or '').startswith('mp4a.40') else info.codec
+    return {
+        'duration': float(info.length),
+        'bitrate': int(getattr(info, 'bitrate', 0) or 0),
+        'stream': _audio_stream(codec, getattr(info, 'sample_rate', 0), getattr(info, 'channels', 0))
+    }
+
+def _hachoir_metadata(path: str):
+    parser = createParser(path)
+    if not parser:
+        return None
+    with parser:
+        return extractMetadata(parser)
+
+def _probe_mp4(path: str) -> Optional[Dict[str, Any]]:
+    """Duration and frame size from the moov header; audio details from mutagen"""
+    metadata = _hachoir_metadata(path)
+    if not metadata or not metadata.has('width') or not metadata.has('duration'):
+        return None
+
+    streams = [_video_stream(metadata.get('width'), metadata.get('height'))]
+    duration = metadata.get('duration').total_seconds()
+    if mutagen:
+        audio = _mutagen_audio(path)
+        if audio:
+            streams.append(audio['stream'])
+            duration = max(duration, audio['duration'])
+
+    size = os.path.getsize(path)
+    return {
+        'format': _format(duration, int(size * 8 / duration) if duration else 0, 'mov,mp4,m4a,3gp,3g2,mj2'),
+        'streams': streams
+    }
+
+def _probe_matroska(path: str) -> Optional[Dict[str, Any]]:
+    """Duration from the segment info, tracks from the track entries"""
+    metadata = _hachoir_metadata(path)
+    if not metadata or not metadata.has('duration'):
+        return None
+
+    streams = []
+    for group in metadata.iterGroups():
+        compression = group.get('compression', None)
+        codec = MATROSKA_CODECS.get(compression) if compression else None
+        if group.has('width'):
+            streams.append(_video_stream(group.get('width'), group.get('height'), codec))
+        elif group.has('sample_rate'):
+            streams.append(_audio_stream(codec, int(group.get('sample_rate')), group.get('nb_channel', 0)))
+
+    if not any(stream['codec_type'] == 'video' for stream in streams):
+        return None
+
+    duration = metadata.get('duration').total_seconds()
+    size = os.path.getsize(path)
+    return {
+        'format': _format(duration, int(size * 8 / duration) if duration else 0, 'matroska,webm'),
+        'streams': streams
+    }
+
+def _probe_audio(path: str) -> Optional[Dict[str, Any]]:
+    audio = _mutagen_audio(path)
+    if not audio:
+        return None
+    return {
+        'format': _format(audio['duration'], audio['bitrate']),
+        'streams': [audio['stream']]
+    }
+
+class InProcessBackend:
+    """
+    Parses container headers with hachoir/mutagen in a small thread pool.
+    Fills duration, bitrate, frame size and (where the header names it) codecs;
+    returns None for anything it cannot read so the caller falls back to ffprobe.
+    """
+
+    name = "in-process"
+
+    def __init__(self, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="metadata")
+
+    @property
+    def available(self) -> bool:
+        return createParser is not None or mutagen is not None
+
+    def supports(self, path: str) -> bool:
+        extension = os.path.splitext(path)[1].lower()
+        if extension in MP4_EXTENSIONS or extension in MATROSKA_EXTENSIONS:
+            return createParser is not None
+        if extension in AUDIO_EXTENSIONS:
+            return mutagen is not None
+        return False
+
+    def read(self, path: str) -> Optional[Dict[str, Any]]:
+        """Blocking header parse; ffprobe-shaped data or None"""
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            if extension in MP4_EXTENSIONS:
+                return _probe_mp4(path)
+            if extension in MATROSKA_EXTENSIONS:
+                return _probe_matroska(path)
+            return _probe_audio(path)
+        except Exception as e:
+            LOGGER.debug(f"In-process metadata failed for {path}: {e}")
+            return None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+# Global in-process backend (None when disabled or neither parser is installed)
+in_process_backend = InProcessBackend(Config.METADATA_THREADS) if Config.METADATA_BACKEND == "auto" else None
+if in_process_backend and not in_process_backend.available:
+    LOGGER.warning("hachoir/mutagen not installed, every probe will use ffprobe")
+    in_process_backend = None
+
+# Export backend components
+__all__ = [
+    'InProcessBackend',
+    'in_process_backend'
+]
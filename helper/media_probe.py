@@ -0,0 +1,325 @@
+# Enhanced Media Probe Service
+# One ffprobe pass per file version for the whole bot: cached, deduplicated and bounded
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import subprocess
+from typing import Optional, Dict, Any, List, Tuple
+from config import Config
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler
+from helpers.ffmpeg_runner import REMOTE_INPUT_OPTIONS, is_remote_input, run_ffmpeg
+from helpers.media_backends import in_process_backend
+from __init__ import LOGGER, cache, BoundedCache, CacheNamespace
+
+class MediaInfo:
+    """Parsed ffprobe result for one file (empty when probing failed)"""
+
+    def __init__(self, path: str, size: int = 0, data: Optional[Dict[str, Any]] = None, backend: str = "ffprobe"):
+        self.path = path
+        self.size = size
+        self.data = data or {}  # Raw -show_format -show_streams -show_chapters JSON (or the same shape)
+        self.backend = backend  # "ffprobe" (complete) or "in-process" (basic fields only)
+
+    @property
+    def complete(self) -> bool:
+        """Full ffprobe detail (pix_fmt, frame rate, chapters...), not just header basics"""
+        return self.backend == "ffprobe"
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.data.get('streams') or self.data.get('format'))
+
+    @property
+    def format(self) -> Dict[str, Any]:
+        return self.data.get('format', {})
+
+    @property
+    def streams(self) -> List[Dict[str, Any]]:
+        return self.data.get('streams', [])
+
+    @property
+    def duration(self) -> float:
+        try:
+            return float(self.format.get('duration') or 0)
+        except ValueError:
+            return 0.0
+
+    @property
+    def bitrate(self) -> int:
+        try:
+            return int(self.format.get('bit_rate') or 0)
+        except ValueError:
+            return 0
+
+    def streams_of(self, codec_type: str) -> List[Dict[str, Any]]:
+        return [stream for stream in self.streams if stream.get('codec_type') == codec_type]
+
+    @property
+    def video(self) -> Optional[Dict[str, Any]]:
+        """First real video stream (embedded cover art is skipped)"""
+        return next(
+            (s for s in self.streams_of('video') if not s.get('disposition', {}).get('attached_pic')),
+            None
+        )
+
+    @property
+    def audio(self) -> Optional[Dict[str, Any]]:
+        streams = self.streams_of('audio')
+        return streams[0] if streams else None
+
+    @property
+    def width(self) -> int:
+        return int(self.video.get('width') or 0) if self.video else 0
+
+    @property
+    def height(self) -> int:
+        return int(self.video.get('height') or 0) if self.video else 0
+
+    def to_video_info(self) -> Dict[str, Any]:
+        """Summary dict in the shape helpers.utils.get_video_info has always returned"""
+        return {
+            'duration': int(self.duration),
+            'width': self.width,
+            'height': self.height,
+            'video_codec': self.video.get('codec_name', 'unknown') if self.video else 'unknown',
+            'audio_codec': self.audio.get('codec_name', 'unknown') if self.audio else 'unknown',
+            'file_size': self.size,
+            'bitrate': self.bitrate
+        }
+
+class MediaProbe:
+    """
+    Async probe service.
+    Results are cached per (path, size, mtime_ns), so a rewritten file is probed again;
+    concurrent requests for the same file share one ffprobe process, and all processes
+    run under the scheduler's probe gate.
+
+    quick=True callers only need duration, frame size and bitrate: those are answered by
+    the in-process header parser when it can read the container, and by ffprobe otherwise.
+    """
+
+    def __init__(self, store: CacheNamespace):
+        self._cache = store          # key -> MediaInfo (LRU, bounded by the namespace quota)
+        self._inflight = {}          # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.in_process = 0  # Probes answered without spawning ffprobe
+
+    def _key(self, path: str, size: Optional[int] = None) -> Optional[Tuple[str, int, int]]:
+        if is_remote_input(path):
+            return (path, size or 0, 0)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    def _cached(self, key, quick: bool = False) -> Optional[MediaInfo]:
+        info = self._cache.get(key)
+        if info is not None and (quick or info.complete):
+            self.hits += 1
+            return info
+        return None
+
+    def _store(self, key, info: MediaInfo):
+        current = self._cache.peek(key)
+        if current is not None and current.complete and not info.complete:
+            return
+        self._cache.set(key, info)
+
+    def _command(self, path: str) -> List[str]:
+        options = REMOTE_INPUT_OPTIONS if is_remote_input(path) else []
+        return [
+            'ffprobe', '-v', 'quiet', *options, '-print_format', 'json',
+            '-show_format', '-show_streams', '-show_chapters', path
+        ]
+
+    def _use_in_process(self, path: str, quick: bool) -> bool:
+        return quick and in_process_backend is not None and not is_remote_input(path) and in_process_backend.supports(path)
+
+    async def probe(self, path: str, size: Optional[int] = None, quick: bool = False) -> MediaInfo:
+        """Probe a local file or URL (size is a hint for URLs); never raises"""
+        key = self._key(path, size)
+        if key is None:
+            return MediaInfo(path)
+
+        info = self._cached(key, quick)
+        if info is not None:
+            return info
+
+        # A running full probe also answers quick requests
+        in_process = self._use_in_process(path, quick) and (key, False) not in self._inflight
+        task_key = (key, in_process)
+        task = self._inflight.get(task_key)
+        if task:
+            self.joined += 1
+        else:
+            self.misses += 1
+            runner = self._run_in_process(path, key) if in_process else self._run(path, key)
+            task = asyncio.create_task(runner)
+            self._inflight[task_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(task_key, None))
+
+        # A cancelled caller must not kill the probe other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def _run_in_process(self, path: str, key) -> MediaInfo:
+        """Header parse in the backend's thread pool, ffprobe when it cannot read the file"""
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(in_process_backend.executor, in_process_backend.read, path)
+        if not data:
+            return await self._run(path, key)
+
+        self.in_process += 1
+        info = MediaInfo(path, key[1], data, backend=in_process_backend.name)
+        self._store(key, info)
+        return info
+
+    async def _run(self, path: str, key) -> MediaInfo:
+        timeout = 60 if is_remote_input(path) else 30
+        try:
+            async with ffmpeg_scheduler.probe():
+                process = await asyncio.create_subprocess_exec(
+                    *self._command(path),
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+                )
+                try:
+                    stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    raise
+
+            if process.returncode == 0:
+                info = MediaInfo(path, key[1], json.loads(stdout.decode('utf-8')))
+                self._store(key, info)
+                return info
+            LOGGER.warning(f"ffprobe failed for {path} ({process.returncode})")
+
+        except asyncio.TimeoutError:
+            LOGGER.error(f"ffprobe timeout for {path}")
+        except Exception as e:
+            LOGGER.error(f"ffprobe error for {path}: {e}")
+
+        return MediaInfo(path, key[1])
+
+    def probe_sync(self, path: str, quick: bool = False) -> MediaInfo:
+        """
+        Blocking variant for legacy synchronous helpers; shares the same cache.
+        Async code should await probe() instead.
+        """
+        key = self._key(path)
+        if key is None:
+            return MediaInfo(path)
+
+        info = self._cached(key, quick)
+        if info is not None:
+            return info
+
+        self.misses += 1
+        if self._use_in_process(path, quick):
+            data = in_process_backend.read(path)
+            if data:
+                self.in_process += 1
+                info = MediaInfo(path, key[1], data, backend=in_process_backend.name)
+                self._store(key, info)
+                return info
+
+        try:
+            result = subprocess.run(self._command(path), capture_output=True, text=True, timeout=30)
+            if result.returncode == 0:
+                info = MediaInfo(path, key[1], json.loads(result.stdout))
+                self._store(key, info)
+                return info
+        except Exception as e:
+            LOGGER.error(f"ffprobe error for {path}: {e}")
+
+        return MediaInfo(path, key[1])
+
+    def get_stats(self) -> Dict[str, int]:
+        """Probe cache statistics for /stats"""
+        return {
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'joined': self.joined,
+            'in_process': self.in_process,
+            'inflight': len(self._inflight)
+        }
+
+# Sample containers for the backend benchmark: (file name, extra ffmpeg output args)
+BENCHMARK_SAMPLES = [
+    ('sample.mp4', ['-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-movflags', '+faststart']),
+    ('sample.mkv', ['-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac']),
+    ('sample.m4a', ['-vn', '-c:a', 'aac'])
+]
+
+async def benchmark_backends(rounds: int = 20, paths: Optional[List[str]] = None) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Time ffprobe against the in-process parser on the same files (uncached).
+    Without paths, short lavfi sample clips are generated first.
+    Returns {file name: {'ffprobe': ms, 'in-process': ms or None}}.
+    """
+    work_dir = None
+    if not paths:
+        work_dir = os.path.join(Config.DOWNLOAD_DIR, "probe_benchmark")
+        os.makedirs(work_dir, exist_ok=True)
+        paths = []
+        for name, args in BENCHMARK_SAMPLES:
+            path = os.path.join(work_dir, name)
+            result = await run_ffmpeg(
+                [
+                    'ffmpeg', '-y', '-f', 'lavfi', '-i', 'testsrc2=size=1280x720:rate=30:duration=5',
+                    '-f', 'lavfi', '-i', 'sine=duration=5', *args, '-shortest', path
+                ],
+                duration=5,
+                operation="Probe benchmark sample"
+            )
+            if result.success:
+                paths.append(path)
+
+    probe = MediaProbe(BoundedCache(1, 1024 * 1024).namespace('probe'))  # Private: the shared cache must not answer for us
+    loop = asyncio.get_running_loop()
+    results = {}
+    try:
+        for path in paths:
+            key = probe._key(path)
+            if key is None:
+                continue
+            timings = {}
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await probe._run(path, key)
+            timings['ffprobe'] = (time.perf_counter() - start) * 1000 / rounds
+
+            timings['in-process'] = None
+            if probe._use_in_process(path, quick=True):
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    data = await loop.run_in_executor(in_process_backend.executor, in_process_backend.read, path)
+                if data:
+                    timings['in-process'] = (time.perf_counter() - start) * 1000 / rounds
+
+            results[os.path.basename(path)] = timings
+            LOGGER.info(f"Probe benchmark {os.path.basename(path)}: {timings}")
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+# Global probe service
+media_probe = MediaProbe(cache.namespace('probe', max_entries=max(1, Config.MEDIA_PROBE_CACHE_SIZE)))
+
+# Export probe components
+__all__ = [
+    'MediaInfo',
+    'MediaProbe',
+    'media_probe',
+    'benchmark_backends'
+]
@@ -0,0 +1,238 @@
+# Enhanced Merge Checkpoint Module
+# Persisted job state for robust merges so a crash or restart resumes from the last finished segment
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import List, Optional, Dict, Any, Tuple
+from config import Config
+from helpers.merge_planner import MergePlan, StreamFingerprint
+from helpers.ffmpeg_runner import is_remote_input
+from helpers.encoder_calibration import get_encoder_profile
+from helpers.thumbnails import content_key
+from __init__ import LOGGER, cache
+
+STATE_FILE = "state.json"
+
+# Content identity of downloaded inputs, by file version
+_input_identities = cache.namespace('input-identity', ttl=24 * 3600)
+
+def part_path(path: str) -> str:
+    """In-progress name for an output (the extension stays last so ffmpeg still picks the muxer)"""
+    base, extension = os.path.splitext(path)
+    return f"{base}.part{extension}"
+
+def _file_version(path: str) -> Optional[Tuple[str, int, int]]:
+    # Inode rather than mtime: linking a stored blob elsewhere touches the shared mtime
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), stat.st_ino, stat.st_size)
+
+def remember_input_identity(path: str, identity: str):
+    """
+    Record what a downloaded input is (blob key: Telegram file_unique_id or sha256,
+    else URL + validator), so checkpoints match content rather than file names
+    """
+    version = _file_version(path)
+    if version:
+        _input_identities.set(version, identity)
+
+def _input_identity(path: str, size: int) -> str:
+    # Downloads are wiped on shutdown; a re-downloaded input gets the same identity again
+    if is_remote_input(path):
+        return f"{path}:{size}"
+    version = _file_version(path)
+    identity = _input_identities.peek(version) if version else None
+    if identity:
+        return identity
+    # Not from the downloader: sampled content hash (never just the name, uploads are often video.mp4)
+    return f"sample_{content_key(path)}" if version else f"{os.path.basename(path)}:{size}"
+
+def _input_sample(path: str) -> Optional[str]:
+    """Sampled content hash of a local input (None for remote inputs)"""
+    if is_remote_input(path) or not os.path.exists(path):
+        return None
+    return content_key(path)
+
+def _encoder_settings() -> List[Any]:
+    return [Config.VIDEO_CRF, get_encoder_profile().preset, Config.AUDIO_BITRATE]
+
+def _job_id(user_id: int, identities: List[str], target: StreamFingerprint) -> str:
+    key = json.dumps([user_id, identities, list(target)] + _encoder_settings())
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def merge_job_id(user_id: int, plan: MergePlan, target: StreamFingerprint) -> str:
+    """Stable id for a robust merge: same user, inputs, target and encoder settings"""
+    return _job_id(user_id, [_input_identity(segment.path, segment.size) for segment in plan.segments], target)
+
+class MergeCheckpoint:
+    """
+    On-disk state of one robust merge.
+    Every finished segment is renamed from its .part file into place and recorded,
+    so only unfinished segments are encoded again after a crash.
+    """
+
+    def __init__(self, job_id: str, state: Dict[str, Any]):
+        self.job_id = job_id
+        self.directory = os.path.join(Config.MERGE_JOBS_DIR, job_id)
+        self.state = state
+
+    @classmethod
+    def open(cls, user_id: int, plan: MergePlan, target: StreamFingerprint, extension: str) -> 'MergeCheckpoint':
+        """Load the job's checkpoint if one exists, otherwise start a new one"""
+        identities = [_input_identity(segment.path, segment.size) for segment in plan.segments]
+        job_id = _job_id(user_id, identities, target)
+        checkpoint = cls(job_id, {})
+        state = checkpoint._load()
+        if not state:
+            # After a restart the remembered identities may be gone: match saved inputs by content
+            found = cls._find_by_content(user_id, plan, target, extension, identities)
+            if found:
+                checkpoint, state = found, found.state
+
+        if state:
+            checkpoint.state = state
+            resumed = len(checkpoint.completed_indices())
+            if resumed:
+                LOGGER.info(f"Resuming merge job {checkpoint.job_id}: {resumed}/{len(plan.segments)} segments already encoded")
+        else:
+            os.makedirs(checkpoint.directory, mode=0o755, exist_ok=True)
+            checkpoint.state = {
+                'job_id': job_id,
+                'user_id': user_id,
+                'created': time.time(),
+                'inputs': [segment.path for segment in plan.segments],
+                'identities': identities,
+                'samples': [_input_sample(segment.path) for segment in plan.segments],
+                'target': target._asdict(),
+                'settings': _encoder_settings(),
+                'extension': extension,
+                'segments': {}
+            }
+            checkpoint.save()
+
+        return checkpoint
+
+    @classmethod
+    def _find_by_content(
+        cls,
+        user_id: int,
+        plan: MergePlan,
+        target: StreamFingerprint,
+        extension: str,
+        identities: List[str]
+    ) -> Optional['MergeCheckpoint']:
+        """Checkpoint of the same user and settings whose saved inputs match by identity or content"""
+        if not os.path.isdir(Config.MERGE_JOBS_DIR):
+            return None
+
+        samples = None
+        for job_id in os.listdir(Config.MERGE_JOBS_DIR):
+            checkpoint = cls(job_id, {})
+            state = checkpoint._load()
+            if (
+                not state or state.get('user_id') != user_id
+                or state.get('target') != target._asdict()
+                or state.get('settings') != _encoder_settings()
+                or state.get('extension') != extension
+                or len(state.get('identities', [])) != len(identities)
+            ):
+                continue
+            if samples is None:
+                samples = [_input_sample(segment.path) for segment in plan.segments]
+            if all(
+                saved == current or (saved_sample and saved_sample == sample)
+                for saved, current, saved_sample, sample in zip(
+                    state['identities'], identities, state.get('samples', []), samples
+                )
+            ):
+                checkpoint.state = state
+                return checkpoint
+        return None
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        state_path = os.path.join(self.directory, STATE_FILE)
+        try:
+            if os.path.exists(state_path):
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            LOGGER.warning(f"Could not load merge checkpoint {self.job_id}: {e}")
+        return None
+
+    def save(self):
+        """Write the state atomically so a crash never leaves a torn file"""
+        self.state['updated'] = time.time()
+        state_path = os.path.join(self.directory, STATE_FILE)
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, state_path)
+
+    @property
+    def total(self) -> int:
+        return len(self.state.get('inputs', []))
+
+    def segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"segment_{index}{self.state['extension']}")
+
+    def completed(self, index: int) -> Optional[str]:
+        """Path of a finished segment, if its file is still intact"""
+        entry = self.state['segments'].get(str(index))
+        if not entry:
+            return None
+        path = self.segment_path(index)
+        if os.path.exists(path) and os.path.getsize(path) == entry['size']:
+            return path
+        return None
+
+    def completed_indices(self) -> List[int]:
+        return [i for i in range(self.total) if self.completed(i)]
+
+    def mark_done(self, index: int, temp_path: str):
+        """Atomically move a finished .part file into place and record it"""
+        path = self.segment_path(index)
+        os.replace(temp_path, path)
+        self.state['segments'][str(index)] = {'size': os.path.getsize(path), 'finished': time.time()}
+        self.save()
+
+    def finish(self):
+        """Drop the checkpoint once the merged file exists"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def interrupted_merge_jobs() -> List[Dict[str, Any]]:
+    """
+    States of robust merges left behind by a crash or restart.
+    Jobs older than MERGE_JOB_TTL hours are removed instead.
+    """
+    jobs = []
+    if not os.path.isdir(Config.MERGE_JOBS_DIR):
+        return jobs
+
+    cutoff = time.time() - Config.MERGE_JOB_TTL * 3600
+    for job_id in os.listdir(Config.MERGE_JOBS_DIR):
+        checkpoint = MergeCheckpoint(job_id, {})
+        state = checkpoint._load()
+        if not state or state.get('updated', 0) < cutoff:
+            checkpoint.finish()
+            continue
+        checkpoint.state = state
+        state['completed'] = len(checkpoint.completed_indices())
+        jobs.append(state)
+
+    return jobs
+
+# Export checkpoint components
+__all__ = [
+    'MergeCheckpoint',
+    'merge_job_id',
+    'remember_input_identity',
+    'part_path',
+    'interrupted_merge_jobs'
+]
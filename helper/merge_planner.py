@@ -0,0 +1,292 @@
+# Enhanced Merge Planner Module
+# Stream fingerprints and dry-run merge plans with time/size estimates
+
+import asyncio
+from typing import List, Optional, Dict, Any, NamedTuple
+from config import Config
+from helpers.utils import get_readable_file_size, format_progress_time
+from helpers.media_probe import MediaInfo, media_probe
+from helpers.encoder_calibration import get_encoder_profile
+from __init__ import LOGGER
+
+# Plan modes
+FAST_COPY = "fast_copy"
+PARTIAL_NORMALIZE = "partial_normalize"
+FULL_REENCODE = "full_reencode"
+
+# Stream copy is bound by disk throughput (~100MB/s, same figure as estimate_merge_time)
+COPY_THROUGHPUT = 100 * 1024 * 1024
+
+# FFmpeg encoders able to reproduce a reference stream's codec
+VIDEO_ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'mpeg4': 'mpeg4',
+    'vp9': 'libvpx-vp9',
+    'av1': 'libaom-av1'
+}
+
+AUDIO_ENCODERS = {
+    'aac': 'aac',
+    'mp3': 'libmp3lame',
+    'opus': 'libopus',
+    'vorbis': 'libvorbis',
+    'ac3': 'ac3',
+    'eac3': 'eac3',
+    'flac': 'flac'
+}
+
+# Encoder profile names for the profiles ffprobe reports
+ENCODER_PROFILES = {
+    'libx264': {
+        'Constrained Baseline': 'baseline',
+        'Baseline': 'baseline',
+        'Main': 'main',
+        'High': 'high',
+        'High 10': 'high10',
+        'High 4:2:2': 'high422',
+        'High 4:4:4 Predictive': 'high444'
+    },
+    'libx265': {
+        'Main': 'main',
+        'Main 10': 'main10',
+        'Main Still Picture': 'mainstillpicture'
+    }
+}
+
+class StreamFingerprint(NamedTuple):
+    """Compact, hashable description of everything concat copy depends on"""
+    video_codec: str
+    profile: Optional[str]
+    width: int
+    height: int
+    pix_fmt: Optional[str]
+    fps: Optional[str]
+    time_base: Optional[str]
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    channel_layout: Optional[str] = None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    def short(self) -> str:
+        """Human-readable one-liner for status messages"""
+        text = f"{self.video_codec} {self.width}x{self.height}"
+        if self.has_audio:
+            text += f" + {self.audio_codec} {self.sample_rate}Hz"
+        return text
+
+def fingerprint_from_probe(probe_data: Dict[str, Any]) -> Optional[StreamFingerprint]:
+    """Build a fingerprint from ffprobe -show_streams JSON"""
+    video = None
+    audio = None
+
+    for stream in probe_data.get('streams', []):
+        codec_type = stream.get('codec_type')
+        if codec_type == 'video' and video is None:
+            if stream.get('disposition', {}).get('attached_pic'):
+                continue  # Skip embedded cover art
+            video = stream
+        elif codec_type == 'audio' and audio is None:
+            audio = stream
+
+    if video is None:
+        return None
+
+    return StreamFingerprint(
+        video_codec=video.get('codec_name'),
+        profile=video.get('profile'),
+        width=int(video.get('width') or 0),
+        height=int(video.get('height') or 0),
+        pix_fmt=video.get('pix_fmt'),
+        fps=video.get('r_frame_rate'),
+        time_base=video.get('time_base'),
+        audio_codec=audio.get('codec_name') if audio else None,
+        sample_rate=int(audio.get('sample_rate') or 0) if audio else None,
+        channels=int(audio.get('channels') or 0) if audio else None,
+        channel_layout=audio.get('channel_layout') if audio else None
+    )
+
+class SegmentPlan:
+    """Planned handling of one merge input"""
+
+    def __init__(
+        self,
+        path: str,
+        fingerprint: Optional[StreamFingerprint],
+        duration: float,
+        size: int,
+        info: Optional[MediaInfo] = None
+    ):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.duration = duration
+        self.size = size
+        self.info = info
+        self.action = "copy"  # copy | normalize | reencode
+
+class MergePlan:
+    """Dry-run result describing how a merge will be executed and what it will cost"""
+
+    def __init__(self, mode: str, reference: Optional[StreamFingerprint], segments: List[SegmentPlan]):
+        self.mode = mode
+        self.reference = reference
+        self.segments = segments
+        self.predicted_seconds = 0.0
+        self.predicted_size = 0
+
+    @property
+    def total_duration(self) -> float:
+        return sum(segment.duration for segment in self.segments)
+
+    @property
+    def normalize_indices(self) -> List[int]:
+        return [i for i, segment in enumerate(self.segments) if segment.action == "normalize"]
+
+    def summary_text(self) -> str:
+        """Plan preview shown to the user before any encoding starts"""
+        mode_names = {
+            FAST_COPY: "⚡ Fast copy (no re-encoding)",
+            PARTIAL_NORMALIZE: f"🧩 Partial normalize ({len(self.normalize_indices)}/{len(self.segments)} re-encoded)",
+            FULL_REENCODE: "🛡️ Full re-encode"
+        }
+        lines = [
+            "📋 **Merge Plan**",
+            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━",
+            f"🔧 **Mode:** {mode_names.get(self.mode, self.mode)}",
+        ]
+        if self.reference:
+            lines.append(f"🎯 **Target:** `{self.reference.short()}`")
+        lines.extend([
+            f"🎬 **Duration:** `{format_progress_time(int(self.total_duration))}`",
+            f"⏱️ **Predicted Time:** `{format_progress_time(int(self.predicted_seconds))}`",
+            f"📊 **Predicted Size:** `{get_readable_file_size(int(self.predicted_size))}`"
+        ])
+        return "\n".join(lines)
+
+async def probe_segment(path: str, size: Optional[int] = None) -> SegmentPlan:
+    """
+    Probe one input through the shared probe service.
+    Remote (HTTP) inputs are probed in place; pass their size since there is no local file.
+    """
+    info = await media_probe.probe(path, size)
+    if size is None:
+        size = info.size
+    fingerprint = fingerprint_from_probe(info.data) if info.ok else None
+    return SegmentPlan(path, fingerprint, info.duration, size, info)
+
+def can_normalize_to(reference: StreamFingerprint) -> bool:
+    """Whether segments can be re-encoded to match the reference exactly"""
+    if reference.video_codec not in VIDEO_ENCODERS:
+        return False
+    return not reference.has_audio or reference.audio_codec in AUDIO_ENCODERS
+
+def _estimate_encode_seconds(duration: float, reference: Optional[StreamFingerprint]) -> float:
+    """Wall time for re-encoding `duration` seconds of media"""
+    profile = get_encoder_profile()
+    if profile.calibrated:
+        # Calibration measures 720p; encode cost scales roughly with pixel count
+        speed = profile.speed
+        if reference and reference.width and reference.height:
+            speed *= (1280 * 720) / (reference.width * reference.height)
+    else:
+        speed = Config.ESTIMATED_ENCODE_SPEED
+    return duration / max(speed, 0.01)
+
+def _estimate_costs(plan: MergePlan):
+    """Fill in predicted wall time and output size"""
+    copy_bytes = sum(s.size for s in plan.segments if s.action == "copy")
+    copy_seconds = sum(s.duration for s in plan.segments if s.action == "copy")
+
+    # Re-encoded segments are assumed to land at the bitrate of the copied ones
+    if copy_seconds > 0:
+        bytes_per_second = copy_bytes / copy_seconds
+    else:
+        total_duration = plan.total_duration
+        bytes_per_second = sum(s.size for s in plan.segments) / total_duration if total_duration else 0
+
+    encoded = [s for s in plan.segments if s.action != "copy"]
+    encode_seconds = sum(_estimate_encode_seconds(s.duration, plan.reference or s.fingerprint) for s in encoded)
+    encoded_bytes = sum(s.duration * bytes_per_second for s in encoded)
+
+    # Every byte is written once more by the final concat copy
+    final_bytes = copy_bytes + encoded_bytes
+    plan.predicted_seconds = encode_seconds + final_bytes / COPY_THROUGHPUT
+    plan.predicted_size = int(final_bytes)
+
+def majority_fingerprint(fingerprints: List[Optional[StreamFingerprint]]) -> Optional[StreamFingerprint]:
+    """
+    Most common fingerprint (ties go to the earliest input).
+    The majority wins so one odd input never forces the rest to re-encode.
+    """
+    counts = {}
+    for fingerprint in fingerprints:
+        if fingerprint is not None:
+            counts[fingerprint] = counts.get(fingerprint, 0) + 1
+    return max(counts, key=counts.get) if counts else None
+
+def build_plan(segments: List[SegmentPlan]) -> MergePlan:
+    """Choose the merge strategy for already-probed segments"""
+    for segment in segments:
+        segment.action = "copy"
+    fingerprints = [segment.fingerprint for segment in segments]
+    reference = majority_fingerprint(fingerprints)
+
+    if reference is None or None in fingerprints:
+        for segment in segments:
+            segment.action = "reencode"
+        plan = MergePlan(FULL_REENCODE, None, segments)
+    else:
+        for segment in segments:
+            if segment.fingerprint != reference:
+                segment.action = "normalize"
+
+        if not any(segment.action == "normalize" for segment in segments):
+            plan = MergePlan(FAST_COPY, reference, segments)
+        elif can_normalize_to(reference):
+            plan = MergePlan(PARTIAL_NORMALIZE, reference, segments)
+        else:
+            for segment in segments:
+                segment.action = "reencode"
+            plan = MergePlan(FULL_REENCODE, reference, segments)
+
+    _estimate_costs(plan)
+    return plan
+
+async def plan_merge(video_paths: List[str], sizes: Optional[Dict[str, int]] = None) -> MergePlan:
+    """
+    Dry-run merge planner.
+    Chooses fast copy, partial normalize or full re-encode without touching the inputs.
+    sizes supplies byte counts for remote inputs.
+    """
+    sizes = sizes or {}
+    # Probes run concurrently, bounded by the scheduler's probe gate
+    segments = list(await asyncio.gather(*(probe_segment(path, sizes.get(path)) for path in video_paths)))
+    plan = build_plan(segments)
+    LOGGER.info(
+        f"Merge plan: {plan.mode}, {len(plan.normalize_indices)} to normalize, "
+        f"~{int(plan.predicted_seconds)}s, ~{get_readable_file_size(plan.predicted_size)}"
+    )
+    return plan
+
+# Export planner components
+__all__ = [
+    'StreamFingerprint',
+    'SegmentPlan',
+    'MergePlan',
+    'FAST_COPY',
+    'PARTIAL_NORMALIZE',
+    'FULL_REENCODE',
+    'VIDEO_ENCODERS',
+    'AUDIO_ENCODERS',
+    'ENCODER_PROFILES',
+    'fingerprint_from_probe',
+    'probe_segment',
+    'can_normalize_to',
+    'majority_fingerprint',
+    'build_plan',
+    'plan_merge'
+]
@@ -0,0 +1,183 @@
+# Enhanced Merge Result Index
+# Remembers finished merges by input identity so a repeated request replays the earlier upload
+
+import os
+import json
+import time
+import hashlib
+from typing import List, Optional, Dict, Any
+from pyrogram import Client
+from config import Config
+from helpers.encoder_calibration import get_encoder_profile
+from __init__ import LOGGER
+
+class MergeResultIndex:
+    """
+    Persistent map from (ordered input identities + merge parameters) to delivered results:
+    the Telegram file_id of the uploaded merge and any GoFile/Drive links.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = self._load()  # key -> {'telegram': {...}, 'gofile': url, 'drive': url, ...}
+        self.hits = 0
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            LOGGER.warning(f"Could not load merge result index: {e}")
+        return {}
+
+    def _save(self):
+        if len(self.entries) > self.max_entries:
+            oldest = sorted(self.entries, key=lambda key: self.entries[key].get('updated', 0))
+            for key in oldest[:len(self.entries) - self.max_entries]:
+                del self.entries[key]
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            LOGGER.error(f"Could not save merge result index: {e}")
+
+    def lookup(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Delivered results for this merge, if it has been done before"""
+        if not key:
+            return None
+        entry = self.entries.get(key)
+        if entry and (entry.get('telegram') or entry.get('gofile') or entry.get('drive')):
+            return entry
+        return None
+
+    def record(self, key: Optional[str], **fields):
+        """Add results for a merge (telegram={'file_id', 'media'}, gofile=link, drive=link, ...)"""
+        if not key:
+            return
+        entry = self.entries.setdefault(key, {'created': time.time()})
+        entry.update({name: value for name, value in fields.items() if value})
+        entry['updated'] = time.time()
+        self._save()
+
+    def forget(self, key: str, field: str):
+        """Drop a result that can no longer be replayed (e.g. an expired file_id)"""
+        entry = self.entries.get(key)
+        if entry and entry.pop(field, None) is not None:
+            self._save()
+
+def _thumbnail_version(path: Optional[str]) -> Optional[List]:
+    # A replaced thumbnail file at the same path must not replay the old upload
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+def merge_result_key(identities: List[str], user) -> str:
+    """
+    Cache key: ordered input identities, everything that changes the merged output
+    and the user's upload settings. Results are per user: stored GoFile/Drive links
+    are never handed to someone else who queues the same inputs.
+    """
+    profile = get_encoder_profile()
+    key = json.dumps([
+        identities,
+        user.user_id,
+        user.merge_mode,
+        user.upload_as_doc,
+        user.upload_to_drive,
+        _thumbnail_version(user.custom_thumbnail),
+        Config.VIDEO_CODEC,
+        Config.AUDIO_CODEC,
+        Config.VIDEO_CRF,
+        Config.AUDIO_BITRATE,
+        profile.preset
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+async def merge_input_identities(client: Client, user_id: int, queue: list, downloader) -> Optional[List[str]]:
+    """
+    Stable identities of the queued inputs: Telegram file_unique_ids and URL+ETag.
+    None when any input cannot be identified (the merge then simply isn't cached).
+    """
+    message_ids = [item for item in queue if not isinstance(item, str)]
+    messages = {}
+    if message_ids:
+        for message in await client.get_messages(chat_id=user_id, message_ids=message_ids):
+            messages[message.id] = message
+
+    identities = []
+    for item in queue:
+        if isinstance(item, str):
+            identity = await downloader.remote_identity(item)
+            if not identity:
+                return None
+            identities.append(f"url:{identity}")
+        else:
+            message = messages.get(item)
+            media = message and (message.video or message.document or message.audio)
+            if not media:
+                return None
+            identities.append(f"tg:{media.file_unique_id}")
+
+    return identities
+
+async def replay_merge_result(client: Client, chat_id: int, key: str, entry: Dict[str, Any], status_message) -> bool:
+    """Deliver a previously merged result again without downloading, merging or uploading"""
+    links = []
+    if entry.get('gofile'):
+        links.append(f"🔗 **GoFile:** {entry['gofile']}")
+    if entry.get('drive'):
+        links.append(f"☁️ **Drive:** {entry['drive']}")
+
+    caption = (
+        f"**Enhanced MERGE-BOT**\n"
+        f"➢ **File:** `{entry.get('filename', 'merged_video.mp4')}`\n"
+        f"➢ **Size:** `{entry.get('size_text', 'Unknown')}`\n"
+        f"➢ ♻️ Same inputs merged before, delivered from cache"
+    )
+
+    telegram = entry.get('telegram')
+    sent = False
+    if telegram:
+        try:
+            if telegram.get('media') == 'document':
+                await client.send_document(chat_id=chat_id, document=telegram['file_id'], caption=caption)
+            else:
+                await client.send_video(chat_id=chat_id, video=telegram['file_id'], caption=caption)
+            sent = True
+        except Exception as e:
+            LOGGER.warning(f"Cached file_id could not be replayed, dropping it: {e}")
+            merge_result_index.forget(key, 'telegram')
+
+    if not sent and not links:
+        return False
+
+    merge_result_index.hits += 1
+    text = (
+        f"♻️ **Merge Served From Cache!**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"📁 **File:** `{entry.get('filename', 'merged_video.mp4')}`\n"
+        f"📊 **Size:** `{entry.get('size_text', 'Unknown')}`\n"
+        f"⚡ These exact inputs were merged before; nothing was downloaded or re-encoded."
+    )
+    if links:
+        text += "\n\n" + "\n".join(links)
+    await status_message.edit_text(text)
+    LOGGER.info(f"Merge result replayed for chat {chat_id} ({'telegram' if sent else 'links'})")
+    return True
+
+# Global result index instance
+merge_result_index = MergeResultIndex(Config.MERGE_RESULT_INDEX_FILE, Config.MERGE_RESULT_INDEX_SIZE)
+
+# Export result index components
+__all__ = [
+    'MergeResultIndex',
+    'merge_result_index',
+    'merge_result_key',
+    'merge_input_identities',
+    'replay_merge_result'
+]
@@ -5,9 +5,23 @@ import os
 import time
 import asyncio
 import subprocess
+from urllib.parse import urlparse
 from typing import List, Optional, Dict, Any
 from config import Config
-from helpers.utils import get_readable_file_size, format_progress_time
+from helpers.utils import get_readable_file_size, format_progress_time, get_progress_bar
+from helpers.ffmpeg_runner import (
+    FFmpegProgress, FFmpegResult, run_ffmpeg, probe_duration, is_remote_input, input_args
+)
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler, queue_status_callback
+from helpers.encoder_calibration import get_encoder_profile
+from helpers.fast_path import CopyStrategy, ANNEXB_FILTERS, fast_path_history
+from helpers.merge_checkpoint import MergeCheckpoint, part_path
+from helpers.status_renderer import smart_progress_editor
+from helpers.merge_planner import (
+    MergePlan, SegmentPlan, StreamFingerprint, plan_merge, build_plan, probe_segment,
+    majority_fingerprint, can_normalize_to, FAST_COPY, PARTIAL_NORMALIZE,
+    VIDEO_ENCODERS, AUDIO_ENCODERS, ENCODER_PROFILES
+)
 from __init__ import LOGGER, performance_monitor
 
 class EnhancedMerger:
@@ -31,44 +45,70 @@ class EnhancedMerger:
             if not os.path.exists(directory):
                 os.makedirs(directory, mode=0o755, exist_ok=True)
     
-    async def merge_videos(self, video_paths: List[str], status_message, output_filename: str = None) -> Optional[str]:
+    def _output_path(self, output_filename: Optional[str]) -> str:
+        if not output_filename:
+            timestamp = int(time.time())
+            output_filename = f"merged_video_{timestamp}.mp4"
+        return os.path.join(self.output_dir, output_filename)
+    
+    def start_pipeline(self, status_message) -> 'MergePipeline':
+        """Start a download→merge pipeline; feed it with add() as downloads finish"""
+        return MergePipeline(self, status_message)
+    
+    async def merge_videos(
+        self,
+        video_paths: List[str],
+        status_message,
+        output_filename: str = None,
+        input_sizes: Optional[Dict[str, int]] = None
+    ) -> Optional[str]:
         """
-        Enhanced video merging with fallback modes
+        Enhanced video merging with fallback modes.
+        video_paths may include HTTP(S) URLs that ffmpeg reads directly; input_sizes gives their sizes.
         """
         if len(video_paths) < 2:
-            await status_message.edit_text("❌ **Need at least 2 videos to merge!**")
+            await smart_progress_editor(status_message, "❌ **Need at least 2 videos to merge!**")
             return None
         
-        if not output_filename:
-            timestamp = int(time.time())
-            output_filename = f"merged_video_{timestamp}.mp4"
-        
-        output_path = os.path.join(self.output_dir, output_filename)
+        output_path = self._output_path(output_filename)
         
         try:
             performance_monitor.start_operation(f"video_merge_{self.user_id}")
             LOGGER.info(f"Starting video merge for user {self.user_id}: {len(video_paths)} files")
             
-            # Try fast mode first (stream copy)
-            await status_message.edit_text(
+            await smart_progress_editor(
+                status_message,
                 f"🔧 **Enhanced Merge Process**\n"
                 f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
                 f"📊 **Files:** {len(video_paths)} videos\n"
-                f"⚡ **Mode:** Fast merge (stream copy)\n"
                 f"🔄 **Status:** Analyzing compatibility..."
             )
             
-            # Check if all videos have compatible formats
-            if await self._check_compatibility(video_paths):
-                # Try fast merge
-                result = await self._fast_merge(video_paths, output_path, status_message)
-                if result:
-                    performance_monitor.end_operation(f"video_merge_{self.user_id}", success=True)
-                    self.merged_files.append(result)
-                    return result
+            # Dry run first so the user sees the strategy and cost before any CPU is spent
+            plan = await self.plan(video_paths, input_sizes)
+            await smart_progress_editor(
+                status_message,
+                f"{plan.summary_text()}\n\n"
+                f"🔄 **Status:** Starting..."
+            )
+            
+            result = None
+            if plan.mode == FAST_COPY:
+                result = await self._fast_merge(
+                    video_paths, output_path, status_message, plan.total_duration, plan.reference
+                )
+            elif plan.mode == PARTIAL_NORMALIZE:
+                # Only re-encode the odd segments, then stream copy everything
+                result = await self._normalize_merge(plan, output_path, status_message)
+            
+            if result:
+                performance_monitor.end_operation(f"video_merge_{self.user_id}", success=True)
+                self.merged_files.append(result)
+                return result
             
             # Fallback to robust merge (re-encoding)
-            await status_message.edit_text(
+            await smart_progress_editor(
+                status_message,
                 f"🔧 **Enhanced Merge Process**\n"
                 f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
                 f"📊 **Files:** {len(video_paths)} videos\n"
@@ -76,7 +116,7 @@ class EnhancedMerger:
                 f"🔄 **Status:** Processing with quality preservation..."
             )
             
-            result = await self._robust_merge(video_paths, output_path, status_message)
+            result = await self._robust_merge(plan, output_path, status_message)
             if result:
                 performance_monitor.end_operation(f"video_merge_{self.user_id}", success=True)
                 self.merged_files.append(result)
@@ -87,7 +127,8 @@ class EnhancedMerger:
             
         except Exception as e:
             LOGGER.error(f"Video merge error for user {self.user_id}: {e}")
-            await status_message.edit_text(
+            await smart_progress_editor(
+                status_message,
                 f"❌ **Merge Failed!**\n"
                 f"**Error:** `{str(e)}`\n"
                 f"**Suggestion:** Check video formats and try again"
@@ -95,152 +136,363 @@ class EnhancedMerger:
             performance_monitor.end_operation(f"video_merge_{self.user_id}", success=False)
             return None
     
-    async def _check_compatibility(self, video_paths: List[str]) -> bool:
-        """Check if videos can be merged using fast mode"""
+    async def plan(self, video_paths: List[str], input_sizes: Optional[Dict[str, int]] = None) -> MergePlan:
+        """Dry-run the merge: pick a strategy and predict its time and size"""
+        return await plan_merge(video_paths, input_sizes)
+    
+    def _build_normalize_command(
+        self,
+        input_path: str,
+        has_audio: bool,
+        reference: StreamFingerprint,
+        output_path: str
+    ) -> Optional[List[str]]:
+        """Build an ffmpeg command that re-encodes one segment to the reference fingerprint"""
+        video_encoder = VIDEO_ENCODERS.get(reference.video_codec)
+        audio_encoder = AUDIO_ENCODERS.get(reference.audio_codec) if reference.has_audio else None
+        if not video_encoder or (reference.has_audio and not audio_encoder):
+            return None
+        
+        width, height = reference.width, reference.height
+        video_filter = (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+            f"fps={reference.fps},format={reference.pix_fmt}"
+        )
+        
+        cmd = ['ffmpeg', '-y'] + input_args(input_path)
+        if reference.has_audio and not has_audio:
+            # Silent track for inputs without audio, cut to the video length
+            layout = reference.channel_layout or 'stereo'
+            cmd.extend(['-f', 'lavfi', '-i', f"anullsrc=r={reference.sample_rate}:cl={layout}"])
+            cmd.extend(['-map', '0:v:0', '-map', '1:a:0', '-shortest'])
+        elif reference.has_audio:
+            cmd.extend(['-map', '0:v:0', '-map', '0:a:0'])
+        else:
+            cmd.extend(['-map', '0:v:0'])
+        
+        cmd.extend([
+            '-vf', video_filter,
+            '-c:v', video_encoder,
+            '-crf', str(Config.VIDEO_CRF),
+            '-preset', get_encoder_profile().preset
+        ])
+        
+        # Matching profiles keep decoders from rejecting the joined stream
+        profile = ENCODER_PROFILES.get(video_encoder, {}).get(reference.profile)
+        if profile:
+            cmd.extend(['-profile:v', profile])
+        
+        if reference.has_audio:
+            cmd.extend([
+                '-c:a', audio_encoder,
+                '-b:a', Config.AUDIO_BITRATE,
+                '-ar', str(reference.sample_rate),
+                '-ac', str(reference.channels)
+            ])
+        
+        # Keep the reference timebase so the concat demuxer can copy timestamps
+        time_base = str(reference.time_base or '')
+        if '/' in time_base and output_path.endswith(('.mp4', '.mov', '.m4v')):
+            cmd.extend(['-video_track_timescale', time_base.split('/')[1]])
+        
+        cmd.append(output_path)
+        return cmd
+    
+    async def _normalize_merge(self, plan: MergePlan, output_path: str, status_message) -> Optional[str]:
+        """Re-encode only the mismatched segments, then join everything by stream copy"""
+        indices = plan.normalize_indices
+        extension = os.path.splitext(output_path)[1] or '.mp4'
+        
+        normalized = await self._transcode_segments(
+            plan, indices, plan.reference, extension, status_message,
+            "🧩 **Normalizing Segments...**"
+        )
+        if normalized is None:
+            return None
+        
         try:
-            # Get info about first video as reference
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_streams', '-show_format', video_paths[0]
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            segment_paths = [normalized.get(i, segment.path) for i, segment in enumerate(plan.segments)]
+            LOGGER.info(f"Normalized {len(indices)}/{len(segment_paths)} segments, joining by stream copy")
+            return await self._fast_merge(
+                segment_paths, output_path, status_message, plan.total_duration, plan.reference
             )
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode == 0:
-                import json
-                info = json.loads(stdout.decode())
-                ref_video_codec = None
-                ref_audio_codec = None
-                
-                for stream in info.get('streams', []):
-                    if stream['codec_type'] == 'video' and not ref_video_codec:
-                        ref_video_codec = stream['codec_name']
-                    elif stream['codec_type'] == 'audio' and not ref_audio_codec:
-                        ref_audio_codec = stream['codec_name']
-                
-                # Check if all other videos have same codecs
-                for video_path in video_paths[1:]:
-                    if not await self._has_compatible_codecs(video_path, ref_video_codec, ref_audio_codec):
-                        return False
-                
-                return True
-            
-            return False
-            
+        finally:
+            self._remove_files(normalized.values())
+    
+    async def _transcode_segments(
+        self,
+        plan: MergePlan,
+        indices: List[int],
+        target: StreamFingerprint,
+        extension: str,
+        status_message,
+        title: str,
+        checkpoint: Optional[MergeCheckpoint] = None
+    ) -> Optional[Dict[int, str]]:
+        """
+        Re-encode the given segments to the target fingerprint in a bounded worker pool.
+        Peak CPU and memory scale with the pool size, not the queue length.
+        With a checkpoint, finished segments are reused and new ones are written to .part files
+        and renamed into the job directory, so they survive a failure.
+        Returns {index: intermediate_path}, or None as soon as any segment fails.
+        """
+        outputs = {}
+        if checkpoint:
+            # Segments finished before a crash or restart are reused as they are
+            for i in indices:
+                done_path = checkpoint.completed(i)
+                if done_path:
+                    outputs[i] = done_path
+        pending = [i for i in indices if i not in outputs]
+        resumed = len(indices) - len(pending)
+        if not pending:
+            return outputs
+        
+        workers = max(1, min(Config.MAX_PARALLEL_TRANSCODES or ffmpeg_scheduler.max_jobs, len(pending)))
+        threads = ffmpeg_scheduler.threads_per_job()
+        semaphore = asyncio.Semaphore(workers)
+        show_queue = queue_status_callback(status_message, "Segment transcoding")
+        queue_positions = {}
+        
+        timestamp = int(time.time())
+        if checkpoint:
+            targets = {i: part_path(checkpoint.segment_path(i)) for i in pending}
+        else:
+            targets = {i: os.path.join(self.temp_dir, f"segment_{i}_{timestamp}{extension}") for i in pending}
+        
+        job_progress = {}
+        total = FFmpegProgress("Transcoding", sum(plan.segments[i].duration for i in pending))
+        start_time = time.time()
+        last_report = 0.0
+        
+        async def report():
+            # Workers share one status message, so edits are throttled across all of them
+            nonlocal last_report
+            now = time.time()
+            if now - last_report < Config.EDIT_THROTTLE_SECONDS:
+                return
+            last_report = now
+            
+            total.out_time = sum(p.out_time for p in job_progress.values())
+            total.total_size = sum(p.total_size for p in job_progress.values())
+            total.speed = sum(p.speed for p in job_progress.values() if not p.done)
+            total.elapsed = now - start_time
+            finished = sum(1 for p in job_progress.values() if p.done)
+            
+            await self._progress_updater(
+                status_message, title,
+                f"🔄 **Segments:** {resumed + finished}/{len(indices)} done"
+                f"{f' ({resumed} resumed)' if resumed else ''}\n"
+                f"⚙️ **Workers:** {workers} × {threads} threads\n"
+                f"🎯 **Target:** {target.short()}"
+            )(total)
+        
+        async def transcode(index: int):
+            async def on_progress(progress):
+                job_progress[index] = progress
+                await report()
+            
+            async def on_queue(position):
+                # Only show the queue while none of our segments is encoding yet
+                queue_positions[index] = position
+                if not job_progress:
+                    await show_queue(min(queue_positions.values()))
+            
+            async with semaphore:
+                await self._transcode_segment(
+                    plan.segments[index], index, target, targets[index], on_progress, on_queue
+                )
+            if checkpoint:
+                checkpoint.mark_done(index, targets[index])
+                outputs[index] = checkpoint.segment_path(index)
+            else:
+                outputs[index] = targets[index]
+        
+        LOGGER.info(f"Transcoding {len(pending)} segments with {workers} workers × {threads} threads")
+        tasks = [asyncio.create_task(transcode(i)) for i in pending]
+        success = False
+        
+        try:
+            await asyncio.gather(*tasks)
+            success = True
+            return outputs
         except Exception as e:
-            LOGGER.error(f"Compatibility check error: {e}")
-            return False
+            LOGGER.warning(f"Parallel transcode aborted: {e}")
+            return None
+        finally:
+            # Fail fast: stop the transcodes that are still running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if not success:
+                # Checkpointed segments that already finished have been renamed away and are kept
+                self._remove_files(targets.values())
+    
+    async def _transcode_segment(
+        self,
+        segment: SegmentPlan,
+        index: int,
+        target: StreamFingerprint,
+        output_path: str,
+        progress_callback=None,
+        queue_callback=None
+    ):
+        """Re-encode one segment to the target fingerprint; raises RuntimeError on failure"""
+        has_audio = segment.fingerprint.has_audio if segment.fingerprint else True
+        cmd = self._build_normalize_command(segment.path, has_audio, target, output_path)
+        if not cmd:
+            raise RuntimeError(f"No encoder for target {target.short()}")
+        
+        result = await run_ffmpeg(
+            cmd,
+            duration=segment.duration,
+            operation=f"Transcode segment {index + 1}",
+            progress_callback=progress_callback,
+            user_id=self.user_id,
+            queue_callback=queue_callback
+        )
+        
+        if not result.success or not os.path.exists(output_path):
+            raise RuntimeError(f"Transcode failed for segment {index + 1}")
     
-    async def _has_compatible_codecs(self, video_path: str, ref_video_codec: str, ref_audio_codec: str) -> bool:
-        """Check if video has compatible codecs with reference"""
+    def _robust_target(self, plan: MergePlan) -> StreamFingerprint:
+        """Shared intermediate format for robust merges, built from the configured encoders"""
+        reference = plan.reference or next(
+            (segment.fingerprint for segment in plan.segments if segment.fingerprint), None
+        )
+        video_codec = {encoder: codec for codec, encoder in VIDEO_ENCODERS.items()}.get(Config.VIDEO_CODEC, 'h264')
+        audio_codec = {encoder: codec for codec, encoder in AUDIO_ENCODERS.items()}.get(Config.AUDIO_CODEC, 'aac')
+        has_audio = any(
+            segment.fingerprint is None or segment.fingerprint.has_audio
+            for segment in plan.segments
+        )
+        
+        # 4:2:0 encoders need even dimensions
+        width = (reference.width if reference else 1280) // 2 * 2
+        height = (reference.height if reference else 720) // 2 * 2
+        
+        return StreamFingerprint(
+            video_codec=video_codec,
+            profile=None,
+            width=width,
+            height=height,
+            pix_fmt='yuv420p',
+            fps=reference.fps if reference and reference.fps else '30',
+            time_base='1/90000',
+            audio_codec=audio_codec if has_audio else None,
+            sample_rate=48000 if has_audio else None,
+            channels=2 if has_audio else None,
+            channel_layout='stereo' if has_audio else None
+        )
+    
+    def _remove_files(self, file_paths):
+        """Best-effort removal of intermediate files"""
+        for file_path in file_paths:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+    
+    async def _concat_copy(
+        self,
+        video_paths: List[str],
+        output_path: str,
+        duration: float,
+        operation: str,
+        progress_callback=None,
+        queue_callback=None,
+        genpts: bool = False
+    ) -> FFmpegResult:
+        """
+        Join files with the concat demuxer by stream copy.
+        URL entries are read straight from the server with range requests and reconnects.
+        genpts rebuilds missing timestamps and shifts negative ones to zero.
+        """
+        concat_file = os.path.join(self.temp_dir, f"concat_{int(time.time())}.txt")
+        
+        with open(concat_file, 'w', encoding='utf-8') as f:
+            for video_path in video_paths:
+                remote = is_remote_input(video_path)
+                # Use absolute path (or the URL) and escape single quotes
+                entry = (video_path if remote else os.path.abspath(video_path)).replace("'", "'\\''")
+                f.write(f"file '{entry}'\n")
+                if remote:
+                    for key, value in REMOTE_CONCAT_OPTIONS:
+                        f.write(f"option {key} {value}\n")
+        
+        cmd = ['ffmpeg', '-y']
+        if genpts:
+            cmd.extend(['-fflags', '+genpts'])
+        cmd.extend(['-f', 'concat', '-safe', '0'])
+        if any(is_remote_input(path) for path in video_paths):
+            cmd.extend(['-protocol_whitelist', REMOTE_PROTOCOL_WHITELIST])
+        cmd.extend(['-i', concat_file, '-c', 'copy'])
+        if genpts:
+            cmd.extend(['-avoid_negative_ts', 'make_zero'])
+        cmd.append(output_path)
+        
         try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_streams', video_path
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            return await run_ffmpeg(
+                cmd,
+                duration=duration,
+                operation=operation,
+                progress_callback=progress_callback,
+                user_id=self.user_id,
+                queue_callback=queue_callback
             )
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode == 0:
-                import json
-                info = json.loads(stdout.decode())
-                
-                for stream in info.get('streams', []):
-                    if stream['codec_type'] == 'video':
-                        if stream['codec_name'] != ref_video_codec:
-                            return False
-                    elif stream['codec_type'] == 'audio':
-                        if stream['codec_name'] != ref_audio_codec:
-                            return False
-                
-                return True
-            
-            return False
-            
-        except Exception as e:
-            LOGGER.error(f"Codec check error for {video_path}: {e}")
-            return False
+        finally:
+            self._remove_files([concat_file])
     
-    async def _fast_merge(self, video_paths: List[str], output_path: str, status_message) -> Optional[str]:
-        """Fast merge using stream copy (no re-encoding)"""
+    async def _fast_merge(
+        self,
+        video_paths: List[str],
+        output_path: str,
+        status_message,
+        total_duration: float = 0.0,
+        fingerprint: Optional[StreamFingerprint] = None
+    ) -> Optional[str]:
+        """
+        Fast merge using stream copy (no re-encoding).
+        Lossless strategies (plain copy, regenerated timestamps, MPEG-TS intermediates, MKV output)
+        are tried in turn; the ones that already failed for this fingerprint are skipped.
+        Returns the output path, whose extension may differ from the requested one.
+        """
         try:
-            # Create concat file
-            concat_file = os.path.join(self.temp_dir, f"concat_{int(time.time())}.txt")
-            
-            with open(concat_file, 'w', encoding='utf-8') as f:
-                for video_path in video_paths:
-                    # Use absolute path and escape single quotes
-                    abs_path = os.path.abspath(video_path).replace("'", "'\\''")
-                    f.write(f"file '{abs_path}'\n")
-            
-            # FFmpeg command for fast concat
-            cmd = [
-                'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
-                '-i', concat_file, '-c', 'copy', output_path
-            ]
-            
             start_time = time.time()
+            if not total_duration:
+                total_duration = await self._get_total_duration(video_paths)
             
-            # Run with progress monitoring
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Monitor progress (simplified for fast mode)
-            while process.returncode is None:
-                await asyncio.sleep(1)
-                elapsed = time.time() - start_time
-                await status_message.edit_text(
-                    f"⚡ **Fast Merge in Progress...**\n"
-                    f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                    f"🔄 **Mode:** Stream copy (no re-encoding)\n"
-                    f"⏱️ **Elapsed:** `{format_progress_time(int(elapsed))}`\n"
-                    f"📊 **Quality:** Original preserved"
+            for strategy in fast_path_history.strategies_for(fingerprint):
+                target_path = strategy.output_path(output_path)
+                success = await self._copy_with_strategy(
+                    strategy, video_paths, target_path, total_duration, fingerprint, status_message
                 )
+                fast_path_history.record(fingerprint, strategy, success)
                 
-                try:
-                    await asyncio.wait_for(process.wait(), timeout=0.1)
-                    break
-                except asyncio.TimeoutError:
-                    continue
-            
-            stdout, stderr = await process.communicate()
-            
-            # Clean up concat file
-            try:
-                os.remove(concat_file)
-            except:
-                pass
-            
-            if process.returncode == 0 and os.path.exists(output_path):
-                # Verify output file
-                if os.path.getsize(output_path) > 0:
+                if success:
                     merge_time = time.time() - start_time
-                    file_size = get_readable_file_size(os.path.getsize(output_path))
+                    file_size = get_readable_file_size(os.path.getsize(target_path))
                     
-                    await status_message.edit_text(
+                    await smart_progress_editor(
+                        status_message,
                         f"✅ **Fast Merge Completed!**\n"
                         f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                        f"📁 **Output:** `{os.path.basename(output_path)}`\n"
+                        f"📁 **Output:** `{os.path.basename(target_path)}`\n"
                         f"📊 **Size:** `{file_size}`\n"
                         f"⏱️ **Time:** `{format_progress_time(int(merge_time))}`\n"
-                        f"⚡ **Mode:** Fast (stream copy)\n"
+                        f"⚡ **Mode:** Fast (stream copy, {strategy.label})\n"
                         f"🎯 **Quality:** Original preserved"
                     )
                     
-                    LOGGER.info(f"Fast merge successful: {output_path}")
-                    return output_path
-            
-            # Fast merge failed, will try robust merge
-            if os.path.exists(output_path):
-                os.remove(output_path)
+                    LOGGER.info(f"Fast merge successful ({strategy.name}): {target_path}")
+                    return target_path
+                
+                # Remove partial output before the next strategy
+                self._remove_files([target_path])
+                LOGGER.info(f"Fast merge strategy {strategy.name} failed")
             
+            # Every lossless strategy failed, will try robust merge
             LOGGER.warning("Fast merge failed, will try robust merge")
             return None
             
@@ -248,99 +500,139 @@ class EnhancedMerger:
             LOGGER.error(f"Fast merge error: {e}")
             return None
     
-    async def _robust_merge(self, video_paths: List[str], output_path: str, status_message) -> Optional[str]:
-        """Robust merge with re-encoding and progress tracking"""
+    async def _copy_with_strategy(
+        self,
+        strategy: CopyStrategy,
+        video_paths: List[str],
+        output_path: str,
+        total_duration: float,
+        fingerprint: Optional[StreamFingerprint],
+        status_message
+    ) -> bool:
+        """Run one lossless join strategy; True when it produced a non-empty output"""
+        intermediates = []
+        try:
+            inputs = video_paths
+            if strategy.ts_intermediates:
+                intermediates = await self._remux_to_ts(video_paths, fingerprint)
+                if intermediates is None:
+                    return False
+                inputs = intermediates
+            
+            result = await self._concat_copy(
+                inputs,
+                output_path,
+                total_duration,
+                "Fast merge",
+                self._progress_updater(
+                    status_message,
+                    "⚡ **Fast Merge in Progress...**",
+                    f"🔄 **Mode:** Stream copy ({strategy.label})"
+                ),
+                queue_status_callback(status_message, "Fast merge"),
+                genpts=strategy.genpts
+            )
+            return result.success and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        finally:
+            self._remove_files(intermediates or [])
+    
+    async def _remux_to_ts(
+        self,
+        video_paths: List[str],
+        fingerprint: Optional[StreamFingerprint]
+    ) -> Optional[List[str]]:
+        """Stream copy every input into MPEG-TS (Annex B video) so the concat sees uniform timestamps"""
+        timestamp = int(time.time() * 1000)
+        outputs = [os.path.join(self.temp_dir, f"fastts_{i}_{timestamp}.ts") for i in range(len(video_paths))]
+        
+        async def remux(input_path: str, output_path: str) -> bool:
+            cmd = ['ffmpeg', '-y', '-fflags', '+genpts'] + input_args(input_path) + ['-c', 'copy']
+            video_filter = ANNEXB_FILTERS.get(fingerprint.video_codec) if fingerprint else None
+            if video_filter:
+                cmd.extend(['-bsf:v', video_filter])
+            cmd.extend(['-f', 'mpegts', output_path])
+            result = await run_ffmpeg(cmd, operation="TS remux", user_id=self.user_id)
+            return result.success
+        
+        results = await asyncio.gather(*(remux(i, o) for i, o in zip(video_paths, outputs)))
+        if not all(results):
+            self._remove_files(outputs)
+            return None
+        return outputs
+    
+    async def _robust_merge(self, plan: MergePlan, output_path: str, status_message) -> Optional[str]:
+        """
+        Robust merge: transcode every input to one shared format in parallel,
+        then join the intermediates by stream copy.
+        Segments are checkpointed, so a merge that dies part-way resumes from the last finished one.
+        """
         try:
-            # Create input list
-            inputs = []
-            for i, video_path in enumerate(video_paths):
-                inputs.extend(['-i', video_path])
-            
-            # Build FFmpeg command with quality settings
-            cmd = [
-                'ffmpeg', '-y'
-            ] + inputs + [
-                '-filter_complex',
-                f'{"".join([f"[{i}:v][{i}:a]" for i in range(len(video_paths))])}concat=n={len(video_paths)}:v=1:a=1[outv][outa]',
-                '-map', '[outv]', '-map', '[outa]',
-                '-c:v', Config.VIDEO_CODEC,
-                '-crf', str(Config.VIDEO_CRF),
-                '-preset', Config.FFMPEG_PRESET,
-                '-c:a', Config.AUDIO_CODEC,
-                '-b:a', Config.AUDIO_BITRATE,
-                output_path
-            ]
-            
             start_time = time.time()
-            last_update = 0
-            
-            # Get total duration for progress calculation
-            total_duration = await self._get_total_duration(video_paths)
-            
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            target = self._robust_target(plan)
+            extension = os.path.splitext(output_path)[1] or '.mp4'
+            checkpoint = MergeCheckpoint.open(self.user_id, plan, target, extension)
+            
+            intermediates = await self._transcode_segments(
+                plan, list(range(len(plan.segments))), target, extension, status_message,
+                "🛡️ **Robust Merge in Progress...**",
+                checkpoint
             )
             
-            # Monitor progress
-            while process.returncode is None:
-                current_time = time.time()
-                
-                if current_time - last_update >= 3.0:  # Update every 3 seconds
-                    elapsed = current_time - start_time
-                    
-                    # Try to get current progress from output file size (rough estimate)
-                    if os.path.exists(output_path):
-                        current_size = os.path.getsize(output_path)
-                        progress_text = (
-                            f"🛡️ **Robust Merge in Progress...**\n"
-                            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                            f"🔄 **Mode:** Re-encoding with quality preservation\n"
-                            f"📊 **Current Size:** `{get_readable_file_size(current_size)}`\n"
-                            f"⏱️ **Elapsed:** `{format_progress_time(int(elapsed))}`\n"
-                            f"🎯 **Quality:** CRF {Config.VIDEO_CRF} ({Config.FFMPEG_PRESET})\n"
-                            f"🔧 **Codec:** {Config.VIDEO_CODEC}/{Config.AUDIO_CODEC}"
-                        )
-                        await status_message.edit_text(progress_text)
-                    
-                    last_update = current_time
-                
-                await asyncio.sleep(1)
-                
-                try:
-                    await asyncio.wait_for(process.wait(), timeout=0.1)
-                    break
-                except asyncio.TimeoutError:
-                    continue
+            if intermediates is None:
+                await smart_progress_editor(
+                    status_message,
+                    "❌ **Robust Merge Failed!**\n"
+                    "Could not re-encode every input.\n"
+                    "Finished segments are kept; merging the same files again resumes from them."
+                )
+                return None
             
-            stdout, stderr = await process.communicate()
+            # The output only appears under its real name once it is complete
+            temp_output = part_path(output_path)
+            try:
+                result = await self._concat_copy(
+                    [intermediates[i] for i in range(len(plan.segments))],
+                    temp_output,
+                    plan.total_duration,
+                    "Robust merge",
+                    self._progress_updater(
+                        status_message,
+                        "🔗 **Joining Segments...**",
+                        "🔄 **Mode:** Stream copy of re-encoded segments"
+                    ),
+                    queue_status_callback(status_message, "Joining segments")
+                )
+            except BaseException:
+                self._remove_files([temp_output])
+                raise
             
-            if process.returncode == 0 and os.path.exists(output_path):
+            if result.success and os.path.exists(temp_output):
                 # Verify output file
-                if os.path.getsize(output_path) > 0:
+                if os.path.getsize(temp_output) > 0:
+                    os.replace(temp_output, output_path)
+                    checkpoint.finish()
                     merge_time = time.time() - start_time
                     file_size = get_readable_file_size(os.path.getsize(output_path))
                     
-                    await status_message.edit_text(
+                    await smart_progress_editor(
+                        status_message,
                         f"✅ **Robust Merge Completed!**\n"
                         f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
                         f"📁 **Output:** `{os.path.basename(output_path)}`\n"
                         f"📊 **Size:** `{file_size}`\n"
                         f"⏱️ **Time:** `{format_progress_time(int(merge_time))}`\n"
                         f"🛡️ **Mode:** Robust (re-encoded)\n"
-                        f"🎯 **Quality:** CRF {Config.VIDEO_CRF}"
+                        f"🎯 **Quality:** CRF {Config.VIDEO_CRF} ({get_encoder_profile().preset})"
                     )
                     
                     LOGGER.info(f"Robust merge successful: {output_path}")
                     return output_path
             
-            # Log error details
-            if stderr:
-                error_output = stderr.decode('utf-8', errors='ignore')[-500:]  # Last 500 chars
-                LOGGER.error(f"FFmpeg error output: {error_output}")
-            
-            await status_message.edit_text(
+            self._remove_files([temp_output])
+            await smart_progress_editor(
+                status_message,
                 f"❌ **Robust Merge Failed!**\n"
-                f"FFmpeg process returned error code: {process.returncode}\n"
+                f"FFmpeg process returned error code: {result.returncode}\n"
                 f"Check video formats and try again."
             )
             
@@ -348,36 +640,29 @@ class EnhancedMerger:
             
         except Exception as e:
             LOGGER.error(f"Robust merge error: {e}")
-            await status_message.edit_text(f"❌ **Merge Error:** `{str(e)}`")
+            await smart_progress_editor(status_message, f"❌ **Merge Error:** `{str(e)}`")
             return None
     
     async def _get_total_duration(self, video_paths: List[str]) -> float:
         """Get total duration of all videos"""
-        total_duration = 0.0
-        
-        for video_path in video_paths:
-            try:
-                cmd = [
-                    'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                    '-show_format', video_path
-                ]
-                
-                process = await asyncio.create_subprocess_exec(
-                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await process.communicate()
-                
-                if process.returncode == 0:
-                    import json
-                    info = json.loads(stdout.decode())
-                    duration = float(info.get('format', {}).get('duration', 0))
-                    total_duration += duration
-                    
-            except Exception as e:
-                LOGGER.error(f"Duration check error for {video_path}: {e}")
-                continue
-        
-        return total_duration
+        return await probe_duration(*video_paths)
+    
+    def _progress_updater(self, status_message, title: str, details: str):
+        """Build an ffmpeg progress callback that renders into the status message"""
+        async def update(progress):
+            eta = format_progress_time(int(progress.eta)) if progress.eta > 0 else "N/A"
+            await smart_progress_editor(
+                status_message,
+                f"{title}\n"
+                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+                f"{get_progress_bar(progress.percent / 100)} `{progress.percent:.1f}%`\n"
+                f"{details}\n"
+                f"📊 **Current Size:** `{get_readable_file_size(progress.total_size)}`\n"
+                f"🚀 **Speed:** `{progress.speed:.2f}x`\n"
+                f"⏱️ **Elapsed:** `{format_progress_time(int(progress.elapsed))}`\n"
+                f"🔮 **ETA:** `{eta}`"
+            )
+        return update
     
     async def cleanup(self):
         """Clean up temporary files and resources"""
@@ -412,6 +697,151 @@ class EnhancedMerger:
             'files_merged': len(self.merged_files) if hasattr(self, 'merged_files') else 0
         }
 
+class MergePipeline:
+    """
+    Overlaps downloading with merge preparation.
+    Each segment is probed as soon as its download lands, and segments that differ from the
+    current majority fingerprint start normalizing right away, so only the final concat
+    (plus any late normalization) is left once the last download finishes.
+    """
+    
+    def __init__(self, merger: EnhancedMerger, status_message):
+        self.merger = merger
+        self.status_message = status_message
+        self.paths = {}            # index -> downloaded path or remote URL
+        self.sizes = {}            # path -> size hint for remote inputs
+        self.segments = {}         # index -> SegmentPlan
+        self._probe_tasks = []
+        self._normalize_tasks = {} # index -> (target fingerprint, task)
+    
+    def add(self, index: int, path: str, size: Optional[int] = None):
+        """
+        Register a finished download (or a range-capable URL with its size);
+        probing and normalization start in the background
+        """
+        self.paths[index] = path
+        if size is not None:
+            self.sizes[path] = size
+        self._probe_tasks.append(asyncio.create_task(self._probe(index, path)))
+    
+    async def _probe(self, index: int, path: str):
+        self.segments[index] = await probe_segment(path, self.sizes.get(path))
+        self._reconcile()
+    
+    def _reconcile(self):
+        """Keep exactly one normalization running for every segment off the current majority"""
+        order = sorted(self.segments)
+        fingerprints = [self.segments[i].fingerprint for i in order]
+        reference = majority_fingerprint(fingerprints)
+        
+        if reference is None or None in fingerprints or not can_normalize_to(reference):
+            # Heading for a full re-encode; speculative work would be wasted
+            for index in list(self._normalize_tasks):
+                self._discard(index)
+            return
+        
+        for index in order:
+            existing = self._normalize_tasks.get(index)
+            if self.segments[index].fingerprint == reference:
+                if existing:
+                    self._discard(index)
+            elif not existing or existing[0] != reference:
+                if existing:
+                    self._discard(index)
+                task = asyncio.create_task(self._normalize(index, reference))
+                self._normalize_tasks[index] = (reference, task)
+                LOGGER.info(f"Pipeline: normalizing segment {index + 1} to {reference.short()}")
+    
+    async def _normalize(self, index: int, reference: StreamFingerprint) -> str:
+        segment = self.segments[index]
+        extension = _input_extension(segment.path) or '.mp4'
+        output_path = os.path.join(
+            self.merger.temp_dir, f"pipeline_{index}_{int(time.time() * 1000)}{extension}"
+        )
+        try:
+            await self.merger._transcode_segment(segment, index, reference, output_path)
+            return output_path
+        except BaseException:
+            self.merger._remove_files([output_path])
+            raise
+    
+    def _discard(self, index: int):
+        """Drop a normalization that no longer matches the reference"""
+        _, task = self._normalize_tasks.pop(index)
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            self.merger._remove_files([task.result()])
+    
+    async def finish(self, output_filename: str = None) -> Optional[str]:
+        """Wait for the pipeline to drain and produce the merged file"""
+        order = sorted(self.paths)
+        video_paths = [self.paths[i] for i in order]
+        output_path = self.merger._output_path(output_filename)
+        
+        try:
+            await asyncio.gather(*self._probe_tasks)
+            plan = build_plan([self.segments[i] for i in order])
+            
+            if plan.mode in (FAST_COPY, PARTIAL_NORMALIZE):
+                segment_paths = list(video_paths)
+                
+                if plan.mode == PARTIAL_NORMALIZE:
+                    pending = [i for i in plan.normalize_indices if not self._normalize_tasks[order[i]][1].done()]
+                    await smart_progress_editor(
+                        self.status_message,
+                        f"{plan.summary_text()}\n\n"
+                        f"🧩 **Status:** {len(plan.normalize_indices) - len(pending)}/{len(plan.normalize_indices)} "
+                        f"segments normalized during download, finishing the rest..."
+                    )
+                    for i in plan.normalize_indices:
+                        segment_paths[i] = await self._normalize_tasks[order[i]][1]
+                
+                result = await self.merger._fast_merge(
+                    segment_paths, output_path, self.status_message, plan.total_duration, plan.reference
+                )
+                if result:
+                    self.merger.merged_files.append(result)
+                    return result
+            
+        except Exception as e:
+            LOGGER.warning(f"Merge pipeline failed, falling back to regular merge: {e}")
+        
+        finally:
+            for index in list(self._normalize_tasks):
+                self._discard(index)
+            for task in self._probe_tasks:
+                task.cancel()
+        
+        # Full re-encode, or the pipelined path failed
+        return await self.merger.merge_videos(
+            video_paths, self.status_message, os.path.basename(output_path), self.sizes
+        )
+    
+    async def cancel(self):
+        """Abort all background work (e.g. when a download fails)"""
+        for index in list(self._normalize_tasks):
+            self._discard(index)
+        for task in self._probe_tasks:
+            task.cancel()
+        await asyncio.gather(*self._probe_tasks, return_exceptions=True)
+
+# Concat demuxer per-file options for HTTP(S) entries (ffmpeg 5.0+)
+REMOTE_CONCAT_OPTIONS = [
+    ('reconnect', '1'),
+    ('reconnect_on_network_error', '1'),
+    ('reconnect_delay_max', '10')
+]
+
+# Protocols the concat demuxer may open when the list contains URLs
+REMOTE_PROTOCOL_WHITELIST = 'file,http,https,tcp,tls,crypto'
+
+def _input_extension(path: str) -> str:
+    """File extension of a local path or URL (ignoring any query string)"""
+    if is_remote_input(path):
+        path = urlparse(path).path
+    return os.path.splitext(path)[1]
+
 # Legacy functions for compatibility
 async def merge_videos(video_paths: List[str], user_id: int, status_message, output_filename: str = None) -> Optional[str]:
     """Legacy wrapper function for compatibility"""
@@ -425,5 +855,6 @@ async def merge_videos(video_paths: List[str], user_id: int, status_message, out
 # Export main class and functions
 __all__ = [
     'EnhancedMerger',
+    'MergePipeline',
     'merge_videos'
 ]
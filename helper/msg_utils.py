@@ -6,60 +6,30 @@ import time
 from typing import Optional, Dict, Any, List
 from pyrogram import Client
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
-from pyrogram.errors import FloodWait, MessageNotModified, MessageDeleteForbidden
+from pyrogram.errors import FloodWait, MessageDeleteForbidden
 
-from config import Config
+from helpers.status_renderer import status_renderer
 from __init__ import LOGGER
 
 class MessageHandler:
     """Enhanced message handling with smart throttling and error recovery"""
     
-    def __init__(self):
-        self.edit_times: Dict[str, float] = {}
-        self.throttle_delay = Config.EDIT_THROTTLE_SECONDS
-    
     async def safe_edit_message(
         self, 
         message: Message, 
         text: str,
         reply_markup: Optional[InlineKeyboardMarkup] = None,
-        parse_mode: str = "markdown",
         disable_web_page_preview: bool = True
     ) -> bool:
-        """Safely edit message with FloodWait protection"""
+        """
+        Post the edit to the shared status renderer (rate-limited, latest text wins).
+        Never waits out a FloodWait in the caller.
+        """
         if not message or not hasattr(message, 'chat'):
             return False
         
-        message_key = f"{message.chat.id}_{message.id}"
-        current_time = time.time()
-        last_edit = self.edit_times.get(message_key, 0)
-        
-        # Throttle check
-        if (current_time - last_edit) < self.throttle_delay:
-            return False
-        
-        try:
-            await message.edit_text(
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode,
-                disable_web_page_preview=disable_web_page_preview
-            )
-            self.edit_times[message_key] = current_time
-            return True
-            
-        except FloodWait as e:
-            LOGGER.warning(f"FloodWait: sleeping for {e.x} seconds")
-            await asyncio.sleep(e.x)
-            return await self.safe_edit_message(message, text, reply_markup, parse_mode, disable_web_page_preview)
-        
-        except MessageNotModified:
-            # Message content is the same, consider it successful
-            return True
-        
-        except Exception as e:
-            LOGGER.error(f"Failed to edit message: {e}")
-            return False
+        status_renderer.post(message, text, reply_markup, disable_web_page_preview=disable_web_page_preview)
+        return True
     
     async def safe_send_message(
         self,
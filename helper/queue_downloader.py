@@ -0,0 +1,161 @@
+# Enhanced Queue Downloader
+# Downloads a whole merge queue concurrently, in order, behind one combined progress view
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Set, Callable
+from pyrogram import Client
+from config import Config
+from helpers.downloader import EnhancedDownloader
+from helpers.status_renderer import StatusView, status_renderer
+from __init__ import LOGGER
+
+# Downloads running at once across all users, and for any single user
+_global_slots = asyncio.Semaphore(max(1, Config.MAX_CONCURRENT_DOWNLOADS))
+_user_slots: Dict[int, List] = {}  # user -> [semaphore, holders and waiters]
+
+@asynccontextmanager
+async def _user_slot(user_id: int):
+    """One of the user's download slots; the entry is dropped once nobody holds or waits on it"""
+    entry = _user_slots.setdefault(user_id, [asyncio.Semaphore(max(1, Config.USER_CONCURRENT_DOWNLOADS)), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _user_slots.pop(user_id, None)
+
+class _ItemStatus(StatusView):
+    """
+    Stand-in status message handed to the downloader for one queue item.
+    It keeps the item's latest text and redraws the combined view instead of
+    editing Telegram itself.
+    """
+
+    def __init__(self, queue_downloader: 'QueueDownloader'):
+        self.queue_downloader = queue_downloader
+        self.text = "⏳ **Waiting...**"
+
+    def show(self, text: str):
+        self.text = text
+        self.queue_downloader.render()
+
+class QueueDownloader:
+    """
+    Downloads queue items (message ids and URLs) concurrently under a per-user and a
+    global limit. Telegram messages are fetched in one get_messages call and every item
+    shares one EnhancedDownloader (one HTTP session). Results keep queue order; when a
+    required item fails the remaining downloads are cancelled at once.
+    """
+
+    def __init__(self, client: Client, user_id: int, status_message, title: str = "Enhanced Download Phase", downloader: Optional[EnhancedDownloader] = None):
+        self.client = client
+        self.user_id = user_id
+        self.status_message = status_message
+        self.title = title
+        self.downloader = downloader or EnhancedDownloader(user_id)
+        self.remote_sizes = {}  # index -> size of URLs ffmpeg reads in place
+        self.failed = None      # Index of the required item that failed
+        self._items = []        # _ItemStatus per queue item
+        self._results = []
+
+    def render(self):
+        """Post the combined progress of all items to the status renderer"""
+        done = sum(1 for path in self._results if path)
+        lines = [
+            f"📥 **{self.title}**",
+            "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━",
+            f"🔄 **Progress:** {done}/{len(self._items)} done, "
+            f"up to `{min(Config.USER_CONCURRENT_DOWNLOADS, Config.MAX_CONCURRENT_DOWNLOADS)}` at once",
+            ""
+        ]
+        for index, item in enumerate(self._items):
+            item_lines = item.text.splitlines()
+            lines.append(f"**{index + 1}.** {item_lines[0]}")
+            # File name and progress bar of downloads in flight
+            lines.extend(line for line in item_lines[1:3] if line.startswith("➢"))
+        status_renderer.post(self.status_message, "\n".join(lines))
+
+    async def _download(self, index: int, item, message, remote: bool) -> Optional[str]:
+        status = self._items[index]
+        async with _user_slot(self.user_id), _global_slots:
+            if isinstance(item, str):  # Direct URL
+                if remote:
+                    # Range-capable links are read by ffmpeg in place, no local copy
+                    size = await self.downloader.check_remote_input(item)
+                    if size:
+                        self.remote_sizes[index] = size
+                        await status.edit_text("🔗 **Read in place** (range-capable link)")
+                        return item
+                return await self.downloader.download_from_url(item, status)
+
+            if not message or message.empty:
+                await status.edit_text("❌ **Message not found!**")
+                return None
+            return await self.downloader.download_from_telegram(message, status)
+
+    async def download_all(
+        self,
+        items: List,
+        required: Optional[Set[int]] = None,
+        remote: bool = False,
+        on_item: Optional[Callable] = None
+    ) -> Optional[List[Optional[str]]]:
+        """
+        Download every item; returns paths in queue order (None for failed optional
+        items), or None when a required item failed. required defaults to all items.
+        remote lets range-capable URLs stay remote (see remote_sizes).
+        on_item(index, path) runs as each item finishes, in completion order.
+        """
+        required = set(range(len(items))) if required is None else required
+        self._items = [_ItemStatus(self) for _ in items]
+        self._results = [None] * len(items)
+
+        message_ids = [item for item in items if not isinstance(item, str)]
+        messages = {}
+        if message_ids:
+            for message in await self.client.get_messages(chat_id=self.user_id, message_ids=message_ids):
+                messages[message.id] = message
+
+        tasks = {
+            asyncio.create_task(self._download(index, item, messages.get(item) if not isinstance(item, str) else None, remote)): index
+            for index, item in enumerate(items)
+        }
+        self.render()
+
+        pending = set(tasks)
+        try:
+            while pending:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    index = tasks[task]
+                    try:
+                        path = task.result()
+                    except Exception as e:
+                        LOGGER.error(f"Queue item {index + 1} download error for user {self.user_id}: {e}")
+                        self._items[index].text = f"❌ **Download Error:** `{e}`"
+                        path = None
+
+                    if not path and index in required:
+                        self.failed = index
+                        return None
+                    if not path:
+                        LOGGER.warning(f"Optional queue item {index + 1} failed for user {self.user_id}")
+                    self._results[index] = path
+                    if path and on_item:
+                        on_item(index, path)
+                self.render()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return self._results
+
+# Export queue download components
+__all__ = [
+    'QueueDownloader'
+]
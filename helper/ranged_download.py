@@ -0,0 +1,247 @@
+# Enhanced Ranged Download Base
+# Shared parts of the parallel Telegram and segmented HTTP downloaders:
+# preallocated pwrite target, resume sidecar and the retrying worker pool
+
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, Any, Iterable, List, Set
+from __init__ import LOGGER
+
+# Seconds between sidecar writes while pieces complete
+SIDECAR_INTERVAL = 5.0
+
+def to_ranges(indices: Set[int]) -> List[List[int]]:
+    """Compress piece indices into [start, end) runs for the sidecar"""
+    ranges = []
+    for index in sorted(indices):
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+class RangedDownload:
+    """
+    One file downloaded as pieces over several connections at once.
+    Pieces are written with pwrite into a preallocated file on the download's own
+    writer threads, which are drained before the file is closed. Completed pieces
+    are recorded in <path>.json so a failed or interrupted download resumes where
+    it stopped. Subclasses fetch the pieces (_fetch) and describe the sidecar
+    identity, piece sizes and retries.
+    """
+
+    kind = "Ranged"          # Log prefix
+    piece_name = "pieces"    # What a piece is called in logs
+    fatal_errors = ()        # Errors that end the download at once and discard the partial
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        total_pieces: int,
+        connections: int,
+        max_failures: int,
+        progress_callback: Optional[Callable] = None
+    ):
+        self.path = path
+        self.sidecar_path = f"{path}.json"
+        self.size = size
+        self.total_pieces = total_pieces
+        self.connections = max(1, connections)
+        self.max_failures = max_failures
+        self.progress_callback = progress_callback  # async cb(current, total)
+        self.done = set()        # Completed piece indices
+        self.resumed_bytes = 0   # Bytes already on disk when this run started
+        self.fetched_bytes = 0   # Bytes downloaded by this run
+        self.failures = 0
+        self._last_sidecar = 0.0
+        self._writer = None
+
+    @property
+    def downloaded(self) -> int:
+        return self.resumed_bytes + self.fetched_bytes
+
+    @property
+    def label(self) -> str:
+        """Short name of the download for logs"""
+        return os.path.basename(self.path)
+
+    # ===== SUBCLASS HOOKS =====
+
+    def _sidecar_state(self) -> Dict[str, Any]:
+        """Fields that must match for the sidecar's pieces to be trusted"""
+        raise NotImplementedError
+
+    def _can_resume(self) -> bool:
+        return True
+
+    def _piece_length(self, index: int) -> int:
+        raise NotImplementedError
+
+    def _pending_items(self) -> Iterable:
+        """Work items for the pieces not on disk yet"""
+        raise NotImplementedError
+
+    async def _fetch(self, fd: int, item):
+        raise NotImplementedError
+
+    def _retry_item(self, item):
+        """Work item to queue again after item failed, or None when nothing is missing"""
+        return item
+
+    def _describe(self, item) -> str:
+        return f"{self.kind} piece {item}"
+
+    # ===== SIDECAR =====
+
+    def _load_sidecar(self):
+        try:
+            if not self._can_resume() or not os.path.exists(self.path) or not os.path.exists(self.sidecar_path):
+                return
+            with open(self.sidecar_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if any(state.get(key) != value for key, value in self._sidecar_state().items()):
+                return
+            for start, end in state.get('done', []):
+                self.done.update(range(start, end))
+            if not self.done:
+                return
+            self.resumed_bytes = sum(self._piece_length(i) for i in self.done)
+            LOGGER.info(
+                f"Resuming {self.kind} download {self.label}: "
+                f"{len(self.done)}/{self.total_pieces} {self.piece_name} on disk"
+            )
+        except Exception as e:
+            LOGGER.warning(f"Ignoring unreadable download sidecar {self.sidecar_path}: {e}")
+            self.done.clear()
+
+    def _save_sidecar(self):
+        state = dict(self._sidecar_state(), done=to_ranges(self.done))
+        temp_path = f"{self.sidecar_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.sidecar_path)
+        self._last_sidecar = time.time()
+
+    def _discard(self):
+        for path in (self.path, self.sidecar_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ===== PIECES =====
+
+    def _preallocate(self) -> int:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size != self.size:
+            try:
+                os.posix_fallocate(fd, 0, self.size)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, self.size)
+        return fd
+
+    async def _write(self, fd: int, data: bytes, offset: int):
+        """pwrite off the event loop; awaiting it also paces the connection to the disk"""
+        await asyncio.get_running_loop().run_in_executor(self._writer, os.pwrite, fd, data, offset)
+
+    def _close(self, fd: int):
+        """
+        Close fd once no pwrite can still use it. Cancelling a worker does not stop a
+        pwrite already running on a writer thread, and a late write to a closed (or
+        reused) fd number would land in another file.
+        """
+        self._writer.shutdown(wait=True, cancel_futures=True)
+        os.close(fd)
+
+    def _piece_done(self, index: int):
+        self.done.add(index)
+        if time.time() - self._last_sidecar >= SIDECAR_INTERVAL:
+            self._save_sidecar()
+
+    async def _report_progress(self):
+        if self.progress_callback:
+            try:
+                await self.progress_callback(self.downloaded, self.size)
+            except Exception as e:
+                LOGGER.warning(f"Download progress callback error: {e}")
+
+    async def _worker(self, fd: int, queue: asyncio.Queue):
+        while not queue.empty():
+            item = queue.get_nowait()
+            try:
+                await self._fetch(fd, item)
+            except asyncio.CancelledError:
+                raise
+            except self.fatal_errors:
+                raise
+            except Exception as e:
+                self.failures += 1
+                LOGGER.warning(f"{self._describe(item)} failed ({self.failures}/{self.max_failures}): {e}")
+                if self.failures >= self.max_failures:
+                    raise
+                retry = self._retry_item(item)
+                if retry is not None:
+                    await asyncio.sleep(min(30, 2 ** self.failures))
+                    queue.put_nowait(retry)
+
+    async def run(self) -> bool:
+        """
+        Download (or finish downloading) the file to self.path; True on success.
+        fatal_errors are raised with the partial file removed.
+        """
+        self._load_sidecar()
+        queue = asyncio.Queue()
+        for item in self._pending_items():
+            queue.put_nowait(item)
+
+        fd = self._preallocate()
+        self._writer = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="ranged-writer")
+        start_time = time.time()
+        try:
+            workers = [
+                asyncio.create_task(self._worker(fd, queue))
+                for _ in range(min(self.connections, queue.qsize()))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+            os.fsync(fd)
+        except self.fatal_errors:
+            self._close(fd)
+            self._discard()
+            raise
+        except Exception as e:
+            self._close(fd)
+            self._save_sidecar()
+            LOGGER.error(f"{self.kind} download failed for {self.label}: {e}")
+            return False
+        except BaseException:
+            self._close(fd)
+            self._save_sidecar()
+            raise
+
+        self._close(fd)
+        if os.path.exists(self.sidecar_path):
+            os.remove(self.sidecar_path)
+
+        elapsed = time.time() - start_time
+        speed = self.fetched_bytes / elapsed if elapsed > 0 else 0
+        LOGGER.info(
+            f"{self.kind} download done: {self.label} "
+            f"({self.connections} connections, {speed / (1024 * 1024):.1f} MiB/s"
+            f"{f', {self.resumed_bytes} bytes resumed' if self.resumed_bytes else ''})"
+        )
+        return True
+
+# Export ranged download components
+__all__ = [
+    'RangedDownload',
+    'to_ranges',
+    'SIDECAR_INTERVAL'
+]
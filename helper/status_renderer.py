@@ -0,0 +1,240 @@
+# Enhanced Status Renderer
+# One background editor for every status message: latest text wins, edits are rate-budgeted
+
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+from pyrogram.errors import FloodWait, MessageNotModified
+from config import Config
+from __init__ import LOGGER
+
+# Sent texts remembered for change detection, and idle chat buckets kept
+MAX_TRACKED_MESSAGES = 2000
+CHAT_IDLE_SECONDS = 3600
+
+# Set inside the renderer's own edit tasks, so edited() can tell them from direct edits
+_rendering = contextvars.ContextVar('status_rendering', default=False)
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to capacity banked"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 when one is)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1  # May go negative for edits made outside the renderer
+
+class StatusView:
+    """
+    Stand-in status object that renders into something else (e.g. one row of a
+    combined view). Posts to it are applied directly instead of being rate-limited.
+    """
+
+    def show(self, text: str):
+        raise NotImplementedError
+
+    async def edit_text(self, text: str, **kwargs):
+        self.show(text)
+
+class StatusRenderer:
+    """
+    Producers post() the newest text for a status message and return immediately.
+    A background task keeps only the latest text per message and edits it when the
+    global and per-chat token buckets allow, skipping texts identical to what the
+    message already shows. FloodWait pauses that chat instead of sleeping in a job.
+
+    Direct edits made elsewhere (message.edit_text, callback edits) are reported
+    through edited(): they charge the buckets and drop any older pending text, so a
+    late progress update never overwrites a final result.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: int):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chats: Dict[int, TokenBucket] = {}
+        self._blocked: Dict[int, float] = {}    # chat -> monotonic time FloodWait ends
+        self._pending: "OrderedDict[Tuple[int, Any], Dict[str, Any]]" = OrderedDict()
+        self._sent: "OrderedDict[Tuple[int, Any], str]" = OrderedDict()
+        self._sending = set()                   # Message keys with an edit in flight
+        self._tasks = set()
+        self._wakeup = None
+        self._worker = None
+        self.posted = 0
+        self.edits = 0
+        self.coalesced = 0
+        self.unchanged = 0
+        self.flood_waits = 0
+
+    @staticmethod
+    def _key(message) -> Tuple[int, Any]:
+        return (message.chat.id, message.id)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _remember(self, key, text: str):
+        self._sent[key] = text
+        self._sent.move_to_end(key)
+        while len(self._sent) > MAX_TRACKED_MESSAGES:
+            self._sent.popitem(last=False)
+
+    def post(self, message, text: str, reply_markup=None, **options):
+        """Queue the newest text for message (options go to edit_text); never blocks or raises"""
+        if isinstance(message, StatusView):
+            message.show(text)
+            return
+        if not message or not hasattr(message, 'chat') or not text:
+            return
+        key = self._key(message)
+        self.posted += 1
+        if key in self._pending:
+            self.coalesced += 1
+        elif self._sent.get(key) == text and reply_markup is None:
+            self.unchanged += 1
+            return
+
+        self._pending[key] = {'message': message, 'text': text, 'reply_markup': reply_markup, 'options': options}
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def edited(self, chat_id: int, message_id, text: Optional[str]):
+        """A message was edited directly; older pending text for it is now stale"""
+        if _rendering.get():
+            return  # Our own edit
+        key = (chat_id, message_id)
+        self._pending.pop(key, None)
+        if text:
+            self._remember(key, text)
+        now = time.monotonic()
+        self.global_bucket.take(now)
+        self._chat_bucket(chat_id).take(now)
+
+    def _next_ready(self, now: float) -> Tuple[Optional[Tuple[int, Any]], float]:
+        """Oldest pending message that may be edited now, else the shortest wait"""
+        wait = 1.0
+        for key in self._pending:
+            if key in self._sending:
+                continue
+            chat_id = key[0]
+            blocked = self._blocked.get(chat_id, 0) - now
+            if blocked > 0:
+                wait = min(wait, blocked)
+                continue
+            chat_wait = self._chat_bucket(chat_id).wait_time(now)
+            if chat_wait > 0:
+                wait = min(wait, chat_wait)
+                continue
+            return key, 0.0
+        return None, wait
+
+    def _prune(self, now: float):
+        for chat_id, bucket in list(self._chats.items()):
+            if now - bucket.updated > CHAT_IDLE_SECONDS and not any(key[0] == chat_id for key in self._pending):
+                del self._chats[chat_id]
+        for chat_id, until in list(self._blocked.items()):
+            if until < now:
+                del self._blocked[chat_id]
+
+    async def _run(self):
+        last_prune = time.monotonic()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            if now - last_prune > 60:
+                self._prune(now)
+                last_prune = now
+
+            global_wait = self.global_bucket.wait_time(now)
+            key, wait = self._next_ready(now) if global_wait == 0 else (None, global_wait)
+            if key is None:
+                # asyncio.wait, not wait_for: wait_for can swallow a cancel that races the wakeup
+                self._wakeup.clear()
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=wait)
+                finally:
+                    waiter.cancel()
+                continue
+
+            entry = self._pending.pop(key)
+            self.global_bucket.take(now)
+            self._chat_bucket(key[0]).take(now)
+            self._sending.add(key)
+            task = asyncio.create_task(self._send(key, entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key, entry: Dict[str, Any]):
+        _rendering.set(True)  # Task-local
+        try:
+            await entry['message'].edit_text(entry['text'], reply_markup=entry['reply_markup'], **entry['options'])
+            self.edits += 1
+            self._remember(key, entry['text'])
+        except MessageNotModified:
+            self._remember(key, entry['text'])
+        except FloodWait as e:
+            self.flood_waits += 1
+            LOGGER.warning(f"FloodWait on chat {key[0]}: status edits paused for {e.value}s")
+            self._blocked[key[0]] = time.monotonic() + e.value
+            self._pending.setdefault(key, entry)  # Unless a newer text arrived meanwhile
+        except Exception as e:
+            LOGGER.warning(f"Failed to edit status message: {e}")
+        finally:
+            self._sending.discard(key)
+            if self._wakeup:
+                self._wakeup.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'posted': self.posted,
+            'edits': self.edits,
+            'coalesced': self.coalesced,
+            'unchanged': self.unchanged,
+            'pending': len(self._pending),
+            'flood_waits': self.flood_waits
+        }
+
+# Global status renderer
+status_renderer = StatusRenderer(
+    Config.STATUS_EDITS_PER_SECOND,
+    Config.STATUS_CHAT_EDITS_PER_MINUTE / 60,
+    Config.STATUS_CHAT_BURST
+)
+
+async def smart_progress_editor(status_message, text: str, reply_markup=None):
+    """Post a status text to the renderer (kept as an awaitable for existing callers)"""
+    status_renderer.post(status_message, text, reply_markup)
+
+# Export renderer components
+__all__ = [
+    'StatusRenderer',
+    'StatusView',
+    'TokenBucket',
+    'status_renderer',
+    'smart_progress_editor'
+]
@@ -0,0 +1,90 @@
+# Enhanced Parallel Telegram Downloader
+# Fetches chunk ranges over several media-DC sessions at once and resumes from a sidecar
+
+import math
+from typing import Optional, Callable, List, Tuple
+from pyrogram import Client
+from pyrogram.types import Message
+from helpers.ranged_download import RangedDownload
+
+# stream_media offsets and limits count Telegram's 1 MiB GetFile chunks
+CHUNK_SIZE = 1024 * 1024
+
+# Chunks fetched per stream_media call; every call opens its own media session
+RANGE_CHUNKS = 64
+
+# Failed ranges are retried this many times in total before the download gives up
+MAX_RANGE_FAILURES = 8
+
+class ParallelTelegramDownload(RangedDownload):
+    """
+    One Telegram file downloaded as parallel chunk ranges.
+    Chunks are written with pwrite into a preallocated file, and completed chunks are
+    recorded in <path>.json so a failed or interrupted download resumes where it stopped.
+    """
+
+    kind = "Parallel Telegram"
+    piece_name = "chunks"
+
+    def __init__(
+        self,
+        client: Client,
+        message: Message,
+        path: str,
+        connections: int,
+        progress_callback: Optional[Callable] = None
+    ):
+        self.client = client
+        self.message = message
+        self.media = message.video or message.document or message.audio
+        size = self.media.file_size
+        super().__init__(
+            path, size, math.ceil(size / CHUNK_SIZE), connections, MAX_RANGE_FAILURES, progress_callback
+        )
+
+    def _sidecar_state(self):
+        return {'file_unique_id': self.media.file_unique_id, 'size': self.size}
+
+    def _piece_length(self, index: int) -> int:
+        return min(CHUNK_SIZE, self.size - index * CHUNK_SIZE)
+
+    def _pending_items(self) -> List[Tuple[int, int]]:
+        """Missing chunks as (offset, limit) runs of at most RANGE_CHUNKS"""
+        ranges = []
+        start = None
+        for index in range(self.total_pieces + 1):
+            missing = index < self.total_pieces and index not in self.done
+            if missing and start is None:
+                start = index
+            if start is not None and (not missing or index - start == RANGE_CHUNKS):
+                ranges.append((start, index - start))
+                start = index if missing else None
+        return ranges
+
+    def _describe(self, item) -> str:
+        return f"Telegram range {item[0]}+{item[1]}"
+
+    def _retry_item(self, item):
+        # Only the chunks that did not arrive are fetched again
+        offset, limit = item
+        remaining = [i for i in range(offset, offset + limit) if i not in self.done]
+        return (remaining[0], remaining[-1] - remaining[0] + 1) if remaining else None
+
+    async def _fetch(self, fd: int, item):
+        offset, limit = item
+        index = offset
+        async for chunk in self.client.stream_media(self.message, limit=limit, offset=offset):
+            await self._write(fd, chunk, index * CHUNK_SIZE)
+            self.fetched_bytes += len(chunk)
+            self._piece_done(index)
+            index += 1
+            await self._report_progress()
+
+        if index < offset + limit:
+            raise IOError(f"range {offset}+{limit} ended early at chunk {index}")
+
+# Export parallel download components
+__all__ = [
+    'ParallelTelegramDownload',
+    'CHUNK_SIZE'
+]
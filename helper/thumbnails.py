@@ -0,0 +1,204 @@
+# Enhanced Thumbnail Module
+# Keyframe-seek thumbnails and preview contact sheets, cached by source content
+
+import os
+import time
+import asyncio
+import hashlib
+from typing import Optional, Dict, Tuple
+from config import Config
+from helpers.ffmpeg_runner import run_ffmpeg
+from helpers.ffmpeg_scheduler import ffmpeg_scheduler
+from helpers.media_probe import MediaInfo, media_probe
+from __init__ import LOGGER, cache
+
+# Bytes hashed from the start, middle and end of a file for its content key
+SAMPLE_BYTES = 1024 * 1024
+
+# Images handed out this recently are never pruned (an upload may still be reading them)
+PRUNE_GRACE_SECONDS = 600
+
+def content_key(path: str) -> str:
+    """
+    Cheap content hash: size plus three 1 MiB samples.
+    The same merged file yields the same key whatever its name or path.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        for offset in (0, max(0, size // 2 - SAMPLE_BYTES // 2), max(0, size - SAMPLE_BYTES)):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()[:20]
+
+class ThumbnailCache:
+    """
+    JPEG thumbnails and contact sheets in THUMBNAIL_CACHE_DIR, named by content key.
+    Telegram, the log channel and upload retries all get the same file; concurrent
+    requests for the same image share one ffmpeg run. Oldest files are pruned.
+    """
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max(1, max_files)
+        self._keys = cache.namespace('thumbnails', ttl=24 * 3600)  # (path, size, mtime_ns) -> content key
+        self._inflight = {}  # output path -> asyncio.Task
+        self.hits = 0
+        self.generated = 0
+
+    async def _content_key(self, path: str) -> str:
+        stat = os.stat(path)
+        file_id = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        # Concurrent thumbnail and contact sheet requests hash the file once
+        return await self._keys.get_or_compute(
+            file_id, lambda: asyncio.get_running_loop().run_in_executor(None, content_key, path)
+        )
+
+    async def _cached_or_build(self, output_path: str, build) -> Optional[str]:
+        if os.path.exists(output_path):
+            self.hits += 1
+            os.utime(output_path)  # Recently used: kept by _prune
+            return output_path
+
+        task = self._inflight.get(output_path)
+        if not task:
+            task = asyncio.create_task(self._build(output_path, build))
+            self._inflight[output_path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(output_path, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, output_path: str, build) -> Optional[str]:
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{output_path}.tmp.jpg"
+        try:
+            if not await build(temp_path) or not os.path.exists(temp_path):
+                return None
+            os.replace(temp_path, output_path)
+            self.generated += 1
+            self._prune()
+            return output_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _prune(self):
+        try:
+            files = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory) if name.endswith('.jpg')
+            ]
+            if len(files) <= self.max_files:
+                return
+            files.sort(key=os.path.getmtime)
+            recent = time.time() - PRUNE_GRACE_SECONDS
+            for path in files[:len(files) - self.max_files]:
+                if os.path.getmtime(path) < recent:
+                    os.remove(path)
+        except OSError as e:
+            LOGGER.warning(f"Thumbnail cache prune failed: {e}")
+
+    async def thumbnail(
+        self,
+        video_path: str,
+        media_info: Optional[MediaInfo] = None,
+        size: Optional[Tuple[int, int]] = None
+    ) -> Optional[str]:
+        """Frame from the middle of the video (scaled to size=(w, h) if given)"""
+        try:
+            key = await self._content_key(video_path)
+            suffix = f"_{size[0]}x{size[1]}" if size else ""
+            output_path = os.path.join(self.directory, f"{key}{suffix}.jpg")
+
+            async def build(temp_path: str) -> bool:
+                info = media_info or await media_probe.probe(video_path, quick=True)
+                timestamp = info.duration / 2 if info.duration > 0 else 0
+
+                # -ss before -i: seek to the nearest keyframe instead of decoding up to it
+                cmd = [
+                    'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                    '-ss', f"{timestamp:.3f}", '-i', video_path,
+                    '-frames:v', '1', '-q:v', '2'
+                ]
+                if size:
+                    cmd += ['-vf', f"scale={size[0]}:{size[1]}"]
+                cmd += ['-f', 'image2', '-y', temp_path]
+
+                async with ffmpeg_scheduler.probe():
+                    process = await asyncio.create_subprocess_exec(
+                        *ffmpeg_scheduler.prepare_command(cmd, threads=False),
+                        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+                    )
+                    try:
+                        _, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
+                    except asyncio.TimeoutError:
+                        process.kill()
+                        await process.wait()
+                        raise
+
+                if process.returncode != 0:
+                    LOGGER.warning(f"Failed to create thumbnail: {stderr.decode().strip()}")
+                return process.returncode == 0
+
+            return await self._cached_or_build(output_path, build)
+
+        except asyncio.TimeoutError:
+            LOGGER.error(f"Thumbnail timeout for {video_path}")
+            return None
+        except Exception as e:
+            LOGGER.error(f"Thumbnail creation error: {e}")
+            return None
+
+    async def contact_sheet(
+        self,
+        video_path: str,
+        columns: int = 4,
+        rows: int = 4,
+        tile_width: int = 320,
+        media_info: Optional[MediaInfo] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Preview grid of columns x rows frames spread over the video, built in a
+        single decode that only looks at keyframes
+        """
+        try:
+            key = await self._content_key(video_path)
+            output_path = os.path.join(self.directory, f"{key}_sheet{columns}x{rows}.jpg")
+
+            async def build(temp_path: str) -> bool:
+                info = media_info or await media_probe.probe(video_path, quick=True)
+                if info.duration <= 0:
+                    return False
+                interval = info.duration / (columns * rows)
+
+                cmd = [
+                    'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                    '-skip_frame', 'nokey', '-i', video_path,
+                    '-vf', (
+                        f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval:.3f})',"
+                        f"scale={tile_width}:-2,tile={columns}x{rows}"
+                    ),
+                    '-fps_mode', 'vfr', '-frames:v', '1', '-q:v', '3',
+                    '-f', 'image2', '-y', temp_path
+                ]
+                result = await run_ffmpeg(cmd, info.duration, "Contact sheet", user_id=user_id)
+                return result.success
+
+            return await self._cached_or_build(output_path, build)
+
+        except Exception as e:
+            LOGGER.error(f"Contact sheet error: {e}")
+            return None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'generated': self.generated}
+
+# Global thumbnail cache
+thumbnail_cache = ThumbnailCache(Config.THUMBNAIL_CACHE_DIR, Config.THUMBNAIL_CACHE_SIZE)
+
+# Export thumbnail components
+__all__ = [
+    'ThumbnailCache',
+    'thumbnail_cache',
+    'content_key'
+]
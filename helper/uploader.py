@@ -10,30 +10,15 @@ from aiohttp import FormData
 from random import choice
 from pyrogram import Client
 from pyrogram.types import Message, CallbackQuery
+from pyrogram.errors import FloodWait
 from config import Config
 from helpers.utils import get_readable_file_size, format_progress_time
+from helpers.media_probe import MediaInfo, media_probe
+from helpers.thumbnails import thumbnail_cache
+from helpers.http_pool import http_pool
+from helpers.status_renderer import smart_progress_editor
 from __init__ import LOGGER
 
-# Smart progress tracking
-last_edit_time = {}
-EDIT_THROTTLE_SECONDS = 4.0
-
-async def smart_progress_editor(status_message, text: str):
-    """Enhanced progress editor with FloodWait prevention"""
-    if not status_message or not hasattr(status_message, 'chat'):
-        return
-        
-    message_key = f"{status_message.chat.id}_{status_message.id}"
-    now = time.time()
-    last_time = last_edit_time.get(message_key, 0)
-    
-    if (now - last_time) > EDIT_THROTTLE_SECONDS:
-        try:
-            await status_message.edit_text(text)
-            last_edit_time[message_key] = now
-        except Exception as e:
-            LOGGER.warning(f"Failed to edit progress message: {e}")
-
 class GoFileUploader:
     """Enhanced GoFile uploader from new repo with improved error handling"""
     
@@ -44,16 +29,16 @@ class GoFileUploader:
     async def _get_server(self) -> str:
         """Get available GoFile server"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}servers") as resp:
-                    resp.raise_for_status()
-                    result = await resp.json()
-                    
-                    if result.get("status") == "ok":
-                        servers = result["data"]["servers"]
-                        return choice(servers)["name"]
-                    
-                    raise Exception(f"Failed to get server: {result}")
+            session = await http_pool.session()
+            async with session.get(f"{self.api_url}servers") as resp:
+                resp.raise_for_status()
+                result = await resp.json()
+                
+                if result.get("status") == "ok":
+                    servers = result["data"]["servers"]
+                    return choice(servers)["name"]
+                
+                raise Exception(f"Failed to get server: {result}")
         except Exception as e:
             LOGGER.error(f"Failed to get GoFile server: {e}")
             raise Exception("Failed to fetch GoFile upload server.")
@@ -80,40 +65,41 @@ class GoFileUploader:
             with open(file_path, "rb") as f:
                 data.add_field("file", f, filename=filename)
                 
-                async with aiohttp.ClientSession() as session:
-                    start_time = time.time()
-                    
-                    if status_message:
-                        await smart_progress_editor(
-                            status_message, 
-                            f"🔗 **Uploading to GoFile.io...**\n"
-                            f"➢ `{filename}`\n"
-                            f"➢ **Size:** `{get_readable_file_size(file_size)}`"
-                        )
+                session = await http_pool.session()
+                start_time = time.time()
+                
+                if status_message:
+                    await smart_progress_editor(
+                        status_message, 
+                        f"🔗 **Uploading to GoFile.io...**\n"
+                        f"➢ `{filename}`\n"
+                        f"➢ **Size:** `{get_readable_file_size(file_size)}`"
+                    )
+                
+                # GoFile may take a while to answer once the body is sent
+                async with session.post(upload_url, data=data, timeout=aiohttp.ClientTimeout(sock_connect=30, sock_read=600)) as resp:
+                    resp.raise_for_status()
+                    resp_json = await resp.json()
                     
-                    async with session.post(upload_url, data=data) as resp:
-                        resp.raise_for_status()
-                        resp_json = await resp.json()
+                    if resp_json.get("status") == "ok":
+                        download_page = resp_json["data"]["downloadPage"]
+                        
+                        if status_message:
+                            elapsed_time = time.time() - start_time
+                            await smart_progress_editor(
+                                status_message,
+                                f"✅ **GoFile Upload Complete!**\n"
+                                f"➢ **File:** `{filename}`\n"
+                                f"➢ **Size:** `{get_readable_file_size(file_size)}`\n"
+                                f"➢ **Time:** `{format_progress_time(int(elapsed_time))}`\n"
+                                f"➢ **Link:** {download_page}"
+                            )
+                        
+                        LOGGER.info(f"Successfully uploaded to GoFile: {filename}")
+                        return download_page
+                    else:
+                        raise Exception(f"GoFile upload failed: {resp_json.get('status')}")
                         
-                        if resp_json.get("status") == "ok":
-                            download_page = resp_json["data"]["downloadPage"]
-                            
-                            if status_message:
-                                elapsed_time = time.time() - start_time
-                                await smart_progress_editor(
-                                    status_message,
-                                    f"✅ **GoFile Upload Complete!**\n"
-                                    f"➢ **File:** `{filename}`\n"
-                                    f"➢ **Size:** `{get_readable_file_size(file_size)}`\n"
-                                    f"➢ **Time:** `{format_progress_time(int(elapsed_time))}`\n"
-                                    f"➢ **Link:** {download_page}"
-                                )
-                            
-                            LOGGER.info(f"Successfully uploaded to GoFile: {filename}")
-                            return download_page
-                        else:
-                            raise Exception(f"GoFile upload failed: {resp_json.get('status')}")
-                            
         except Exception as e:
             error_msg = f"Failed to upload to GoFile: {str(e)}"
             LOGGER.error(error_msg)
@@ -121,46 +107,30 @@ class GoFileUploader:
                 await status_message.edit_text(f"❌ **GoFile Upload Failed!**\nError: `{str(e)}`")
             raise Exception(error_msg)
 
+# Log-channel copies in flight (referenced so they are not garbage collected mid-run)
+_log_copy_tasks = set()
+
 class EnhancedTelegramUploader:
     """Enhanced Telegram uploader combining old repo features with new repo efficiency"""
     
     def __init__(self, client: Client):
         self.client = client
         self.userBot = None  # Premium user bot for large files
+        self.sent_message = None  # Last uploaded message (its file_id can be re-sent without uploading)
     
-    async def create_thumbnail(self, video_path: str, custom_thumbnail: str = None) -> Optional[str]:
+    async def create_thumbnail(
+        self,
+        video_path: str,
+        custom_thumbnail: str = None,
+        media_info: Optional[MediaInfo] = None
+    ) -> Optional[str]:
         """Create or use custom thumbnail"""
         try:
             if custom_thumbnail and os.path.exists(custom_thumbnail):
                 return custom_thumbnail
             
-            # Generate default thumbnail from video middle
-            thumbnail_path = f"{os.path.splitext(video_path)[0]}.jpg"
-            
-            # Get video duration first
-            import ffmpeg
-            probe = ffmpeg.probe(video_path)
-            duration = float(probe['format']['duration'])
-            thumbnail_time = duration / 2
-            
-            # Create thumbnail
-            command = [
-                'ffmpeg', '-hide_banner', '-loglevel', 'error',
-                '-i', video_path, '-ss', str(thumbnail_time),
-                '-vframes', '1', '-c:v', 'mjpeg', '-f', 'image2',
-                '-y', thumbnail_path
-            ]
-            
-            process = await asyncio.create_subprocess_exec(
-                *command, stderr=asyncio.subprocess.PIPE
-            )
-            _, stderr = await process.communicate()
-            
-            if process.returncode == 0 and os.path.exists(thumbnail_path):
-                return thumbnail_path
-            else:
-                LOGGER.warning(f"Failed to create thumbnail: {stderr.decode().strip()}")
-                return None
+            # Default thumbnail from the video middle, shared through the content-hash cache
+            return await thumbnail_cache.thumbnail(video_path, media_info)
                 
         except Exception as e:
             LOGGER.error(f"Thumbnail creation error: {e}")
@@ -174,10 +144,12 @@ class EnhancedTelegramUploader:
         custom_thumbnail: str = None,
         custom_filename: str = None,
         upload_as_document: bool = False,
-        caption: str = None
+        caption: str = None,
+        media_info: Optional[MediaInfo] = None
     ) -> bool:
         """
         Upload file to Telegram with enhanced features from old repo
+        media_info (from the merge step) saves probing the file again
         """
         try:
             file_size = os.path.getsize(file_path)
@@ -195,26 +167,20 @@ class EnhancedTelegramUploader:
                 )
                 return False
             
+            # One probe serves both the thumbnail and the video metadata
+            media_info = media_info or await media_probe.probe(file_path, quick=True)
+            
             # Create thumbnail
-            thumbnail_path = await self.create_thumbnail(file_path, custom_thumbnail)
+            thumbnail_path = await self.create_thumbnail(file_path, custom_thumbnail, media_info)
             
             # Get video properties for metadata
             video_metadata = {}
-            try:
-                import ffmpeg
-                probe = ffmpeg.probe(file_path)
-                video_stream = next(
-                    (stream for stream in probe['streams'] if stream['codec_type'] == 'video'), 
-                    None
-                )
-                if video_stream:
-                    video_metadata = {
-                        'duration': int(float(probe['format'].get('duration', 0))),
-                        'width': int(video_stream.get('width', 0)),
-                        'height': int(video_stream.get('height', 0))
-                    }
-            except:
-                pass
+            if media_info.video:
+                video_metadata = {
+                    'duration': int(media_info.duration),
+                    'width': media_info.width,
+                    'height': media_info.height
+                }
             
             # Default caption
             if not caption:
@@ -245,7 +211,7 @@ class EnhancedTelegramUploader:
             # Choose upload method
             if upload_as_document or not video_metadata:
                 # Upload as document
-                await self.client.send_document(
+                self.sent_message = await self.client.send_document(
                     chat_id=chat_id,
                     document=file_path,
                     caption=caption,
@@ -255,7 +221,7 @@ class EnhancedTelegramUploader:
                 )
             else:
                 # Upload as video
-                await self.client.send_video(
+                self.sent_message = await self.client.send_video(
                     chat_id=chat_id,
                     video=file_path,
                     caption=caption,
@@ -267,39 +233,18 @@ class EnhancedTelegramUploader:
                     progress=progress_callback
                 )
             
-            # Clean up thumbnail if it was generated
-            if thumbnail_path and thumbnail_path != custom_thumbnail and os.path.exists(thumbnail_path):
-                os.remove(thumbnail_path)
-            
             # Delete status message after successful upload
             try:
                 await status_message.delete()
             except:
                 pass
             
-            # Copy to log channel if configured
-            if hasattr(Config, 'LOGCHANNEL') and Config.LOGCHANNEL:
-                try:
-                    log_caption = f"{caption}\n\n**Uploaded by:** User ID `{chat_id}`"
-                    if upload_as_document:
-                        await self.client.send_document(
-                            chat_id=int(Config.LOGCHANNEL),
-                            document=file_path,
-                            caption=log_caption,
-                            file_name=filename
-                        )
-                    else:
-                        await self.client.send_video(
-                            chat_id=int(Config.LOGCHANNEL),
-                            video=file_path,
-                            caption=log_caption,
-                            file_name=filename,
-                            duration=video_metadata.get('duration', 0),
-                            width=video_metadata.get('width', 0),
-                            height=video_metadata.get('height', 0)
-                        )
-                except Exception as e:
-                    LOGGER.error(f"Failed to copy to log channel: {e}")
+            # Copy to log channel if configured (server-side copy, nothing is uploaded again)
+            if hasattr(Config, 'LOGCHANNEL') and Config.LOGCHANNEL and self.sent_message:
+                log_caption = f"{caption}\n\n**Uploaded by:** User ID `{chat_id}`"
+                task = asyncio.create_task(self._copy_to_log_channel(self.sent_message, log_caption))
+                _log_copy_tasks.add(task)
+                task.add_done_callback(_log_copy_tasks.discard)
             
             LOGGER.info(f"Successfully uploaded to Telegram: {filename}")
             return True
@@ -313,6 +258,31 @@ class EnhancedTelegramUploader:
             LOGGER.error(f"Telegram upload error: {e}")
             return False
     
+    async def _copy_to_log_channel(self, message: Message, caption: str):
+        """Copy an uploaded message into LOGCHANNEL by reference (runs in the background)"""
+        attempts = 3
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.client.copy_message(
+                    chat_id=int(Config.LOGCHANNEL),
+                    from_chat_id=message.chat.id,
+                    message_id=message.id,
+                    caption=caption
+                )
+                return
+            except FloodWait as e:
+                if attempt == attempts:
+                    LOGGER.error(
+                        f"Log channel copy of message {message.id} dropped: "
+                        f"still FloodWait ({e.value}s) after {attempts} attempts"
+                    )
+                    return
+                LOGGER.warning(f"Log channel copy FloodWait: sleeping for {e.value} seconds")
+                await asyncio.sleep(e.value + 1)
+            except Exception as e:
+                LOGGER.error(f"Failed to copy to log channel: {e}")
+                return
+    
     def _get_progress_bar(self, progress: float, length: int = 20) -> str:
         """Generate progress bar matching old repo style"""
         filled_len = int(length * progress)
@@ -225,63 +225,11 @@ def sanitize_filename(filename: str) -> str:
 def get_video_info(file_path: str) -> Dict[str, Any]:
     """
     Get video information using ffprobe
-    Enhanced version with error handling
+    Blocking; shares the probe cache with helpers.media_probe (async code should await media_probe.probe)
     """
-    try:
-        import subprocess
-        import json
-        
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_format', '-show_streams', file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            info = json.loads(result.stdout)
-            
-            # Extract relevant information
-            video_info = {
-                'duration': 0,
-                'width': 0,
-                'height': 0,
-                'video_codec': 'unknown',
-                'audio_codec': 'unknown',
-                'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else 0,
-                'bitrate': 0
-            }
-            
-            # Get format information
-            if 'format' in info:
-                format_info = info['format']
-                video_info['duration'] = int(float(format_info.get('duration', 0)))
-                video_info['bitrate'] = int(format_info.get('bit_rate', 0))
-            
-            # Get stream information
-            for stream in info.get('streams', []):
-                if stream['codec_type'] == 'video':
-                    video_info['width'] = stream.get('width', 0)
-                    video_info['height'] = stream.get('height', 0)
-                    video_info['video_codec'] = stream.get('codec_name', 'unknown')
-                elif stream['codec_type'] == 'audio':
-                    video_info['audio_codec'] = stream.get('codec_name', 'unknown')
-            
-            return video_info
-    
-    except Exception as e:
-        LOGGER.error(f"Failed to get video info for {file_path}: {e}")
-    
-    # Return default info on error
-    return {
-        'duration': 0,
-        'width': 0,
-        'height': 0,
-        'video_codec': 'unknown',
-        'audio_codec': 'unknown',
-        'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else 0,
-        'bitrate': 0
-    }
+    # Imported here: the probe service depends on modules that import utils
+    from helpers.media_probe import media_probe
+    return media_probe.probe_sync(file_path).to_video_info()
 
 def get_progress_bar(progress: float, length: int = 20, filled_char: str = None, empty_char: str = None) -> str:
     """
@@ -371,9 +319,10 @@ def validate_video_file(file_path: str) -> bool:
         if ext not in Config.VIDEO_EXTENSIONS:
             return False
         
-        # Try to get video info
-        info = get_video_info(file_path)
-        if info['duration'] > 0 and info['width'] > 0 and info['height'] > 0:
+        # Header metadata is enough here (usually parsed in-process, no ffprobe)
+        from helpers.media_probe import media_probe
+        info = media_probe.probe_sync(file_path, quick=True)
+        if info.duration > 0 and info.width > 0 and info.height > 0:
             return True
         
         return False
@@ -4,7 +4,11 @@
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, Message
 from config import Config
-from helpers.utils import UserSettings
+from helpers.utils import UserSettings, get_progress_bar
+from helpers.encoder_calibration import encoder_calibrator, get_encoder_profile
+from helpers.media_probe import benchmark_backends
+from helpers.http_downloader import benchmark_segmented
+from helpers.disk_writer import benchmark_disk_writes
 from __init__ import LOGGER, queueDB
 
 @Client.on_callback_query(filters.regex(r"admin_main"))
@@ -35,5 +39,161 @@ Choose an option below:"""
     keyboard = create_admin_keyboard()
     await cb.edit_message_text(admin_text, reply_markup=keyboard)
 
+@Client.on_message(filters.command(["calibrate"]) & filters.private)
+async def calibrate_command(c: Client, m: Message):
+    """Benchmark the encoder on this host and store the best preset/thread profile (owner only)"""
+    if m.from_user.id != int(Config.OWNER):
+        await m.reply_text("🔒 **Owner only command!**", quote=True)
+        return
+    
+    if encoder_calibrator.running:
+        await m.reply_text("⏳ **Calibration already running!**", quote=True)
+        return
+    
+    status = await m.reply_text(
+        f"⚙️ **Encoder Calibration**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"🔧 **Codec:** `{Config.VIDEO_CODEC}`\n"
+        f"🔄 **Status:** Starting benchmark...",
+        quote=True
+    )
+    
+    async def progress_callback(done, total, preset, threads, fps):
+        result = f"{fps:.1f} fps" if fps else "failed"
+        await status.edit_text(
+            f"⚙️ **Encoder Calibration**\n"
+            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+            f"{get_progress_bar(done / total)} `{done}/{total}`\n"
+            f"🧪 **Last Run:** `{preset}` × `{threads}` threads → `{result}`"
+        )
+    
+    profile = await encoder_calibrator.calibrate(progress_callback)
+    
+    if not profile:
+        current = get_encoder_profile()
+        await status.edit_text(
+            f"❌ **Calibration Failed!**\n"
+            f"Still using preset `{current.preset}`.\n"
+            f"Only libx264/libx265 can be calibrated."
+        )
+        return
+    
+    await status.edit_text(
+        f"✅ **Encoder Calibrated!**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"🔧 **Codec:** `{profile.codec}`\n"
+        f"🎯 **Preset:** `{profile.preset}`\n"
+        f"🧵 **Threads/Job:** `{profile.threads}`\n"
+        f"🚀 **Speed:** `{profile.fps:.1f} fps` (`{profile.speed:.2f}x` realtime at 720p)\n\n"
+        f"Robust merge, compression and audio merge now use this profile."
+    )
+
+@Client.on_message(filters.command(["probebench"]) & filters.private)
+async def probebench_command(c: Client, m: Message):
+    """Compare ffprobe with the in-process metadata parser on sample clips (owner only)"""
+    if m.from_user.id != int(Config.OWNER):
+        await m.reply_text("🔒 **Owner only command!**", quote=True)
+        return
+    
+    status = await m.reply_text(
+        "🧪 **Metadata Backend Benchmark**\n"
+        "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        "🔄 **Status:** Generating sample clips...",
+        quote=True
+    )
+    
+    results = await benchmark_backends()
+    if not results:
+        await status.edit_text("❌ **Benchmark Failed!**\nCould not create the sample clips.")
+        return
+    
+    lines = []
+    for name, timings in results.items():
+        in_process = timings['in-process']
+        if in_process:
+            lines.append(
+                f"📄 `{name}`: ffprobe `{timings['ffprobe']:.1f} ms`, "
+                f"in-process `{in_process:.1f} ms` (`{timings['ffprobe'] / in_process:.0f}x`)"
+            )
+        else:
+            lines.append(f"📄 `{name}`: ffprobe `{timings['ffprobe']:.1f} ms`, in-process unavailable")
+    
+    await status.edit_text(
+        f"✅ **Metadata Backend Benchmark**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"🔧 **Backend:** `{Config.METADATA_BACKEND}`\n\n"
+        + "\n".join(lines)
+    )
+
+@Client.on_message(filters.command(["dlbench"]) & filters.private)
+async def dlbench_command(c: Client, m: Message):
+    """Compare single-stream and segmented URL downloads against a throttled local server (owner only)"""
+    if m.from_user.id != int(Config.OWNER):
+        await m.reply_text("🔒 **Owner only command!**", quote=True)
+        return
+    
+    status = await m.reply_text(
+        "🧪 **URL Download Benchmark**\n"
+        "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        "🔄 **Status:** Downloading from a throttled local server...",
+        quote=True
+    )
+    
+    try:
+        results = await benchmark_segmented()
+    except Exception as e:
+        LOGGER.error(f"URL download benchmark failed: {e}")
+        await status.edit_text(f"❌ **Benchmark Failed!**\n`{e}`")
+        return
+    
+    baseline = results.get(1) or 0
+    lines = [
+        f"🔗 `{count}` connection{'s' if count > 1 else ''}: `{speed:.1f} MiB/s`"
+        + (f" (`{speed / baseline:.1f}x`)" if baseline and count > 1 else "")
+        for count, speed in results.items()
+    ]
+    
+    await status.edit_text(
+        f"✅ **URL Download Benchmark**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"🔧 **Configured:** `{Config.HTTP_DOWNLOAD_CONNECTIONS}` connections\n\n"
+        + "\n".join(lines)
+    )
+
+@Client.on_message(filters.command(["diskbench"]) & filters.private)
+async def diskbench_command(c: Client, m: Message):
+    """Measure event-loop lag of blocking vs threaded download writes (owner only); /diskbench [size_mb]"""
+    if m.from_user.id != int(Config.OWNER):
+        await m.reply_text("🔒 **Owner only command!**", quote=True)
+        return
+    
+    size_mb = int(m.command[1]) if len(m.command) > 1 and m.command[1].isdigit() else 4096
+    status = await m.reply_text(
+        f"🧪 **Disk Write Benchmark**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"🔄 **Status:** Writing `{size_mb} MB` twice...",
+        quote=True
+    )
+    
+    try:
+        results = await benchmark_disk_writes(size_mb)
+    except Exception as e:
+        LOGGER.error(f"Disk write benchmark failed: {e}")
+        await status.edit_text(f"❌ **Benchmark Failed!**\n`{e}`")
+        return
+    
+    lines = [
+        f"💾 **{mode.title()}:** lag max `{stats['max']:.0f} ms`, p99 `{stats['p99']:.1f} ms`, "
+        f"mean `{stats['mean']:.2f} ms` at `{stats['speed']:.0f} MiB/s`"
+        for mode, stats in results.items()
+    ]
+    
+    await status.edit_text(
+        f"✅ **Disk Write Benchmark**\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"📦 **Size:** `{size_mb} MB`\n\n"
+        + "\n".join(lines)
+    )
+
 # Export admin functions
-__all__ = ['admin_main_callback']
+__all__ = ['admin_main_callback', 'calibrate_command', 'probebench_command', 'dlbench_command', 'diskbench_command']
@@ -7,6 +7,7 @@ import asyncio
 from typing import Optional, Callable, Dict, Any
 from pyrogram.types import Message
 from config import Config
+from helpers.status_renderer import status_renderer
 from __init__ import LOGGER
 
 class ProgressTracker:
@@ -52,7 +53,7 @@ class ProgressTracker:
             )
             
             # Update message
-            await self.message.edit_text(progress_text)
+            status_renderer.post(self.message, progress_text)
             self.last_update = now
             
         except Exception as e:
@@ -223,26 +224,11 @@ async def EditMessage(
     parse_mode: str = None,
     disable_web_page_preview: bool = True
 ):
-    """Legacy message editing function with throttling"""
-    current_time = time.time()
-    
-    # Simple throttling using message ID as key
-    throttle_key = f"{message.chat.id}_{message.id}"
-    if not hasattr(EditMessage, 'last_edits'):
-        EditMessage.last_edits = {}
-    
-    last_edit = EditMessage.last_edits.get(throttle_key, 0)
-    
-    if (current_time - last_edit) >= Config.EDIT_THROTTLE_SECONDS:
-        try:
-            await message.edit_text(
-                text,
-                parse_mode=parse_mode,
-                disable_web_page_preview=disable_web_page_preview
-            )
-            EditMessage.last_edits[throttle_key] = current_time
-        except Exception as e:
-            LOGGER.warning(f"Message edit failed: {e}")
+    """Legacy message editing function (rate-limited by the status renderer)"""
+    options = {'disable_web_page_preview': disable_web_page_preview}
+    if parse_mode:
+        options['parse_mode'] = parse_mode
+    status_renderer.post(message, text, **options)
 
 def get_progress_bar_str(progress: float) -> str:
     """Get progress bar string"""
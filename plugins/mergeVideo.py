@@ -10,7 +10,11 @@ from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMa
 from config import Config
 from helpers.merger import EnhancedMerger, merge_videos
 from helpers.uploader import EnhancedTelegramUploader, GoFileUploader
-from helpers.utils import UserSettings, get_readable_file_size, get_readable_time, get_video_info
+from helpers.merge_results import merge_result_index, merge_result_key, merge_input_identities, replay_merge_result
+from helpers.queue_downloader import QueueDownloader
+from helpers.utils import UserSettings, get_readable_file_size, get_readable_time
+from helpers.media_probe import media_probe
+from helpers.thumbnails import thumbnail_cache
 from templates.keyboards import create_upload_options_keyboard, create_confirmation_keyboard
 from templates.messages import MERGE_SUCCESS, get_error_message
 from __init__ import LOGGER, queueDB, performance_monitor
@@ -71,53 +75,52 @@ async def start_video_merge_process(c: Client, cb: CallbackQuery, user_id: int,
         
         await cb.edit_message_text(status_text)
         
+        # Identical inputs merged before are re-sent from Telegram without any transfer or encoding
+        queue_downloader = QueueDownloader(c, user_id, cb.message)
+        identities = await merge_input_identities(c, user_id, queue, queue_downloader.downloader)
+        result_key = merge_result_key(identities, user) if identities else None
+        cached_result = merge_result_index.lookup(result_key)
+        if cached_result and await replay_merge_result(c, user_id, result_key, cached_result, cb.message):
+            queueDB[user_id]["videos"].clear()
+            return
+        
         # Initialize enhanced merger
         merger = EnhancedMerger(user_id)
         
-        # Phase 1: Download all videos
-        video_paths = []
-        total_size = 0
+        # Phase 1: Download all videos concurrently, probing/normalizing each one as it lands
+        pipeline = merger.start_pipeline(cb.message)
+        try:
+            video_paths = await queue_downloader.download_all(
+                queue,
+                remote=Config.REMOTE_INPUT_MERGE,
+                on_item=lambda i, path: pipeline.add(i, path, queue_downloader.remote_sizes.get(i))
+            )
+        except Exception as e:
+            await pipeline.cancel()
+            await queue_downloader.downloader.cleanup()
+            LOGGER.error(f"Download error for user {user_id}: {e}")
+            await cb.edit_message_text(
+                f"❌ **Download Error!**\n"
+                f"Error downloading videos: `{str(e)}`\n\n"
+                f"Please try again or contact support."
+            )
+            return
         
-        for i, item in enumerate(queue):
+        if not video_paths:
+            await pipeline.cancel()
+            await queue_downloader.downloader.cleanup()
             await cb.edit_message_text(
-                f"📥 **Enhanced Download Phase**\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"🔄 **Progress:** {i+1}/{queue_size}\n"
-                f"📁 **Processing:** Video {i+1}\n"
-                f"⏳ **Status:** Downloading..."
+                f"❌ **Download Failed!**\n"
+                f"Failed to download video {queue_downloader.failed + 1}/{queue_size}\n\n"
+                f"**Action:** Merge cancelled\n"
+                f"**Suggestion:** Check files and try again"
             )
-            
-            try:
-                if isinstance(item, str):  # URL
-                    from helpers.downloader import EnhancedDownloader
-                    downloader = EnhancedDownloader(user_id)
-                    file_path = await downloader.download_from_url(item, cb.message)
-                    await downloader.cleanup()
-                else:  # Message ID
-                    message = await c.get_messages(chat_id=user_id, message_ids=item)
-                    from helpers.downloader import download_from_tg
-                    file_path = await download_from_tg(message, user_id, cb.message)
-                
-                if not file_path or not os.path.exists(file_path):
-                    await cb.edit_message_text(
-                        f"❌ **Download Failed!**\n"
-                        f"Failed to download video {i+1}/{queue_size}\n\n"
-                        f"**Action:** Merge cancelled\n"
-                        f"**Suggestion:** Check files and try again"
-                    )
-                    return
-                
-                video_paths.append(file_path)
-                total_size += os.path.getsize(file_path)
-                
-            except Exception as e:
-                LOGGER.error(f"Download error for user {user_id}: {e}")
-                await cb.edit_message_text(
-                    f"❌ **Download Error!**\n"
-                    f"Error downloading video {i+1}: `{str(e)}`\n\n"
-                    f"Please try again or contact support."
-                )
-                return
+            return
+        
+        total_size = sum(
+            queue_downloader.remote_sizes.get(i) or os.path.getsize(path)
+            for i, path in enumerate(video_paths)
+        )
         
         # Phase 2: Merge videos
         await cb.edit_message_text(
@@ -133,8 +136,8 @@ async def start_video_merge_process(c: Client, cb: CallbackQuery, user_id: int,
         timestamp = int(time.time())
         output_filename = f"merged_video_{user_id}_{timestamp}.mp4"
         
-        # Start merge
-        merged_path = await merger.merge_videos(video_paths, cb.message, output_filename)
+        # Start merge (only the remaining work; the pipeline already ran alongside downloads)
+        merged_path = await pipeline.finish(output_filename)
         
         if not merged_path:
             await cb.edit_message_text(
@@ -147,14 +150,17 @@ async def start_video_merge_process(c: Client, cb: CallbackQuery, user_id: int,
         
         # Phase 3: Success - Show upload options
         file_size = os.path.getsize(merged_path)
-        file_info = get_video_info(merged_path)
+        media_info = await media_probe.probe(merged_path)
+        file_info = media_info.to_video_info()
         
         # Store merged file info for upload callbacks
         queueDB[user_id]["merged_file"] = {
             "path": merged_path,
             "filename": os.path.basename(merged_path),
             "size": file_size,
-            "info": file_info
+            "info": file_info,
+            "media": media_info,
+            "result_key": result_key
         }
         
         # Create upload options keyboard
@@ -163,6 +169,7 @@ async def start_video_merge_process(c: Client, cb: CallbackQuery, user_id: int,
             [InlineKeyboardButton("🔗 GoFile.io", callback_data=f"upload_gofile_{user_id}")],
             [InlineKeyboardButton("☁️ Google Drive", callback_data=f"upload_gdrive_{user_id}")],
             [InlineKeyboardButton("📋 File Info", callback_data=f"file_info_{user_id}")],
+            [InlineKeyboardButton("🎞️ Preview Sheet", callback_data=f"preview_sheet_{user_id}")],
             [InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_upload_{user_id}")]
         ])
         
@@ -197,6 +204,15 @@ async def start_video_merge_process(c: Client, cb: CallbackQuery, user_id: int,
             f"Please try again or contact support if issue persists."
         )
 
+def _record_merge_result(file_info: dict, **fields):
+    """Remember where a merged file was delivered so the same merge can be replayed"""
+    merge_result_index.record(
+        file_info.get("result_key"),
+        filename=file_info["filename"],
+        size_text=get_readable_file_size(file_info["size"]),
+        **fields
+    )
+
 @Client.on_callback_query(filters.regex(r"upload_telegram_(\d+)"))
 async def upload_telegram_callback(c: Client, cb: CallbackQuery):
     """Handle Telegram upload"""
@@ -248,10 +264,19 @@ async def upload_telegram_callback(c: Client, cb: CallbackQuery):
             chat_id=user_id,
             file_path=file_path,
             status_message=cb.message,
-            upload_as_document=user.upload_as_doc
+            upload_as_document=user.upload_as_doc,
+            media_info=file_info.get("media")
         )
         
         if success:
+            sent = uploader.sent_message
+            media = sent and (sent.video or sent.document)
+            if media:
+                _record_merge_result(
+                    file_info,
+                    telegram={'file_id': media.file_id, 'media': 'video' if sent.video else 'document'}
+                )
+            
             # Clean up
             try:
                 os.remove(file_path)
@@ -297,6 +322,7 @@ async def upload_gofile_callback(c: Client, cb: CallbackQuery):
         download_link = await uploader.upload_file(file_path, cb.message)
         
         if download_link:
+            _record_merge_result(file_info, gofile=download_link)
             file_size = get_readable_file_size(file_info["size"])
             filename = file_info["filename"]
             
@@ -362,6 +388,7 @@ async def upload_gdrive_callback(c: Client, cb: CallbackQuery):
         upload_result = await rclone_upload(file_path, cb.message)
         
         if upload_result:
+            _record_merge_result(file_info, drive=upload_result)
             await cb.edit_message_text(
                 f"✅ **Google Drive Upload Completed!**\n"
                 f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
@@ -429,6 +456,35 @@ async def file_info_callback(c: Client, cb: CallbackQuery):
     
     await cb.edit_message_text(info_text, reply_markup=back_keyboard)
 
+@Client.on_callback_query(filters.regex(r"preview_sheet_(\d+)"))
+async def preview_sheet_callback(c: Client, cb: CallbackQuery):
+    """Send a contact sheet of the merged video (one keyframe-only decode, cached)"""
+    user_id = int(cb.matches[0].group(1))
+    
+    if cb.from_user.id != user_id:
+        await cb.answer("❌ This is not your file!", show_alert=True)
+        return
+    
+    if user_id not in queueDB or "merged_file" not in queueDB[user_id]:
+        await cb.answer("❌ No merged file found!", show_alert=True)
+        return
+    
+    file_info = queueDB[user_id]["merged_file"]
+    await cb.answer("🎞️ Building preview...")
+    
+    sheet_path = await thumbnail_cache.contact_sheet(
+        file_info["path"], media_info=file_info.get("media"), user_id=user_id
+    )
+    if not sheet_path:
+        await cb.message.reply_text("❌ **Preview could not be created!**")
+        return
+    
+    await c.send_photo(
+        chat_id=user_id,
+        photo=sheet_path,
+        caption=f"🎞️ **Preview:** `{file_info['filename']}`"
+    )
+
 @Client.on_callback_query(filters.regex(r"cancel_upload_(\d+)"))
 async def cancel_upload_callback(c: Client, cb: CallbackQuery):
     """Cancel upload and clean up"""
@@ -466,5 +522,6 @@ __all__ = [
     'upload_gofile_callback',
     'upload_gdrive_callback',
     'file_info_callback',
+    'preview_sheet_callback',
     'cancel_upload_callback'
 ]
@@ -3,14 +3,17 @@
 
 import os
 import time
-import asyncio
 from typing import List, Optional
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
 from config import Config
-from helpers.utils import UserSettings, get_readable_file_size, get_video_info
+from helpers.utils import UserSettings, get_readable_file_size, get_progress_bar, format_progress_time
+from helpers.media_probe import media_probe
+from helpers.ffmpeg_runner import run_ffmpeg, probe_duration
+from helpers.ffmpeg_scheduler import queue_status_callback
 from helpers.merger import EnhancedMerger
+from helpers.status_renderer import smart_progress_editor
 from __init__ import LOGGER, queueDB, AUDIO_EXTENSIONS
 
 @Client.on_callback_query(filters.regex(r"merge_audio_(\d+)"))
@@ -127,14 +130,16 @@ async def start_audio_merge_process(
         if merged_path and os.path.exists(merged_path):
             # Success - show upload options
             file_size = os.path.getsize(merged_path)
-            file_info = get_video_info(merged_path)
+            media_info = await media_probe.probe(merged_path)
+            file_info = media_info.to_video_info()
             
             # Store merged file for upload
             queueDB[user_id]["merged_file"] = {
                 "path": merged_path,
                 "filename": os.path.basename(merged_path),
                 "size": file_size,
-                "info": file_info
+                "info": file_info,
+                "media": media_info
             }
             
             keyboard = InlineKeyboardMarkup([
@@ -198,42 +203,33 @@ async def merge_video_with_audio(video_path: str, audio_paths: List[str], user_i
             output_path
         ])
         
-        # Run FFmpeg
-        process = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        
-        start_time = time.time()
-        
-        # Monitor progress
-        while process.returncode is None:
-            elapsed = time.time() - start_time
+        # Progress callback
+        async def progress_callback(progress):
             if status_message:
-                await status_message.edit_text(
+                eta = format_progress_time(int(progress.eta)) if progress.eta > 0 else "N/A"
+                await smart_progress_editor(
+                    status_message,
                     f"🎵 **Audio Integration in Progress...**\n"
                     f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                    f"⏱️ **Elapsed:** `{int(elapsed)}s`\n"
+                    f"{get_progress_bar(progress.percent / 100)} `{progress.percent:.1f}%`\n"
+                    f"⏱️ **Elapsed:** `{int(progress.elapsed)}s` | **ETA:** `{eta}`\n"
                     f"🔧 **Process:** Adding {len(audio_paths)} audio tracks\n"
                     f"⚡ **Codec:** {Config.AUDIO_CODEC} @ {Config.AUDIO_BITRATE}"
                 )
-            
-            await asyncio.sleep(2)
-            
-            try:
-                await asyncio.wait_for(process.wait(), timeout=0.1)
-                break
-            except asyncio.TimeoutError:
-                continue
         
-        stdout, stderr = await process.communicate()
+        # Run FFmpeg
+        result = await run_ffmpeg(
+            cmd,
+            duration=await probe_duration(video_path),
+            operation="Audio merge",
+            progress_callback=progress_callback,
+            user_id=user_id,
+            queue_callback=queue_status_callback(status_message, "Audio merge") if status_message else None
+        )
         
-        if process.returncode == 0 and os.path.exists(output_path):
+        if result.success and os.path.exists(output_path):
             return output_path
-        else:
-            if stderr:
-                error_output = stderr.decode('utf-8', errors='ignore')[-300:]
-                LOGGER.error(f"Audio merge FFmpeg error: {error_output}")
-            return None
+        return None
     
     except Exception as e:
         LOGGER.error(f"Audio merge process error: {e}")
@@ -8,8 +8,12 @@ from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
 from config import Config
-from helpers.utils import UserSettings, get_readable_file_size, get_video_info
+from helpers.utils import UserSettings, get_readable_file_size, get_progress_bar
+from helpers.media_probe import media_probe
+from helpers.queue_downloader import QueueDownloader
 from helpers.ffmpeg_helper import FFmpegHelper
+from helpers.ffmpeg_scheduler import queue_status_callback
+from helpers.status_renderer import smart_progress_editor
 from __init__ import LOGGER, queueDB, SUBTITLE_EXTENSIONS
 
 @Client.on_callback_query(filters.regex(r"merge_subtitles_(\d+)"))
@@ -60,52 +64,17 @@ async def start_subtitle_merge_process(
             f"🔄 **Status:** Preparing subtitle integration..."
         )
         
-        # Download video file (use first one)
-        video_item = video_files[0]
-        await cb.edit_message_text(
-            f"📥 **Downloading Video...**\n"
-            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"🔄 **Status:** Processing main video file"
-        )
-        
-        if isinstance(video_item, str):  # URL
-            from helpers.downloader import EnhancedDownloader
-            downloader = EnhancedDownloader(user_id)
-            video_path = await downloader.download_from_url(video_item, cb.message)
-            await downloader.cleanup()
-        else:  # Message ID
-            message = await c.get_messages(chat_id=user_id, message_ids=video_item)
-            from helpers.downloader import download_from_tg
-            video_path = await download_from_tg(message, user_id, cb.message)
+        # Download the video (first one) and all subtitles together; only the video is required
+        queue_downloader = QueueDownloader(c, user_id, cb.message, title="Downloading Video & Subtitles")
+        paths = await queue_downloader.download_all([video_files[0]] + list(subtitle_files), required={0})
         
-        if not video_path or not os.path.exists(video_path):
+        if not paths:
+            await queue_downloader.downloader.cleanup()
             await cb.edit_message_text("❌ Failed to download video file!")
             return
         
-        # Download subtitle files
-        subtitle_paths = []
-        for i, subtitle_item in enumerate(subtitle_files):
-            await cb.edit_message_text(
-                f"📥 **Downloading Subtitles...**\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"🔄 **Progress:** {i+1}/{len(subtitle_files)}\n"
-                f"📄 **Processing:** Subtitle {i+1}"
-            )
-            
-            if isinstance(subtitle_item, str):  # URL
-                from helpers.downloader import EnhancedDownloader
-                downloader = EnhancedDownloader(user_id)
-                subtitle_path = await downloader.download_from_url(subtitle_item, cb.message)
-                await downloader.cleanup()
-            else:  # Message ID
-                message = await c.get_messages(chat_id=user_id, message_ids=subtitle_item)
-                from helpers.downloader import download_from_tg
-                subtitle_path = await download_from_tg(message, user_id, cb.message)
-            
-            if subtitle_path and os.path.exists(subtitle_path):
-                subtitle_paths.append(subtitle_path)
-            else:
-                LOGGER.warning(f"Failed to download subtitle {i+1}")
+        video_path = paths[0]
+        subtitle_paths = [path for path in paths[1:] if path]
         
         if not subtitle_paths:
             await cb.edit_message_text("❌ No subtitles could be downloaded!")
@@ -127,14 +96,16 @@ async def start_subtitle_merge_process(
         if merged_path and os.path.exists(merged_path):
             # Success - show upload options
             file_size = os.path.getsize(merged_path)
-            file_info = get_video_info(merged_path)
+            media_info = await media_probe.probe(merged_path)
+            file_info = media_info.to_video_info()
             
             # Store merged file for upload
             queueDB[user_id]["merged_file"] = {
                 "path": merged_path,
                 "filename": os.path.basename(merged_path),
                 "size": file_size,
-                "info": file_info
+                "info": file_info,
+                "media": media_info
             }
             
             keyboard = InlineKeyboardMarkup([
@@ -177,27 +148,33 @@ async def merge_video_with_subtitles(
 ) -> Optional[str]:
     """Merge video with multiple subtitle tracks using FFmpeg"""
     try:
-        output_filename = f"video_with_subtitles_{user_id}_{int(time.time())}.mp4"
-        output_path = os.path.join(f"downloads/{user_id}", output_filename)
-        
         # Use FFmpeg helper for subtitle integration
         ffmpeg_helper = FFmpegHelper()
         
+        # MKV when the inputs need it (ASS styling, image subtitles, non-MP4 video)
+        container = await ffmpeg_helper.subtitle_container(video_path, subtitle_paths)
+        output_filename = f"video_with_subtitles_{user_id}_{int(time.time())}.{container}"
+        output_path = os.path.join(f"downloads/{user_id}", output_filename)
+        
         # Progress callback
-        async def progress_callback(stage, elapsed):
+        async def progress_callback(progress):
             if status_message:
-                await status_message.edit_text(
+                await smart_progress_editor(
+                    status_message,
                     f"📄 **Subtitle Integration in Progress...**\n"
                     f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                    f"⏱️ **Elapsed:** `{int(elapsed)}s`\n"
-                    f"🔧 **Stage:** {stage}\n"
+                    f"{get_progress_bar(progress.percent / 100)} `{progress.percent:.1f}%`\n"
+                    f"⏱️ **Elapsed:** `{int(progress.elapsed)}s`\n"
+                    f"🔧 **Stage:** {progress.operation}\n"
                     f"📄 **Tracks:** Adding {len(subtitle_paths)} subtitles\n"
                     f"⚡ **Method:** Soft-mux preservation"
                 )
         
         # Start subtitle integration
         success = await ffmpeg_helper.add_subtitles_to_video(
-            video_path, subtitle_paths, output_path, progress_callback
+            video_path, subtitle_paths, output_path, progress_callback,
+            user_id=user_id,
+            queue_callback=queue_status_callback(status_message, "Subtitle merge") if status_message else None
         )
         
         if success and os.path.exists(output_path):
@@ -277,7 +254,7 @@ async def subtitle_info_callback(c: Client, cb: CallbackQuery):
 
 @Client.on_callback_query(filters.regex(r"subtitle_extract_(\d+)"))
 async def subtitle_extract_callback(c: Client, cb: CallbackQuery):
-    """Extract subtitles from video file"""
+    """Extract subtitles (plus audio tracks in Extract Streams mode) from video file"""
     user_id = int(cb.matches[0].group(1))
     
     if cb.from_user.id != user_id:
@@ -313,21 +290,27 @@ async def subtitle_extract_callback(c: Client, cb: CallbackQuery):
             await cb.edit_message_text("❌ Failed to download video file!")
             return
         
-        # Extract subtitles
+        # Extract subtitles (and audio in Extract Streams mode) in one read of the video
         output_dir = f"downloads/{user_id}/subtitles"
         os.makedirs(output_dir, exist_ok=True)
         
+        user = UserSettings(user_id, cb.from_user.first_name)
+        stream_types = ('audio', 'subtitle') if user.merge_mode == 4 else ('subtitle',)
+        
         ffmpeg_helper = FFmpegHelper()
-        extracted_files = await ffmpeg_helper.extract_subtitles(video_path, output_dir)
+        extracted_files = await ffmpeg_helper.extract_streams(
+            video_path, output_dir, stream_types, user_id=user_id
+        )
         
         if extracted_files:
-            # Send extracted subtitle files
-            for subtitle_file in extracted_files:
+            # Send extracted stream files
+            for stream_type, subtitle_file in extracted_files:
+                kind = "Audio Track" if stream_type == 'audio' else "Subtitle"
                 try:
                     await c.send_document(
                         chat_id=user_id,
                         document=subtitle_file,
-                        caption=f"📄 **Extracted Subtitle**\nFrom: `{os.path.basename(video_path)}`"
+                        caption=f"📄 **Extracted {kind}**\nFrom: `{os.path.basename(video_path)}`"
                     )
                     
                     # Clean up after sending
@@ -339,7 +322,7 @@ async def subtitle_extract_callback(c: Client, cb: CallbackQuery):
             await cb.edit_message_text(
                 f"✅ **Subtitle Extraction Completed!**\n"
                 f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📄 **Extracted:** {len(extracted_files)} subtitle files\n"
+                f"📄 **Extracted:** {len(extracted_files)} stream files\n"
                 f"📤 **Status:** Files sent to chat\n\n"
                 f"**Files extracted and sent to your chat!**"
             )